@@ -0,0 +1,3 @@
+"""
+Offline benchmarks of fds.datax, see benchmarks.run.
+"""
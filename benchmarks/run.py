@@ -0,0 +1,354 @@
+"""
+Benchmarks the fds.datax download, cache build and read paths against the synthetic
+SDF backend, so results can be compared between versions on any machine.
+
+    python -m benchmarks.run --securities 500 --years 1 --output base.json
+    python -m benchmarks.run --securities 500 --years 1 --compare base.json
+
+Each step is timed --repeat times, reporting the best and median wall time, then run
+once more under tracemalloc for its peak Python allocation.  Reads are timed cold, the
+in process table cache is emptied before every run.  With --compare the best times are
+checked against an earlier output and the exit status is 1 when any step is slower by
+more than --tolerance.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from benchmarks.synthetic import SyntheticSDF
+from fds.datax._get_data._get_data import GetSDFData
+from fds.datax._sdfhelpers._create import FdsDataStore
+from fds.datax._sdfhelpers._find import FdsDataStoreLedger
+from fds.datax.universe import Universe
+from fds.datax.utils import tablecache
+from fds.datax.utils.connection import set_connection_factory
+
+DSN = "SYNTHETIC"
+CACHE_NAME = "bench"
+ETF_TICKER = "SPY-US"
+
+# (name, read option, adj, extra filters) of every Universe.read benchmark
+READS = [
+    ("read universe", "universe", 1, {}),
+    ("read sec ref", "sec ref", 1, {}),
+    ("read prices unadjusted", "prices", 0, {}),
+    ("read prices split", "prices", 1, {}),
+    ("read prices split spin", "prices", 2, {}),
+    ("read prices all", "prices", 3, {}),
+    ("read corp actions", "corp actions", 1, {}),
+]
+
+
+def __rows__(result):
+    if isinstance(result, (pd.DataFrame, pa.Table)):
+        return len(result)
+    return None
+
+
+def __peak_rss__():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def measure(step, repeat, memory=True):
+    """
+    Times step() repeat times, then measures the peak traced allocation of one more
+    run.  Returns the result entry of the step.
+    """
+    seconds = []
+    rows = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = __rows__(step())
+        seconds.append(time.perf_counter() - start)
+    entry = {
+        "rows": rows,
+        "seconds": seconds,
+        "best": min(seconds),
+        "median": statistics.median(seconds),
+    }
+    if memory:
+        arrow_before = pa.total_allocated_bytes()
+        tracemalloc.start()
+        result = step()
+        entry["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        entry["arrow_bytes"] = pa.total_allocated_bytes() - arrow_before
+        del result
+    entry["max_rss_bytes"] = __peak_rss__()
+    return entry
+
+
+class Benchmark:
+    """
+    The benchmark steps over one synthetic backend, run in order: the downloads, a
+    full cache build, then every read of the built cache.
+    """
+
+    def __init__(self, args, work_dir):
+        self.args = args
+        self.work_dir = work_dir
+        self.backend = SyntheticSDF(
+            securities=args.securities,
+            years=args.years,
+            end_date=args.end_date,
+            seed=args.seed,
+        )
+        self.start_date = str(self.backend.start)
+        self.end_date = str(self.backend.end)
+        self.store_dir = None
+        self.high_water = None
+        self.builds = 0
+
+    def __store__(self, **kwargs):
+        return FdsDataStore(
+            self.store_dir,
+            progress=None,
+            stream_prices=self.args.stream_prices,
+            layout=self.args.layout,
+            intervals=self.args.intervals,
+            adjust_on_read=self.args.adjust_on_read,
+            float32=self.args.float32,
+            price_query=self.args.price_query,
+            **kwargs
+        )
+
+    def etf_universe(self, intervals=False):
+        return GetSDFData.etf_universe(
+            ETF_TICKER, self.start_date, self.end_date, DSN, intervals=intervals
+        )
+
+    def fds_symbology(self):
+        return GetSDFData.fds_symbology(self.univ, DSN, id_type=0)
+
+    def fds_prices(self):
+        ids = self.univ.fsym_primary_listing_id.dropna().unique().tolist()
+        return GetSDFData.fds_prices(
+            ids,
+            self.start_date,
+            self.end_date,
+            self.args.currency,
+            3,
+            DSN,
+            query=self.args.price_query,
+        )
+
+    def get_data(self):
+        """
+        A full cache build, into a new directory every run so FX rates and
+        entitlements persisted by an earlier run are not reused.
+        """
+        self.builds += 1
+        self.store_dir = os.path.join(self.work_dir, "build{}".format(self.builds))
+        os.makedirs(os.path.join(self.store_dir, "fdsDataStore"))
+        univ = self.etf_universe(intervals=self.args.intervals)
+        fname = os.path.join(self.store_dir, "fdsDataStore", CACHE_NAME)
+        self.high_water = self.__store__().__get_data__(
+            CACHE_NAME, univ, DSN, self.args.currency, self.start_date, fname, 0
+        )
+        return self.high_water
+
+    def read(self, option, adj, filters):
+        def step():
+            tablecache.invalidate()
+            return Universe(self.store_dir).read(
+                CACHE_NAME, option, adj=adj, show_details=0, **filters
+            )
+
+        return step
+
+    def steps(self):
+        yield "etf_universe", self.etf_universe
+        yield "etf_universe intervals", lambda: self.etf_universe(intervals=True)
+        self.univ = self.etf_universe()
+        yield "fds_symbology", self.fds_symbology
+        yield "fds_prices", self.fds_prices
+        yield "__get_data__", self.get_data
+        # reads use the cache of the last build
+        with contextlib.redirect_stdout(io.StringIO()):
+            FdsDataStoreLedger(self.store_dir).cache_ledger(
+                CACHE_NAME,
+                "FDS Ownership",
+                DSN,
+                self.args.currency,
+                ETF_TICKER,
+                self.start_date,
+                self.end_date,
+                self.high_water,
+            )
+        ids = self.univ.ref_id.drop_duplicates().head(50).tolist()
+        last_year = str(self.backend.end - np.timedelta64(365, "D"))
+        reads = READS + [
+            (
+                "read prices filtered",
+                "prices",
+                1,
+                {"start_date": last_year, "ids": ids, "columns": ["price_close"]},
+            ),
+            ("read prices arrow", "prices", 1, {"arrow": True}),
+        ]
+        for name, option, adj, filters in reads:
+            yield name, self.read(option, adj, filters)
+
+
+def metadata(args):
+    import fds
+
+    versions = {}
+    for module in (np, pd, pa):
+        versions[module.__name__] = module.__version__
+    return {
+        "fds.datax": getattr(fds, "__version__", None),
+        "commit": __commit__(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "versions": versions,
+        "timestamp": pd.Timestamp.now(tz="UTC").isoformat(),
+        "parameters": {
+            k: v
+            for k, v in vars(args).items()
+            if k not in ("output", "compare", "work_dir")
+        },
+    }
+
+
+def __commit__():
+    head = os.path.join(os.path.dirname(os.path.dirname(__file__)), ".git", "HEAD")
+    try:
+        with open(head) as fd:
+            ref = fd.read().strip()
+        if ref.startswith("ref: "):
+            with open(os.path.join(os.path.dirname(head), ref[5:])) as fd:
+                return fd.read().strip()
+        return ref
+    except OSError:
+        return None
+
+
+def compare(results, baseline, tolerance):
+    """
+    Prints the best time of every step relative to a baseline output and returns the
+    names of the steps slower by more than tolerance.
+    """
+    regressions = []
+    print("\n{:<28}{:>12}{:>12}{:>9}".format("step", "baseline", "current", "ratio"))
+    for name, entry in results["steps"].items():
+        base = baseline["steps"].get(name)
+        if base is None:
+            print("{:<28}{:>12}{:>12.4f}".format(name, "-", entry["best"]))
+            continue
+        ratio = entry["best"] / base["best"] if base["best"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  slower"
+        print(
+            "{:<28}{:>12.4f}{:>12.4f}{:>8.2f}x{}".format(
+                name, base["best"], entry["best"], ratio, flag
+            )
+        )
+    return regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0]
+    )
+    parser.add_argument("--securities", type=int, default=500)
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--end-date", default="2024-12-31")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--currency", default="USD")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", dest="memory", action="store_false")
+    parser.add_argument("--stream-prices", action="store_true")
+    parser.add_argument("--layout", choices=["file", "dataset"], default=None)
+    parser.add_argument("--intervals", action="store_true")
+    parser.add_argument("--adjust-on-read", action="store_true", default=None)
+    parser.add_argument("--float32", action="store_true", default=None)
+    parser.add_argument(
+        "--price-query", choices=["calendar", "window", "trading"], default="calendar"
+    )
+    parser.add_argument(
+        "--skip",
+        action="append",
+        default=[],
+        metavar="STEP",
+        help="step to leave out, e.g. etf_universe for daily universes too large to hold",
+    )
+    parser.add_argument("--work-dir", default=None, help="kept after the run if set")
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="JSON output of an earlier run")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    warnings.simplefilter("ignore", UserWarning)
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="fds_datax_bench_")
+    bench = Benchmark(args, work_dir)
+    set_connection_factory(bench.backend.connect)
+    results = {"metadata": metadata(args), "steps": {}}
+    try:
+        print(
+            "{} securities over {} years, {} constituents in total".format(
+                args.securities, args.years, bench.backend.total
+            )
+        )
+        for name, step in bench.steps():
+            if name in args.skip:
+                continue
+            # the progress messages of fds.datax are not part of the output
+            with contextlib.redirect_stdout(io.StringIO()):
+                entry = measure(step, args.repeat, args.memory)
+            results["steps"][name] = entry
+            print(
+                "{:<28}{:>10.4f}s best{:>10.4f}s median{:>12} rows{}".format(
+                    name,
+                    entry["best"],
+                    entry["median"],
+                    entry["rows"] if entry["rows"] is not None else "-",
+                    "{:>10.1f} MB peak".format(entry["peak_bytes"] / 2**20)
+                    if "peak_bytes" in entry
+                    else "",
+                )
+            )
+    finally:
+        set_connection_factory(None)
+        if args.work_dir is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, "w") as fd:
+            json.dump(results, fd, indent=2)
+    if args.compare:
+        with open(args.compare) as fd:
+            regressions = compare(results, json.load(fd), args.tolerance)
+        if regressions:
+            print("\nSlower than the baseline: " + ", ".join(regressions))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,805 @@
+"""
+An in memory stand-in for a FactSet Standard DataFeeds SQL Server, used to run the
+fds.datax create and read pipeline with no network or ODBC driver.
+
+SyntheticSDF answers the queries fds.datax sends, recognizing each SQL template in
+fds/datax/sql_files, with generated but realistic data: an ETF whose constituents turn
+over at every monthly report, entity histories with occasional changes, prices with
+weekends forward filled, splits and spin-offs, and daily FX rates.  Every series is
+seeded by its identifier, so any date range or ID subset of the same SyntheticSDF
+returns the same values.
+
+    backend = SyntheticSDF(securities=500, years=1)
+    set_connection_factory(backend.connect)
+"""
+import datetime
+import os
+import re
+
+import numpy as np
+
+from fds.datax._get_data._get_data import sql_path
+from fds.datax.utils.loadsql import __load_template__
+
+DAY = np.timedelta64(1, "D")
+
+NO_DATE = np.datetime64("1900-01-01", "D")
+
+CURRENCIES = ["USD", "EUR", "GBP", "JPY", "CAD", "CHF", "AUD", "HKD"]
+CURRENCY_WEIGHTS = [0.7, 0.1, 0.06, 0.05, 0.04, 0.02, 0.02, 0.01]
+
+COUNTRIES = [
+    ("United States", "North America"),
+    ("Canada", "North America"),
+    ("United Kingdom", "Europe"),
+    ("Germany", "Europe"),
+    ("France", "Europe"),
+    ("Switzerland", "Europe"),
+    ("Japan", "Asia"),
+    ("Hong Kong", "Asia"),
+    ("Australia", "Pacific"),
+]
+
+RBICS_L1 = [
+    "Business Services",
+    "Consumer Cyclicals",
+    "Consumer Non-Cyclicals",
+    "Energy",
+    "Finance",
+    "Healthcare",
+    "Industrials",
+    "Non-Energy Materials",
+    "Technology",
+    "Telecommunications",
+    "Utilities",
+    "Real Estate",
+]
+
+PRICE_COLUMNS = [
+    "fsym_id",
+    "price_date",
+    "currency",
+    "unadj_shares_outstanding",
+    "split_adj_shares_outstanding",
+    "market_value",
+    "unadj_volume",
+    "split_adj_volume",
+    "unadj_price_close",
+    "unadj_price_high",
+    "unadj_price_low",
+    "unadj_price_open",
+    "split_adj_price_close",
+    "split_adj_price_high",
+    "split_adj_price_low",
+    "split_adj_price_open",
+    "split_spin_adj_price_close",
+    "split_spin_adj_price_high",
+    "split_spin_adj_price_low",
+    "split_spin_adj_price_open",
+    "one_day_total_return",
+    "cum_split_factor",
+    "cum_spin_factor",
+    "adj_factor_flag",
+]
+
+UNADJ_PRICE_COLUMNS = [
+    "fsym_id",
+    "price_date",
+    "currency",
+    "unadj_shares_outstanding",
+    "market_value",
+    "unadj_volume",
+    "unadj_price_close",
+    "unadj_price_high",
+    "unadj_price_low",
+    "unadj_price_open",
+    "one_day_total_return",
+]
+
+# securities per generated block of price rows
+PRICE_BLOCK = 64
+
+_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def __base36__(i, width=6):
+    out = ""
+    while i:
+        i, r = divmod(i, 36)
+        out = _DIGITS[r] + out
+    return out.rjust(width, "0")
+
+
+def __python_type__(arr):
+    if arr.dtype.kind == "M":
+        return datetime.date
+    if arr.dtype.kind == "f":
+        return float
+    if arr.dtype.kind in "iu":
+        return int
+    return str
+
+
+class SyntheticResult:
+    """
+    A result set produced block by block, so large price queries never hold every row.
+    """
+
+    def __init__(self, columns, blocks):
+        self.columns = columns
+        self.blocks = iter(blocks)
+        self.description = None
+        self.rows = []
+        self.position = 0
+
+    def __next_block__(self):
+        block = next(self.blocks, None)
+        if block is None:
+            return False
+        if self.description is None:
+            self.description = [
+                (name, __python_type__(arr), None, None, None, None, True)
+                for name, arr in zip(self.columns, block)
+            ]
+        values = []
+        for arr in block:
+            if arr.dtype.kind == "f" and np.isnan(arr).any():
+                # NULLs come back as None, as from pyodbc
+                arr = np.where(np.isnan(arr), None, arr)
+            values.append(arr.tolist())
+        self.rows = list(zip(*values))
+        self.position = 0
+        return True
+
+    def fetchmany(self, size):
+        out = []
+        while len(out) < size:
+            if self.position >= len(self.rows) and not self.__next_block__():
+                break
+            take = self.rows[self.position : self.position + size - len(out)]
+            self.position += len(take)
+            out.extend(take)
+        return out
+
+
+class SyntheticCursor:
+    def __init__(self, connection):
+        self.connection = connection
+        self.arraysize = 1
+        self.fast_executemany = False
+        self.description = None
+        self.result = None
+
+    def execute(self, q, *params):
+        self.result = self.connection.backend.query(q, self.connection)
+        self.description = None
+        if self.result is not None:
+            # the description is known once the first block is generated
+            self.result.__next_block__()
+            self.description = self.result.description
+        return self
+
+    def executemany(self, q, rows):
+        if "#bulkIDS" in q:
+            self.connection.bulk_ids.extend(row[0] for row in rows)
+
+    def nextset(self):
+        return False
+
+    def fetchmany(self, size=None):
+        if self.result is None:
+            return []
+        return self.result.fetchmany(size or self.arraysize)
+
+    def fetchall(self):
+        rows = []
+        while True:
+            batch = self.fetchmany(100000)
+            if not batch:
+                return rows
+            rows.extend(batch)
+
+    def fetchone(self):
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def close(self):
+        self.result = None
+
+
+class SyntheticConnection:
+    def __init__(self, backend):
+        self.backend = backend
+        self.bulk_ids = []
+
+    def cursor(self):
+        return SyntheticCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class SyntheticSDF:
+    """
+    Generated FactSet Standard DataFeeds content for one ETF.
+
+    securities: number of ETF constituents at any report date.
+    years: length of the ETF history ending at end_date.
+    turnover: yearly fraction of the constituents replaced, spread over the monthly
+              reports.
+    seed: seed of every generated series.
+
+    Prices, entity histories and FX rates start a year before the ETF history.  The
+    ETF ticker is not checked, every ticker returns the same constituents.
+    """
+
+    def __init__(
+        self, securities=500, years=1, end_date="2024-12-31", turnover=0.05, seed=0
+    ):
+        self.securities = securities
+        self.years = years
+        self.seed = seed
+        self.end = np.datetime64(end_date, "D")
+        self.start = self.end - int(round(365.25 * years)) * DAY
+        self.epoch = self.start - 365 * DAY
+        self.days = int((self.end - self.epoch) // DAY) + 1
+        self.templates = self.__load_templates__()
+        self.__build_membership__(turnover)
+
+    def connect(self, mssql_dsn):
+        """
+        Connection factory for fds.datax.utils.connection.set_connection_factory.
+        """
+        return SyntheticConnection(self)
+
+    # ------------------------------------------------------------------ identifiers
+
+    def security_id(self, i):
+        return __base36__(i) + "-S"
+
+    def listing_id(self, i):
+        return __base36__(i) + "-R"
+
+    def entity_id(self, i):
+        return __base36__(i) + "-E"
+
+    def market_id(self, i):
+        """
+        ISIN-like identifier of a security, accepted by fds_symbology with id_type=1.
+        """
+        return "XS" + __base36__(i, 9) + "0"
+
+    def __index__(self, fds_id):
+        """
+        Security number of an identifier, None when it is not a synthetic one.
+        """
+        try:
+            if len(fds_id) == 12 and fds_id.startswith("XS"):
+                i = int(fds_id[2:11], 36)
+            else:
+                i = int(fds_id.split("-")[0], 36)
+        except ValueError:
+            return None
+        if fds_id.endswith("-E") and i >= self.total:
+            # the entity a security moved to
+            i -= self.total
+        return i if 0 <= i < self.total else None
+
+    # ---------------------------------------------------------------- query routing
+
+    def __load_templates__(self):
+        """
+        Literal pieces of every SQL template between its format placeholders, used to
+        recognize which template a query was built from.
+        """
+        templates = {}
+        for name in sorted(os.listdir(sql_path)):
+            if name.endswith(".sql"):
+                text, _ = __load_template__(os.path.join(sql_path, name))
+                pieces = [p.strip() for p in re.split(r"\{\w+\}", text)]
+                templates[name[:-4]] = [p for p in pieces if p]
+        return templates
+
+    def __template__(self, q):
+        matches = [
+            (sum(len(p) for p in pieces), name)
+            for name, pieces in self.templates.items()
+            if all(p in q for p in pieces)
+        ]
+        if not matches:
+            raise ValueError("SyntheticSDF does not recognize the query:\n" + q[:500])
+        return max(matches)[1]
+
+    def query(self, q, connection):
+        """
+        Returns the SyntheticResult of a query, None for statements without results.
+        """
+        if q.strip().upper() == "SELECT 1":
+            return SyntheticResult(["one"], [[np.array([1])]])
+        if "ref_metadata_packages" in q:
+            return self.__entitlements__()
+        if "CREATE TABLE #bulkIDS" in q:
+            connection.bulk_ids = []
+            return None
+        return getattr(self, "__" + self.__template__(q) + "__")(q, connection)
+
+    @staticmethod
+    def __dates__(q):
+        sd, ed = re.findall(r"'(\d{4}-\d{2}-\d{2})", q)[:2]
+        return np.datetime64(sd, "D"), np.datetime64(ed, "D")
+
+    def __ids__(self, q, connection):
+        """
+        Security numbers of the IDs loaded into #listofIDS, from the INSERT statements
+        or the bulk loaded #bulkIDS of the connection.
+        """
+        if "FROM #bulkIDS" in q:
+            ids = list(connection.bulk_ids)
+        else:
+            ids = []
+            for line in re.findall(r"INSERT #listofIDS \(id\) VALUES (.*);", q):
+                ids.extend(re.findall(r"\('([^']*)'\)", line))
+        index = [self.__index__(i) for i in dict.fromkeys(ids)]
+        return [i for i in index if i is not None]
+
+    def __entitlements__(self):
+        tables = set()
+        for name in self.templates:
+            _, parsed = __load_template__(os.path.join(sql_path, name + ".sql"))
+            tables.update(parsed["table"].tolist() if len(parsed) else [])
+        tables = np.array(sorted(tables), dtype=object)
+        return SyntheticResult(
+            ["table_access", "table_ref", "package_name"],
+            [[tables, tables, np.full(len(tables), "Synthetic", dtype=object)]],
+        )
+
+    # ----------------------------------------------------------------- universe
+
+    def __build_membership__(self, turnover):
+        """
+        Monthly ETF reports, each replacing a random share of the constituents.  Every
+        security is a member from its first report up to, excluding, its exit report.
+        """
+        rng = np.random.default_rng([self.seed, 0])
+        self.reports = np.arange(
+            self.start.astype("datetime64[M]"),
+            self.end.astype("datetime64[M]") + 1,
+        ).astype("datetime64[D]")
+        self.reports = self.reports[self.reports >= self.start]
+        slots = np.arange(self.securities)
+        first, exit_ = [0] * self.securities, [len(self.reports)] * self.securities
+        for r in range(1, len(self.reports)):
+            leaving = np.nonzero(rng.random(self.securities) < turnover / 12)[0]
+            for slot in leaving:
+                exit_[slots[slot]] = r
+                slots[slot] = len(first)
+                first.append(r)
+                exit_.append(len(self.reports))
+        self.total = len(first)
+        self.first_report = np.array(first)
+        self.exit_report = np.array(exit_)
+
+        attributes = np.random.default_rng([self.seed, 1])
+        self.currency = attributes.choice(
+            CURRENCIES, size=self.total, p=CURRENCY_WEIGHTS
+        )
+        # a tenth of the securities move to a new entity
+        moves = attributes.random(self.total) < 0.1
+        offsets = attributes.integers(0, self.days, self.total)
+        self.entity_change = np.where(
+            moves, self.epoch + offsets * DAY, np.datetime64("NaT", "D")
+        )
+        self.country = attributes.integers(0, len(COUNTRIES), self.total)
+        self.sector = attributes.integers(0, len(RBICS_L1), self.total)
+
+    def __membership__(self, sd, ed):
+        """
+        Membership intervals over the reports between sd and ed, as etf_universe.sql
+        builds them: from the first report to the report following the last one.
+        """
+        inside = np.nonzero((self.reports >= sd) & (self.reports <= ed))[0]
+        if not len(inside):
+            empty = np.array([], dtype="datetime64[D]")
+            return np.array([], dtype=np.int64), empty, empty
+        lo, hi = inside[0], inside[-1]
+        first = np.maximum(self.first_report, lo)
+        last = np.minimum(self.exit_report - 1, hi)
+        end_index = np.where(last < hi, last + 1, last)
+        keep = (first <= last) & (end_index > first)
+        index = np.nonzero(keep)[0]
+        return index, self.reports[first[keep]], self.reports[end_index[keep]]
+
+    def __universe_columns__(self, index):
+        return [
+            np.array([self.security_id(i) for i in index], dtype=object),
+            np.array([self.listing_id(i) for i in index], dtype=object),
+            np.array([self.security_id(i) for i in index], dtype=object),
+        ]
+
+    def __etf_universe__(self, q, connection):
+        sd, ed = self.__dates__(q)
+        index, starts, ends = self.__membership__(sd, ed)
+        lengths = ((ends - starts) // DAY).astype(np.int64)
+        rows = np.repeat(np.arange(len(index)), lengths)
+        offsets = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        columns = [c[rows] for c in self.__universe_columns__(index)]
+        return SyntheticResult(
+            ["ref_id", "fsym_primary_listing_id", "fsym_primary_equity_id", "date"],
+            [columns + [starts[rows] + offsets * DAY]],
+        )
+
+    def __etf_universe_intervals__(self, q, connection):
+        sd, ed = self.__dates__(q)
+        index, starts, ends = self.__membership__(sd, ed)
+        return SyntheticResult(
+            [
+                "ref_id",
+                "fsym_primary_listing_id",
+                "fsym_primary_equity_id",
+                "start_date",
+                "end_date",
+            ],
+            [self.__universe_columns__(index) + [starts, ends]],
+        )
+
+    # --------------------------------------------------------------- symbology
+
+    def __entities__(self, index):
+        """
+        (security, entity, start, end) rows of the entity history of each security.
+        """
+        index = np.asarray(index, dtype=np.int64)
+        change = self.entity_change[index]
+        moved = ~np.isnat(change)
+        since = self.epoch - 10 * 365 * DAY
+        security = np.concatenate([index, index[moved]])
+        entity = [self.entity_id(i) for i in index]
+        entity += [self.entity_id(i + self.total) for i in index[moved]]
+        starts = np.concatenate(
+            [np.full(len(index), since, dtype="datetime64[D]"), change[moved]]
+        )
+        ends = np.concatenate([change, np.full(moved.sum(), "NaT", dtype="datetime64[D]")])
+        return security, np.array(entity, dtype=object), starts, ends
+
+    def __fds_symbology_own__(self, q, connection):
+        security, entity, starts, ends = self.__entities__(self.__ids__(q, connection))
+        return SyntheticResult(
+            [
+                "ref_id",
+                "proper_name",
+                "factset_entity_id",
+                "entity_start_date",
+                "entity_end_date",
+            ],
+            [
+                [
+                    np.array([self.security_id(i) for i in security], dtype=object),
+                    np.array(["Company " + __base36__(i) for i in security], dtype=object),
+                    entity,
+                    starts,
+                    ends,
+                ]
+            ],
+        )
+
+    def __fds_symbology_df__(self, q, connection):
+        security, entity, starts, ends = self.__entities__(self.__ids__(q, connection))
+        return SyntheticResult(
+            [
+                "ref_id",
+                "fsym_id",
+                "proper_name",
+                "factset_entity_id",
+                "entity_start_date",
+                "entity_end_date",
+            ],
+            [
+                [
+                    np.array([self.market_id(i) for i in security], dtype=object),
+                    np.array([self.listing_id(i) for i in security], dtype=object),
+                    np.array(["Company " + __base36__(i) for i in security], dtype=object),
+                    entity,
+                    starts,
+                    ends,
+                ]
+            ],
+        )
+
+    def __fds_sec_ref__(self, q, connection):
+        if "FROM #bulkIDS" in q:
+            ids = list(connection.bulk_ids)
+        else:
+            ids = []
+            for line in re.findall(r"INSERT #listofIDS \(id\) VALUES (.*);", q):
+                ids.extend(re.findall(r"\('([^']*)'\)", line))
+        ids = [e for e in dict.fromkeys(ids) if self.__index__(e) is not None]
+        index = np.array([self.__index__(e) for e in ids], dtype=np.int64)
+        country = self.country[index]
+        sector = self.sector[index]
+        columns = [
+            np.array(ids, dtype=object),
+            np.array(["Company " + __base36__(i) for i in index], dtype=object),
+            np.array([COUNTRIES[c][0] for c in country], dtype=object),
+            np.array([COUNTRIES[c][1] for c in country], dtype=object),
+        ]
+        for level in range(1, 5):
+            # each level splits its parent in three
+            code = sector * 3 ** (level - 1) + index % 3 ** (level - 1)
+            columns.append(np.array(["{}{:06d}".format(level, c) for c in code], dtype=object))
+            columns.append(
+                np.array(
+                    [
+                        "{} L{} {}".format(RBICS_L1[s], level, c)
+                        for s, c in zip(sector, code)
+                    ],
+                    dtype=object,
+                )
+            )
+        return SyntheticResult(
+            [
+                "factset_entity_id",
+                "entity_proper_name",
+                "country",
+                "region",
+                "rbics_l1_id",
+                "rbics_l1",
+                "rbics_l2_id",
+                "rbics_l2",
+                "rbics_l3_id",
+                "rbics_l3",
+                "rbics_l4_id",
+                "rbics_l4",
+            ],
+            [columns],
+        )
+
+    # ------------------------------------------------------------------- prices
+
+    def __events__(self, i):
+        """
+        Split and spin-off days, as offsets from the epoch, and factors of a listing.
+        """
+        rng = np.random.default_rng([self.seed, 3, i])
+        years = self.days / 365.25
+        n_splits = rng.poisson(0.04 * years)
+        n_spins = rng.poisson(0.02 * years)
+        split_days = np.sort(rng.choice(np.arange(1, self.days), n_splits, replace=False))
+        spin_days = np.sort(rng.choice(np.arange(1, self.days), n_spins, replace=False))
+        split_factors = rng.choice([0.5, 0.5, 1 / 3, 0.25, 2.0], n_splits)
+        spin_factors = rng.uniform(0.85, 0.99, n_spins)
+        return split_days, split_factors, spin_days, spin_factors
+
+    @staticmethod
+    def __cumulative__(event_days, factors, days):
+        """
+        Product of the factors of the events after each day, 1 when there are none.
+        """
+        tail = np.append(np.cumprod(factors[::-1])[::-1], 1.0)
+        return tail[np.searchsorted(event_days, days, side="right")]
+
+    def __listing_prices__(self, i, sd, ed, trading_days=False):
+        """
+        Column arrays of the price rows of a listing between sd and ed, the days with a
+        total return.  When trading_days is set only the rows fds_prices_window.sql
+        returns then, each with the end of the calendar days it fills.
+        """
+        lo = max(int((sd - self.epoch) // DAY), 0)
+        hi = min(int((ed - self.epoch) // DAY), self.days - 1)
+        if hi < lo:
+            return None
+        rng = np.random.default_rng([self.seed, 2, i])
+        days = np.arange(self.days)
+        dates = self.epoch + days * DAY
+        # 1970-01-01 was a Thursday, Monday is 0
+        weekday = (dates.view("int64") + 3) % 7
+        trading = weekday < 5
+        # fully adjusted close, weekends repeat the last trading day
+        log_returns = rng.normal(0.0003, 0.018, self.days) * trading
+        close = rng.uniform(10, 300) * np.exp(np.cumsum(log_returns))
+        spread = np.abs(rng.normal(0, 0.01, self.days))
+        high = close * (1 + spread)
+        low = close * (1 - spread)
+        open_ = close * np.exp(rng.normal(0, 0.005, self.days))
+        volume = rng.lognormal(13, 1, self.days)
+        shares = rng.uniform(1e7, 5e9)
+        returns = np.append(0.0, np.diff(close) / close[:-1]) * 100
+        # distributions going ex on a non-trading day return without a trade
+        ex_days = ~trading & (rng.random(self.days) < 0.02)
+        returns[ex_days] = rng.uniform(0.1, 2.0, ex_days.sum())
+        # days missing from fp_total_returns_daily, which the price queries drop
+        has_return = rng.random(self.days) >= 0.005
+
+        split_days, split_factors, spin_days, spin_factors = self.__events__(i)
+        cum_split = self.__cumulative__(split_days, split_factors, days)
+        cum_spin = self.__cumulative__(spin_days, spin_factors, days)
+        event_days = np.union1d(split_days, spin_days)
+        flag = np.isin(days, event_days - 1).astype(np.int64)
+
+        s = slice(lo, hi + 1)
+        n = hi + 1 - lo
+        unadj = {}
+        for name, values in [
+            ("close", close),
+            ("high", high),
+            ("low", low),
+            ("open", open_),
+        ]:
+            unadj[name] = values[s] / (cum_split[s] * cum_spin[s])
+            if name != "close":
+                unadj[name] = np.where(trading[s], unadj[name], 0.0)
+        unadj_volume = np.where(trading[s], volume[s] * cum_split[s], 0.0)
+        unadj_shares = shares * cum_split[s]
+        columns = {
+            "fsym_id": np.full(n, self.listing_id(i), dtype=object),
+            "price_date": dates[s],
+            "currency": np.full(n, self.currency[i], dtype=object),
+            "unadj_shares_outstanding": unadj_shares,
+            "split_adj_shares_outstanding": unadj_shares / cum_split[s],
+            "market_value": unadj_shares * unadj["close"],
+            "unadj_volume": unadj_volume,
+            "split_adj_volume": unadj_volume / cum_split[s],
+            "one_day_total_return": returns[s],
+            "cum_split_factor": cum_split[s],
+            "cum_spin_factor": cum_spin[s],
+            "adj_factor_flag": flag[s],
+        }
+        for name in ["close", "high", "low", "open"]:
+            columns["unadj_price_" + name] = unadj[name]
+            columns["split_adj_price_" + name] = unadj[name] * cum_split[s]
+            columns["split_spin_adj_price_" + name] = (
+                unadj[name] * cum_split[s] * cum_spin[s]
+            )
+        columns["fill_end_date"] = dates[s] + DAY
+        if trading_days:
+            # the first day, trading days, the days around a split or spin-off, days
+            # with a non-zero total return and the days around a missing one
+            missing = ~has_return[s]
+            keep = (
+                trading[s]
+                | np.isin(days[s], np.append(event_days, event_days - 1))
+                | (returns[s] != 0)
+                | missing
+                | np.append(False, missing[:-1])
+            )
+            keep[0] = True
+            kept = np.flatnonzero(keep)
+            columns = {name: values[kept] for name, values in columns.items()}
+            columns["fill_end_date"] = np.append(
+                dates[s][kept[1:]], dates[hi] + DAY
+            )
+            rows = has_return[s][kept]
+        else:
+            rows = has_return[s]
+        return {name: values[rows] for name, values in columns.items()}
+
+    def __price_blocks__(self, index, sd, ed, columns, trading_days=False):
+        for pos in range(0, len(index), PRICE_BLOCK):
+            listings = [
+                self.__listing_prices__(i, sd, ed, trading_days)
+                for i in index[pos : pos + PRICE_BLOCK]
+            ]
+            listings = [p for p in listings if p is not None]
+            if listings:
+                yield [np.concatenate([p[c] for p in listings]) for c in columns]
+        # an empty result still describes its columns
+        yield [
+            np.array([], dtype=object if c in ("fsym_id", "currency") else float)
+            if c not in ("price_date", "fill_end_date")
+            else np.array([], dtype="datetime64[D]")
+            for c in columns
+        ]
+
+    def __prices__(self, q, connection, columns):
+        sd, ed = self.__dates__(q)
+        index = self.__ids__(q, connection)
+        trading_days = "DECLARE @trading_days BIT= 1;" in q
+        return SyntheticResult(
+            columns, self.__price_blocks__(index, sd, ed, columns, trading_days)
+        )
+
+    def __fds_prices__(self, q, connection):
+        return self.__prices__(q, connection, PRICE_COLUMNS)
+
+    def __fds_prices_unadj__(self, q, connection):
+        return self.__prices__(q, connection, UNADJ_PRICE_COLUMNS)
+
+    def __fds_prices_window__(self, q, connection):
+        return self.__prices__(q, connection, PRICE_COLUMNS + ["fill_end_date"])
+
+    def __fds_prices_window_unadj__(self, q, connection):
+        return self.__prices__(q, connection, UNADJ_PRICE_COLUMNS + ["fill_end_date"])
+
+    def __fds_corp_actions__(self, q, connection):
+        rows = {c: [] for c in ["fsym_id", "price_date", "price_end_date"]}
+        split_col, spin_col = [], []
+        for i in self.__ids__(q, connection):
+            split_days, split_factors, spin_days, spin_factors = self.__events__(i)
+            event_days = np.union1d(split_days, spin_days)
+            if not len(event_days):
+                continue
+            # factors of the events on or after each event, NULL past the last one
+            for days, factors, out in [
+                (split_days, split_factors, split_col),
+                (spin_days, spin_factors, spin_col),
+            ]:
+                cum = self.__cumulative__(days, factors, event_days - 1)
+                after = np.searchsorted(days, event_days, side="left") < len(days)
+                out.append(np.where(after, cum, np.nan))
+            dates = self.epoch + event_days * DAY
+            rows["fsym_id"].append(np.full(len(dates), self.listing_id(i), dtype=object))
+            rows["price_date"].append(dates)
+            rows["price_end_date"].append(np.append(NO_DATE, dates[:-1]))
+        if not rows["fsym_id"]:
+            columns = [
+                np.array([], dtype=object),
+                np.array([], dtype="datetime64[D]"),
+                np.array([], dtype="datetime64[D]"),
+                np.array([], dtype=float),
+                np.array([], dtype=float),
+            ]
+        else:
+            columns = [np.concatenate(rows[c]) for c in rows]
+            columns += [np.concatenate(spin_col), np.concatenate(split_col)]
+            order = np.argsort(columns[1], kind="stable")
+            columns = [c[order] for c in columns]
+        return SyntheticResult(
+            [
+                "fsym_id",
+                "price_date",
+                "price_end_date",
+                "cum_spin_factor",
+                "cum_split_factor",
+            ],
+            [columns],
+        )
+
+    # ----------------------------------------------------------------------- fx
+
+    def __fds_fx_rates__(self, q, connection):
+        sd, ed = self.__dates__(q)
+        lo = max(int((sd - self.epoch) // DAY), 0)
+        hi = min(int((ed - self.epoch) // DAY), self.days - 1)
+        listed = re.search(r"iso_currency IN \(([^)]*)\)", q).group(1)
+        if "SELECT" in listed.upper():
+            currencies = CURRENCIES
+        else:
+            currencies = re.findall(r"'([^']*)'", listed)
+        blocks = []
+        if hi >= lo:
+            dates = self.epoch + np.arange(lo, hi + 1) * DAY
+            for k, currency in enumerate(CURRENCIES):
+                if currency not in currencies and currency != "USD":
+                    continue
+                if currency == "USD":
+                    # the USD placeholder of fds_fx_rates.sql
+                    rate = np.ones(self.days)
+                else:
+                    rng = np.random.default_rng([self.seed, 4, k])
+                    level = rng.uniform(0.005, 1.5)
+                    rate = level * np.exp(np.cumsum(rng.normal(0, 0.004, self.days)))
+                blocks.append(
+                    [
+                        np.full(len(dates), currency, dtype=object),
+                        dates,
+                        rate[lo : hi + 1],
+                        1 / rate[lo : hi + 1],
+                    ]
+                )
+        if not blocks:
+            blocks = [
+                [
+                    np.array([], dtype=object),
+                    np.array([], dtype="datetime64[D]"),
+                    np.array([], dtype=float),
+                    np.array([], dtype=float),
+                ]
+            ]
+        return SyntheticResult(
+            ["currency", "price_date", "exch_rate_usd", "exch_rate_per_usd"], blocks
+        )
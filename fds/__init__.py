@@ -1,7 +1,22 @@
 __docformat__ = "restructuredtext"
 
-from fds.datax._get_data._get_data import GetSDFData as getSDFdata
-from fds.datax.universe import Universe
+import importlib
+
+__all__ = ["getSDFdata", "Universe"]
+
+
+def __getattr__(name):
+    # fds.getSDFdata and fds.Universe are the fds.datax objects, loaded on first access
+    if name not in __all__:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(importlib.import_module("fds.datax"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 # module level doc-string
 __doc__ = """
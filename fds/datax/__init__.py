@@ -1,7 +1,29 @@
 __docformat__ = "restructuredtext"
 
-from fds.datax._get_data._get_data import GetSDFData as getSDFdata
-from fds.datax.universe import Universe
+import importlib
+
+# public names mapped to (module, attribute), imported on first access so that
+# "import fds.datax" stays cheap and reading caches never loads the SQL layer
+_LAZY_ATTRIBUTES = {
+    "getSDFdata": ("fds.datax._get_data._get_data", "GetSDFData"),
+    "Universe": ("fds.datax.universe", "Universe"),
+}
+
+__all__ = list(_LAZY_ATTRIBUTES)
+
+
+def __getattr__(name):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+    module, attribute = _LAZY_ATTRIBUTES[name]
+    value = getattr(importlib.import_module(module), attribute)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
+
 
 # module level doc-string
 __doc__ = """
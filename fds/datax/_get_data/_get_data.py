@@ -1,14 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+from importlib import resources
 import os
+import time
 import pandas as pd
-import pkg_resources
-import pyodbc
 
-from fds.datax.utils.helper_func import __insert_values__
+from fds.datax.utils.connection import checkout
+from fds.datax.utils.fetch import iter_batches, read_sql_stream
+from fds.datax.utils.fx import FdsFxRates
+from fds.datax.utils.helper_func import (
+    __bulk_insert_values__,
+    __insert_values__,
+    __partition__,
+)
+from fds.datax.utils.intervals import (
+    FILL_END,
+    expand_trading_days,
+    intersect_intervals,
+    interval_join,
+    is_interval_frame,
+)
 from fds.datax.utils.loadsql import get_sql_q as ls
+from fds.datax.utils.metrics import run_in_context, timed, timed_query
 
 cwd = os.getcwd()
-path = '../sql_files/'
-sql_path = pkg_resources.resource_filename(__name__, path)
+sql_path = str(resources.files("fds.datax").joinpath("sql_files"))
+
+# price valued columns of fds_prices converted by __apply_fx__, volumes are share counts
+FX_COLUMNS = [
+    "market_value",
+    "unadj_price_close",
+    "unadj_price_high",
+    "unadj_price_low",
+    "unadj_price_open",
+    "split_adj_price_close",
+    "split_adj_price_high",
+    "split_adj_price_low",
+    "split_adj_price_open",
+    "split_spin_adj_price_close",
+    "split_spin_adj_price_high",
+    "split_spin_adj_price_low",
+    "split_spin_adj_price_open",
+]
+
+# price query templates of fds_prices, see GetSDFData.__prices_query__
+PRICE_QUERIES = ("calendar", "window", "trading")
 
 
 class GetSDFData:
@@ -29,10 +64,59 @@ specific meta data.
 
 - Fetch prices (OHLC), 1 day total returns, market cap, exchange rates, and corporate action adjustment ratios for a
 universe.
+
+Large ID lists are uploaded to the #listofIDS temp table with a parameterized executemany instead of string-built
+INSERT batches.  Set bulk_id_threshold to None to always use the string-built statements.  Pricing is fetched in a
+single pass of cursor.fetchmany calls of fetch_arraysize rows.
+
+fds_prices and fds_corp_actions accept a shards option that splits the ID list into balanced partitions queried
+concurrently on separate connections.  A failed shard is retried shard_retries times on its own.
     """
 
+    bulk_id_threshold = 999
+    fetch_arraysize = 10000
+    shard_retries = 1
+
+    @classmethod
+    def __id_statements__(cls, connection, list_of_ids):
+        """
+        Returns the SQL used to fill #listofIDS for the connection, bulk loading the IDs
+        when the list is larger than bulk_id_threshold.
+        """
+        if (
+            cls.bulk_id_threshold is not None
+            and len(list_of_ids) > cls.bulk_id_threshold
+        ):
+            return __bulk_insert_values__(connection, list_of_ids)
+        return __insert_values__(list_of_ids)
+
     @classmethod
-    def etf_universe(cls, etf_ticker, start_date, end_date, mssql_dsn):
+    def __run_sharded__(cls, fetch, list_of_ids, shards, max_workers):
+        """
+        Calls fetch(ids) once per partition of list_of_ids on a worker pool and concatenates the results in partition
+        order.  IDs are sorted before partitioning so the output does not depend on the order of the input list.
+        """
+        partitions = __partition__(sorted(list_of_ids), shards)
+        if len(partitions) <= 1:
+            return fetch(list_of_ids)
+
+        def run(ids):
+            for attempt in range(cls.shard_retries + 1):
+                try:
+                    return fetch(ids)
+                except Exception:
+                    if attempt == cls.shard_retries:
+                        raise
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(partitions)) as pool:
+            futures = [run_in_context(pool, run, ids) for ids in partitions]
+            results = [future.result() for future in futures]
+        return pd.concat(results, ignore_index=True)
+
+    @classmethod
+    def etf_universe(
+        cls, etf_ticker, start_date, end_date, mssql_dsn, intervals=False
+    ):
         """
 Returns the constituents of an ETF from FDS Ownership in a pandas DataFrame.
 ETF Ownership is available on a annual, semi-annual, quarterly, or monthly frequency
@@ -51,6 +135,9 @@ Parameters
 
    - mssql_dsn: the name of a DSN connection that has access to FDS Standard Datafeeds
 
+   - intervals: return one row per membership interval instead of one row per day.
+                Use fds.datax.utils.intervals.expand_intervals to resample it daily.
+
 
 Returns
 -----------
@@ -58,20 +145,39 @@ Returns
 A Pandas DataFrame containing:
 
     ref_id|fsym_primary_listing_id|fsym_primary_equity_id|date
-        """
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
 
-        q = ls(
-            os.path.join(sql_path, "etf_universe.sql"), show=0, connection=mssql_dsn
-        ).format(etf_ticker=etf_ticker, sd=start_date, ed=end_date)
+or, with intervals, where end_date is exclusive:
+
+    ref_id|fsym_primary_listing_id|fsym_primary_equity_id|start_date|end_date
+        """
+        if intervals:
+            sql_file = "etf_universe_intervals.sql"
+            parse_dates = {
+                col: {"format": "%Y-%m-%d"} for col in ["start_date", "end_date"]
+            }
+        else:
+            sql_file = "etf_universe.sql"
+            parse_dates = {"date": {"format": "%Y-%m-%d"}}
+        q = ls(os.path.join(sql_path, sql_file), show=0, connection=mssql_dsn).format(
+            etf_ticker=etf_ticker, sd=start_date, ed=end_date
+        )
 
-        univ = pd.read_sql(q, connection, parse_dates={"date": {"format": "%Y-%m-%d"}})
+        with timed_query(sql_file[:-4]) as query:
+            with checkout(mssql_dsn) as connection:
+                univ = pd.read_sql(q, query.wrap(connection), parse_dates=parse_dates)
+            query.result(univ)
 
         return univ
 
     @classmethod
     def fds_symbology(
-        cls, univ_df, mssql_dsn, id_type="0", ref_id="ref_id", ref_date="date"
+        cls,
+        univ_df,
+        mssql_dsn,
+        id_type="0",
+        ref_id="ref_id",
+        ref_date="date",
+        entities=None,
     ):
         """
 fds_symbology
@@ -97,6 +203,12 @@ Parameters
             ID.
 
    - ref_date: This will identify the column name in the univ_df of the date field.
+            An interval encoded univ_df, with start_date and end_date columns instead
+            of ref_date, is intersected with the entity history interval by interval.
+
+   - entities: optional entity history covering the IDs of univ_df, as returned by
+            fds_entities, e.g. downloaded once for a batch of universes.  The query
+            is skipped when given.
 
 Returns
 -----------
@@ -104,42 +216,76 @@ Returns
 A Pandas DataFrame containing:
 
     ref_id | fsym_primary_listing_id | fsym_primary_equity_id | date | adj_holding | proper_name | factset_entity_id
+
+with start_date | end_date in place of date for an interval encoded univ_df.
         """
+        if entities is None:
+            id_list = univ_df[ref_id].dropna().unique().tolist()
+            entities = cls.fds_entities(id_list, mssql_dsn, id_type)
+        if ref_id != "ref_id":
+            entities = entities.rename(columns={"ref_id": ref_id})
+
+        with timed("process", "fds_symbology", rows=len(univ_df)):
+            if ref_date not in univ_df.columns and is_interval_frame(univ_df):
+                return intersect_intervals(
+                    univ_df.merge(entities, how="inner", on=ref_id),
+                    "start_date",
+                    "end_date",
+                    "entity_start_date",
+                    "entity_end_date",
+                )
+            # point in time entity for every universe row, without merging every
+            # daily row with every entity history row of its ID
+            return interval_join(
+                univ_df,
+                entities,
+                ref_id,
+                ref_date,
+                "entity_start_date",
+                "entity_end_date",
+            ).drop(columns=["entity_start_date", "entity_end_date"])
 
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
+    @classmethod
+    def fds_entities(cls, id_list, mssql_dsn, id_type="0"):
+        """
+fds_entities
+-----------
 
-        id_list = __insert_values__(univ_df[ref_id].dropna().unique().tolist())
-        if id_type == 1:
-            query_file = ls(
-                os.path.join(sql_path, "fds_symbology_df.sql"),
-                show=0,
-                connection=mssql_dsn,
-            )
+Returns the FDS symbology history of a list of IDs, the query behind fds_symbology,
+with an entity_start_date and entity_end_date per row instead of the universe dates.
 
-        else:
-            query_file = ls(
-                os.path.join(sql_path, "fds_symbology_own.sql"),
-                show=0,
-                connection=mssql_dsn,
-            )
+Parameters
+-----------
 
-        q = query_file.format(insert_statements=id_list)
+   - id_list: a python list of FDS or market IDs.
 
-        fds_sym = pd.read_sql(
-            q, connection, parse_dates=["entity_start_date", "entity_end_date"]
-        )
-        fds_sym["ref_id"] = fds_sym.ref_id.str.strip()
-        fds_sym = univ_df.merge(fds_sym, how="inner", on=ref_id)
-
-        fds_sym = fds_sym.loc[
-            (fds_sym[ref_date] >= fds_sym.entity_start_date)
-            & (
-                (fds_sym[ref_date] < fds_sym.entity_end_date)
-                | (fds_sym.entity_end_date.isnull())
-            )
-        ]
-        fds_sym = fds_sym.iloc[:, :-2]
-        return fds_sym
+   - mssql_dsn, id_type: see fds_symbology.
+
+Returns
+-----------
+
+A Pandas DataFrame containing:
+
+    ref_id | fsym_primary_listing_id | fsym_primary_equity_id | entity_start_date | entity_end_date | ...
+        """
+        if id_type == 1:
+            sql_file = "fds_symbology_df.sql"
+        else:
+            sql_file = "fds_symbology_own.sql"
+        query_file = ls(os.path.join(sql_path, sql_file), show=0, connection=mssql_dsn)
+
+        with timed_query(sql_file[:-4]) as query:
+            with checkout(mssql_dsn) as connection:
+                connection = query.wrap(connection)
+                q = query_file.format(
+                    insert_statements=cls.__id_statements__(connection, id_list)
+                )
+                entities = pd.read_sql(
+                    q, connection, parse_dates=["entity_start_date", "entity_end_date"]
+                )
+            entities["ref_id"] = entities.ref_id.str.strip()
+            query.result(entities)
+        return entities
 
     @classmethod
     def fds_sec_ref(cls, entity_id_list, mssql_dsn):
@@ -167,21 +313,26 @@ A Pandas DataFrame containing:
     factset_entity_id | entity_proper_name | country | region | rbics_l1_id | rbics_l1 |....| rbics_l4_id | rbics_l4
 
         """
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-
-        q = ls(
+        query_file = ls(
             os.path.join(sql_path, "fds_sec_ref.sql"), show=0, connection=mssql_dsn
-        ).format(insert_statements=__insert_values__(entity_id_list))
-        ref_data = pd.read_sql(q, connection)
-        to_convert = [
-            "country",
-            "region",
-            "rbics_l1",
-            "rbics_l2",
-            "rbics_l3",
-            "rbics_l4",
-        ]
-        ref_data[to_convert] = ref_data[to_convert].astype("category")
+        )
+        with timed_query("fds_sec_ref") as query:
+            with checkout(mssql_dsn) as connection:
+                connection = query.wrap(connection)
+                q = query_file.format(
+                    insert_statements=cls.__id_statements__(connection, entity_id_list)
+                )
+                ref_data = pd.read_sql(q, connection)
+            to_convert = [
+                "country",
+                "region",
+                "rbics_l1",
+                "rbics_l2",
+                "rbics_l3",
+                "rbics_l4",
+            ]
+            ref_data[to_convert] = ref_data[to_convert].astype("category")
+            query.result(ref_data)
         return ref_data
 
     @classmethod
@@ -197,7 +348,8 @@ Returns daily exchange rates from a list of currency to a common target currency
 Parameters
 -----------
 
-    - currency_list:  A python list containing currency ISO-3
+    - currency_list:  A python list containing currency ISO-3.  None returns every available currency, which
+                      allows the rates to be downloaded before the currencies of a universe are known.
 
     - target_currency: Currency to be converted to (ISO-3)
 
@@ -213,36 +365,67 @@ A Pandas DataFrame containing:
     price_date | currency | currency_to | exch_rate_usd | exch_rate_per_usd_to | fx_rate
 
         """
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-        currency_list.append(target_currency)
-        currency_list = "'" + "','".join(str(c) for c in currency_list) + "'"
+        currency_list = None if currency_list is None else list(currency_list)
+        fx = cls.fds_fx_table(
+            start_date,
+            end_date,
+            mssql_dsn,
+            None if currency_list is None else currency_list + [target_currency],
+        )
+        return FdsFxRates.from_frame(fx).target_frame(target_currency, currency_list)
+
+    @classmethod
+    def fds_fx_table(cls, start_date, end_date, mssql_dsn, currency_list=None):
+        """
+fds_fx_table
+-----------------
+
+Returns daily exchange rates to and from USD, the raw input of fds_fx_rates and of FdsFxRates.
+
+Parameters
+-----------
+
+    - start_date, end_date, mssql_dsn: see fds_fx_rates
+
+    - currency_list:  A python list containing currency ISO-3.  None returns every available currency.
+
+Returns
+-----------
+
+A Pandas DataFrame containing:
+
+    currency | price_date | exch_rate_usd | exch_rate_per_usd
+
+        """
+        if currency_list is None:
+            # every currency in the FX table
+            ids = "SELECT iso_currency FROM ref_v2.fx_rates_usd"
+        else:
+            ids = "'" + "','".join(str(c) for c in currency_list) + "'"
         q = ls(
             os.path.join(sql_path, "fds_fx_rates.sql"), show=0, connection=mssql_dsn
-        ).format(ids=currency_list, sd=start_date, ed=end_date)
-        fx = pd.read_sql(q, connection, parse_dates=["price_date"])
-        fx = pd.merge(
-            fx,
-            fx[fx.currency == target_currency],
-            how="inner",
-            left_on=["price_date"],
-            right_on=["price_date"],
-            suffixes=("", "_to"),
-        )
-        fx = fx[
-            [
-                "price_date",
-                "currency",
-                "currency_to",
-                "exch_rate_usd",
-                "exch_rate_per_usd_to",
-            ]
-        ]
-        fx["fx_rate"] = fx["exch_rate_usd"] * fx["exch_rate_per_usd_to"]
+        ).format(ids=ids, sd=start_date, ed=end_date)
+        with timed_query("fds_fx_rates") as query:
+            with checkout(mssql_dsn) as connection:
+                fx = pd.read_sql(q, query.wrap(connection), parse_dates=["price_date"])
+            query.result(fx)
         return fx
 
     @classmethod
     def fds_prices(
-        cls, regional_id_list, start_date, end_date, currency, adjtype, mssql_dsn
+        cls,
+        regional_id_list,
+        start_date,
+        end_date,
+        currency,
+        adjtype,
+        mssql_dsn,
+        fx_rates=None,
+        shards=None,
+        max_workers=None,
+        adjusted=True,
+        query="calendar",
+        expand=True,
     ):
         """
 fds_prices
@@ -269,6 +452,31 @@ adjtype: Specifies the type of pricing to be returned:
 mssql_dsn: DSN name for a connection to a MSSQL Server DB containing
 
         FDS Standard DataFeeds content.
+fx_rates: optional FdsFxRates, or output of fds_fx_rates for the target currency, downloaded ahead of
+
+        time.  When omitted the rates are downloaded after the price query.
+shards: optional number of partitions of regional_id_list to query concurrently, each on
+
+        its own connection.  Results are merged in partition order.
+max_workers: maximum number of shards running at once, defaults to shards.
+adjusted: False runs a lighter query without the split and spin-off adjusted columns, the
+        all types frame of adjtype 3 then only holds the unadjusted columns.  Adjusted
+        prices can be computed from fds_corp_actions with fds.datax.utils.adjust.
+        Always False for adjtype 0.
+query: the price query run on the server.  "window" and "trading" are written to return the 7-day calendar rows of
+        "calendar", which has only been checked against the synthetic backend of the benchmarks:
+
+ "calendar":  crosses the 7-day calendar with every covered security and looks up the last trade
+              of every day with a correlated subquery.
+ "window":    forward fills the trading rows over the calendar with window functions, scanning
+              the price history of the requested IDs only.
+ "trading":   the "window" query returning trading days only, along with the non-trading days a
+              split, spin-off or change of shares outstanding takes effect, with a non-zero total
+              return, or next to a day missing a total return.  The 7-day calendar is expanded on
+              the client, see fds.datax.utils.intervals.expand_trading_days.
+expand: False returns the rows of query="trading" as the server returns them, with a
+
+        fill_end_date column holding the day after the last calendar day each row stands for.
 **To retrieve FactSet Entity IDs please use the fds_symbology method.
 
 Returns
@@ -278,69 +486,108 @@ ref_id | fsym_id | price_date | currency | one_day_total_return | volume | share
 price_high | price_low | price_open | market_value
         """
 
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-
-        q = ls(
-            os.path.join(sql_path, "fds_prices.sql"), show=0, connection=mssql_dsn
-        ).format(
-            insert_statements=__insert_values__(regional_id_list),
-            sd=start_date,
-            ed=end_date,
+        if not adjusted and adjtype in (1, 2):
+            raise ValueError("adjtype {} requires adjusted prices.".format(adjtype))
+        name, query_file = cls.__prices_query__(
+            mssql_dsn, adjusted and adjtype != 0, query
         )
-        out = []
-        for chunk in pd.read_sql(
-            q, connection, chunksize=10000, parse_dates=["price_date"]
-        ):
-            out.append(chunk)
-        if len(out) > 1:
-            prices = pd.concat(out)
-        else:
-            prices = pd.read_sql(q, connection, parse_dates=["price_date"])
-        del out
-
-        to_convert = ["currency"]
-        prices[to_convert] = prices[to_convert].astype("category")
-        ######################################
-        # Handle FX rate conversions
-        ######################################
-        curr_list = prices.currency.unique().tolist()
-        curr_list.append(currency)
-        curr_list = list(set(curr_list))
-
-        if currency.upper() == "LOCAL" or (
-            len(curr_list) == 1 and curr_list[0] == currency.upper()
-        ):
-            pass
-        else:
 
-            # Get FX
-            fx = cls.fds_fx_rates(curr_list, currency, start_date, end_date, mssql_dsn)
-            filtered_fx = fx[fx.currency == currency].copy()
-
-            fx = fx.merge(
-                filtered_fx, how="inner", on=["price_date"], suffixes=("", "_target")
-            )
-
-            fx = fx[
-                [
-                    "price_date",
-                    "currency",
-                    "currency_to",
-                    "exch_rate_usd",
-                    "exch_rate_per_usd_to_target",
-                ]
-            ]
-            fx["fx_rate"] = fx["exch_rate_usd"] * fx["exch_rate_per_usd_to_target"]
-            fx = fx[["price_date", "currency", "currency_to", "fx_rate"]]
-
-            prices = prices.merge(fx, how="left", on=["price_date", "currency"])
-            prices.iloc[:, 5:20] = prices.iloc[:, 5:20].multiply(
-                prices["fx_rate"], axis="index"
-            )
+        def fetch(ids):
+            with timed_query(name) as timer:
+                with checkout(mssql_dsn) as connection:
+                    connection = timer.wrap(connection)
+                    q = query_file.format(
+                        insert_statements=cls.__id_statements__(connection, ids),
+                        sd=start_date,
+                        ed=end_date,
+                        trading_days=int(query == "trading"),
+                    )
+                    prices = read_sql_stream(
+                        q,
+                        connection,
+                        arraysize=cls.fetch_arraysize,
+                        parse_dates=["price_date", FILL_END],
+                    )
+                timer.result(prices)
+            return cls.__fill_calendar__(prices, query, expand)
+
+        prices = cls.__run_sharded__(fetch, regional_id_list, shards, max_workers)
+
+        with timed("process", name, rows=len(prices)):
+            to_convert = ["currency"]
+            prices[to_convert] = prices[to_convert].astype("category")
+            ######################################
+            # Handle FX rate conversions
+            ######################################
+            curr_list = prices.currency.unique().tolist()
+            curr_list.append(currency)
+            curr_list = list(set(curr_list))
+
+            if currency.upper() == "LOCAL" or (
+                len(curr_list) == 1 and curr_list[0] == currency.upper()
+            ):
+                pass
+            else:
+                fx = cls.__fx_engine__(
+                    curr_list, start_date, end_date, mssql_dsn, fx_rates
+                )
+                prices = cls.__apply_fx__(prices, fx, currency)
+
+            return cls.__select_adjtype__(prices, adjtype)
+
+    @staticmethod
+    def __prices_query__(mssql_dsn, adjusted=True, query="calendar"):
+        """
+        Returns the name and template of a price query, see fds_prices, with or without
+        the adjusted price columns.  "window" and "trading" share a template.
+        """
+        if query not in PRICE_QUERIES:
+            raise ValueError("query must be one of {}".format(PRICE_QUERIES))
+        name = "fds_prices" if query == "calendar" else "fds_prices_window"
+        if not adjusted:
+            name += "_unadj"
+        sql_file = os.path.join(sql_path, name + ".sql")
+        return name, ls(sql_file, show=0, connection=mssql_dsn)
+
+    @staticmethod
+    def __fill_calendar__(prices, query, expand=True):
+        """
+        Returns the rows of a price query on the 7-day calendar, expanding the trading
+        days of query="trading" unless expand is False.
+        """
+        if query == "trading" and expand:
+            return expand_trading_days(prices)
+        if query == "trading" or FILL_END not in prices.columns:
+            return prices
+        return prices.drop(columns=FILL_END)
 
-            prices = prices.drop("currency", axis=1)
+    @classmethod
+    def __fx_engine__(cls, curr_list, start_date, end_date, mssql_dsn, fx_rates=None):
+        """
+        Returns an FdsFxRates for converting the currencies in curr_list, None for every
+        currency.  fx_rates is a previously downloaded FdsFxRates or fds_fx_rates frame to
+        use instead of querying.
+        """
+        if isinstance(fx_rates, FdsFxRates):
+            return fx_rates
+        if fx_rates is None:
+            fx_rates = cls.fds_fx_table(start_date, end_date, mssql_dsn, curr_list)
+        return FdsFxRates.from_frame(fx_rates)
+
+    @staticmethod
+    def __apply_fx__(prices, fx, currency):
+        """
+        Converts the price valued columns of an all types (adjtype=3) price frame, those of
+        FX_COLUMNS, to currency.
+        The rate of every row is gathered from the dense FdsFxRates matrices by position.
+        """
+        return fx.convert(prices, currency, FX_COLUMNS)
 
-            prices.rename(columns={"currency_to": "currency"}, inplace=True)
+    @staticmethod
+    def __select_adjtype__(prices, adjtype):
+        """
+        Reduces an all types price frame to the columns of the requested adjustment type.
+        """
         if adjtype == 0:
             # unadjusted data
             p_type = [
@@ -392,6 +639,8 @@ price_high | price_low | price_open | market_value
             ]
         else:
             return prices
+        if FILL_END in prices.columns:
+            p_type = p_type + [FILL_END]
         prices = prices[p_type]
         prices.columns = [
             col.replace("unadj_", "")
@@ -403,7 +652,71 @@ price_high | price_low | price_open | market_value
         return prices
 
     @classmethod
-    def fds_corp_actions(cls, regional_id_list, mssql_dsn):
+    def fds_prices_batches(
+        cls,
+        regional_id_list,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        fx_rates=None,
+        adjusted=True,
+        query="calendar",
+    ):
+        """
+fds_prices_batches
+-----------------
+
+Streaming form of fds_prices(..., adjtype=3).  The price query is executed once and a DataFrame is yielded for every
+cursor.fetchmany batch of fetch_arraysize rows, so memory use is bounded by the batch size rather than the universe.
+Unless fx_rates is given, the FX rates of every currency are downloaded before the price query, so the generator
+never waits for a second pooled connection while it holds one.
+
+Parameters
+-----------
+
+    - regional_id_list, start_date, end_date, currency, mssql_dsn, fx_rates, adjusted, query: see fds_prices.
+      Batches of query="trading" are expanded to the 7-day calendar.
+
+Yields
+-----------
+
+Pandas DataFrames with the columns of fds_prices(..., adjtype=3).
+        """
+        name, query_file = cls.__prices_query__(mssql_dsn, adjusted, query)
+        fx = None
+        if currency.upper() != "LOCAL":
+            # the currencies of the prices are not known before the query
+            fx = cls.__fx_engine__(None, start_date, end_date, mssql_dsn, fx_rates)
+        with timed_query(name) as timer, checkout(mssql_dsn) as connection:
+            connection = timer.wrap(connection)
+            q = query_file.format(
+                insert_statements=cls.__id_statements__(connection, regional_id_list),
+                sd=start_date,
+                ed=end_date,
+                trading_days=int(query == "trading"),
+            )
+            for columns, _, values in iter_batches(
+                connection, q, arraysize=cls.fetch_arraysize
+            ):
+                prices = pd.DataFrame(dict(zip(columns, values)), columns=columns)
+                for col in ("price_date", FILL_END):
+                    if col in prices.columns:
+                        prices[col] = pd.to_datetime(prices[col])
+                # every row carries the end of its days, so batches expand alone
+                prices = cls.__fill_calendar__(prices, query)
+                if fx is not None:
+                    prices = cls.__apply_fx__(prices, fx, currency)
+                timer.result(prices)
+                # the time the consumer spends on a batch is not part of the query
+                paused = time.perf_counter()
+                yield prices
+                timer.idle(time.perf_counter() - paused)
+
+    @classmethod
+    def fds_corp_actions(
+        cls, regional_id_list, mssql_dsn, shards=None, max_workers=None
+    ):
         """
 fds_corp_actions
 -----------------
@@ -418,6 +731,10 @@ Parameters
     - mssql_dsn: DSN name for a connection to a MSSQL Server DB containing
                  FDS Standard DataFeeds content.
 
+    - shards: optional number of partitions of regional_id_list to query concurrently, see fds_prices.
+
+    - max_workers: maximum number of shards running at once, defaults to shards.
+
 **To retrieve FactSet Regional IDs please use the fds_symbology method.
 
 Returns
@@ -428,11 +745,21 @@ A Pandas DataFrame containing:
     ref_id | fsym_id | price_date | cum_split_factor | cum_spin_factor
 
         """
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-
-        q = ls(
+        query_file = ls(
             os.path.join(sql_path, "fds_corp_actions.sql"), show=0, connection=mssql_dsn
-        ).format(insert_statements=__insert_values__(regional_id_list))
-        ca = pd.read_sql(q, connection)
+        )
+
+        def fetch(ids):
+            with timed_query("fds_corp_actions") as query:
+                with checkout(mssql_dsn) as connection:
+                    connection = query.wrap(connection)
+                    q = query_file.format(
+                        insert_statements=cls.__id_statements__(connection, ids)
+                    )
+                    ca = pd.read_sql(q, connection)
+                query.result(ca)
+            return ca
+
+        ca = cls.__run_sharded__(fetch, regional_id_list, shards, max_workers)
 
         return ca
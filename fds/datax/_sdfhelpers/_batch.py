@@ -0,0 +1,271 @@
+import threading
+
+import pandas as pd
+
+from fds.datax._get_data._get_data import GetSDFData as fd
+
+
+def __select__(df, mask):
+    """
+    The rows of a shared query result selected for one cache, without the categories
+    only used by other caches.
+    """
+    df = df.loc[mask].reset_index(drop=True)
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].cat.remove_unused_categories()
+    return df
+
+
+class FdsBatchData:
+    """
+    Answers the queries of a batch of cache builds, running each one once over the
+    union of the IDs of every cache in the batch that shares its parameters.
+
+    FdsDataStore.build_batch builds its caches with an FdsBatchData in place of
+    GetSDFData.  The first cache to ask for symbology, security reference data,
+    prices or corporate actions downloads them for the whole batch and later caches
+    select their IDs and dates from the shared result, so securities held by several
+    caches are downloaded once.  Prices are shared by the caches with the same DSN,
+    currency and adjustment mode, from the earliest start date among them.  Requests
+    the batch does not cover are passed on to GetSDFData.
+
+    jobs is a list of dicts holding the univ, mssql_dsn, id_type, currency,
+    start_date and adjusted of every cache, see FdsDataStore.build_batch.
+    """
+
+    def __init__(self, jobs, shards=None):
+        self.jobs = jobs
+        self.shards = shards
+        self._results = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def __shared__(self, key, fetch):
+        """
+        Returns the result stored under key, calling fetch for it the first time.
+        Concurrent callers wait for the first one rather than running the query twice.
+        """
+        with self._lock:
+            lock = self._locks.setdefault(key, threading.Lock())
+        with lock:
+            if key not in self._results:
+                self._results[key] = fetch()
+        return self._results[key]
+
+    def __jobs__(self, **params):
+        return [
+            i
+            for i, job in enumerate(self.jobs)
+            if all(job[k] == v for k, v in params.items())
+        ]
+
+    def __entities__(self, mssql_dsn, id_type):
+        def fetch():
+            ids = set()
+            for i in self.__jobs__(mssql_dsn=mssql_dsn, id_type=id_type):
+                ids.update(self.jobs[i]["univ"]["ref_id"].dropna().unique())
+            return fd.fds_entities(sorted(ids), mssql_dsn, id_type)
+
+        return self.__shared__(("entities", mssql_dsn, id_type), fetch)
+
+    def __symbology__(self, i):
+        job = self.jobs[i]
+
+        def fetch():
+            entities = self.__entities__(job["mssql_dsn"], job["id_type"])
+            return fd.fds_symbology(
+                job["univ"], job["mssql_dsn"], id_type=job["id_type"], entities=entities
+            )
+
+        return self.__shared__(("symbology", i), fetch)
+
+    def __ids__(self, column, jobs):
+        ids = set()
+        for i in jobs:
+            ids.update(self.__symbology__(i)[column].dropna().unique())
+        return ids
+
+    def fds_symbology(
+        self, univ_df, mssql_dsn, id_type="0", ref_id="ref_id", ref_date="date"
+    ):
+        for i, job in enumerate(self.jobs):
+            if (
+                job["univ"] is univ_df
+                and (job["mssql_dsn"], job["id_type"]) == (mssql_dsn, id_type)
+                and (ref_id, ref_date) == ("ref_id", "date")
+            ):
+                return self.__symbology__(i)
+        return fd.fds_symbology(univ_df, mssql_dsn, id_type, ref_id, ref_date)
+
+    def fds_sec_ref(self, entity_id_list, mssql_dsn):
+        jobs = self.__jobs__(mssql_dsn=mssql_dsn)
+
+        def fetch():
+            ids = self.__ids__("factset_entity_id", jobs)
+            return ids, fd.fds_sec_ref(sorted(ids), mssql_dsn)
+
+        if not jobs:
+            return fd.fds_sec_ref(entity_id_list, mssql_dsn)
+        ids, ref_data = self.__shared__(("sec_ref", mssql_dsn), fetch)
+        if not set(entity_id_list) <= ids:
+            return fd.fds_sec_ref(entity_id_list, mssql_dsn)
+        ref_data = __select__(
+            ref_data, ref_data.factset_entity_id.isin(entity_id_list)
+        )
+        # rows in the order of entity_id_list, as a query for the cache returns them
+        order = {e: n for n, e in enumerate(entity_id_list)}
+        return ref_data.sort_values(
+            "factset_entity_id", key=lambda s: s.astype(object).map(order)
+        ).reset_index(drop=True)
+
+    def __prices__(
+        self,
+        regional_id_list,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        fx_rates,
+        adjusted,
+        query,
+    ):
+        """
+        The all types (adjtype=3) prices of a cache selected from the prices shared by
+        its batch, None when the batch does not cover the request.
+        """
+        jobs = [
+            i
+            for i in self.__jobs__(mssql_dsn=mssql_dsn, adjusted=adjusted)
+            if self.jobs[i]["currency"].upper() == currency.upper()
+        ]
+        if not jobs:
+            return None
+        first = min(pd.Timestamp(self.jobs[i]["start_date"]) for i in jobs)
+
+        def fetch():
+            ids = self.__ids__("fsym_primary_listing_id", jobs)
+            prices = fd.fds_prices(
+                sorted(ids),
+                first.strftime("%Y-%m-%d"),
+                end_date,
+                currency,
+                3,
+                mssql_dsn,
+                fx_rates=fx_rates,
+                shards=self.shards,
+                adjusted=adjusted,
+                query=query,
+            )
+            return ids, prices
+
+        key = ("prices", mssql_dsn, currency.upper(), adjusted, end_date, query)
+        ids, prices = self.__shared__(key, fetch)
+        if pd.Timestamp(start_date) < first or not set(regional_id_list) <= ids:
+            return None
+        return __select__(
+            prices,
+            prices.fsym_id.isin(regional_id_list)
+            & (prices.price_date >= pd.Timestamp(start_date)),
+        )
+
+    def fds_prices(
+        self,
+        regional_id_list,
+        start_date,
+        end_date,
+        currency,
+        adjtype,
+        mssql_dsn,
+        fx_rates=None,
+        shards=None,
+        max_workers=None,
+        adjusted=True,
+        query="calendar",
+        expand=True,
+    ):
+        prices = None
+        # requests fds_prices rejects, and unexpanded trading days, are passed on
+        if (adjusted or adjtype not in (1, 2)) and expand:
+            prices = self.__prices__(
+                regional_id_list,
+                start_date,
+                end_date,
+                currency,
+                mssql_dsn,
+                fx_rates,
+                adjusted and adjtype != 0,
+                query,
+            )
+        if prices is None:
+            return fd.fds_prices(
+                regional_id_list,
+                start_date,
+                end_date,
+                currency,
+                adjtype,
+                mssql_dsn,
+                fx_rates=fx_rates,
+                shards=shards,
+                max_workers=max_workers,
+                adjusted=adjusted,
+                query=query,
+                expand=expand,
+            )
+        return fd.__select_adjtype__(prices, adjtype)
+
+    def fds_prices_batches(
+        self,
+        regional_id_list,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        fx_rates=None,
+        adjusted=True,
+        query="calendar",
+    ):
+        """
+        Yields the shared prices of a cache as a single batch, they are already in
+        memory.
+        """
+        prices = self.__prices__(
+            regional_id_list,
+            start_date,
+            end_date,
+            currency,
+            mssql_dsn,
+            fx_rates,
+            adjusted,
+            query,
+        )
+        if prices is None:
+            yield from fd.fds_prices_batches(
+                regional_id_list,
+                start_date,
+                end_date,
+                currency,
+                mssql_dsn,
+                fx_rates=fx_rates,
+                adjusted=adjusted,
+                query=query,
+            )
+        else:
+            yield prices
+
+    def fds_corp_actions(
+        self, regional_id_list, mssql_dsn, shards=None, max_workers=None
+    ):
+        jobs = self.__jobs__(mssql_dsn=mssql_dsn)
+
+        def fetch():
+            ids = self.__ids__("fsym_primary_listing_id", jobs)
+            return ids, fd.fds_corp_actions(sorted(ids), mssql_dsn, shards=self.shards)
+
+        if jobs:
+            ids, ca = self.__shared__(("corp_actions", mssql_dsn), fetch)
+            if set(regional_id_list) <= ids:
+                return __select__(ca, ca.fsym_id.isin(regional_id_list))
+        return fd.fds_corp_actions(
+            regional_id_list, mssql_dsn, shards=shards, max_workers=max_workers
+        )
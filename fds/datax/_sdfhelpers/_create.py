@@ -1,16 +1,235 @@
 import os
+import numpy as np
 import pandas as pd
-import pyodbc
+import pyarrow as pa
+import pyarrow.parquet as pq
 
-from fds.datax._get_data._get_data import GetSDFData as fd
+from fds.datax._get_data._get_data import PRICE_QUERIES, GetSDFData as fd
+from fds.datax._sdfhelpers._batch import FdsBatchData
 from fds.datax._sdfhelpers._find import FdsDataStoreLedger
+from fds.datax.utils import securities, snapshots, store, tablecache
+from fds.datax.utils.adjust import factor_table, is_unadjusted
+from fds.datax.utils.dtypes import FdsDtypePolicy, stored_float32
+from fds.datax.utils.fx import FdsFxRates, fx_lock, load_fx, merge_fx
 from fds.datax.utils.helper_func import __valid_cache_name__
+from fds.datax.utils.intervals import INTERVAL_COLUMNS
 from fds.datax.utils.ipyexit import IpyExit
+from fds.datax.utils.loadsql import set_entitlement_store
+from fds.datax.utils.metrics import collecting, timed
+from fds.datax.utils.pipeline import FdsBuildPipeline, print_progress
+
+
+def __write_batch__(writer, fname, df, dtypes=None):
+    """
+    Appends a DataFrame to a parquet file as a new row group, opening the ParquetWriter
+    with the schema of the first batch, cast to the FdsDtypePolicy dtypes when given.
+    Returns the writer.
+    """
+    if writer is None:
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+        for i, field in enumerate(schema):
+            # columns that are entirely null in the first batch are stored as strings
+            if pa.types.is_null(field.type):
+                schema = schema.set(i, field.with_type(pa.string()))
+        if dtypes is not None:
+            schema = dtypes.schema(schema)
+        writer = pq.ParquetWriter(fname, schema, compression="snappy")
+    elif len(df) == 0:
+        return writer
+    writer.write_table(
+        pa.Table.from_pandas(df, schema=writer.schema, preserve_index=False)
+    )
+    return writer
+
+
+def __split_corp_actions__(prices, id_map):
+    """
+    Maps ref_id onto an all types (adjtype=3) price frame and splits off the corporate
+    action rows.  Returns the price frame without the adjustment factor columns and the
+    corporate actions frame.
+    """
+    prices["ref_id"] = prices.fsym_id.map(id_map)
+    corp_actions = prices.loc[prices.adj_factor_flag == 1][
+        ["ref_id", "fsym_id", "price_date", "cum_split_factor", "cum_spin_factor"]
+    ].copy()
+    prices = prices.loc[
+        :,
+        ~prices.columns.isin(
+            ["cum_split_factor", "cum_spin_factor", "adj_factor_flag"]
+        ),
+    ]
+    return prices, corp_actions
 
 
 class FdsDataStore:
-    def __init__(self, dir_path):
+    def __init__(
+        self,
+        dir_path,
+        stream_prices=False,
+        max_workers=4,
+        progress=print_progress,
+        price_shards=None,
+        layout=None,
+        sidecar=None,
+        intervals=False,
+        adjust_on_read=None,
+        float32=None,
+        metrics=None,
+        keep_snapshots=1,
+        price_query="calendar",
+    ):
+        """
+        stream_prices: write pricing and corporate actions to parquet one fetch batch at a
+                       time instead of holding the full price history in memory.
+        max_workers: number of cache build steps run concurrently.
+        progress: callable receiving build progress, see FdsBuildPipeline.
+        price_shards: number of concurrent partitions used for the price query, see
+                      GetSDFData.fds_prices.  Ignored when stream_prices is set.
+        layout: "file" writes one snappy parquet file per cache component, "dataset"
+                writes the dated components as directories partitioned by year/month.
+                "shared" stores pricing and corporate actions once per security for
+                the whole data store, the cache only keeping a manifest of its
+                securities, see fds.datax.utils.securities.  None keeps the layout of
+                an existing cache and defaults to "file".
+        sidecar: also write an uncompressed Arrow IPC copy of each cache component, which
+                 readers memory map so processes on one host share a single copy in the
+                 page cache.  None keeps the sidecars of an existing cache.
+        intervals: store an ETF universe as membership intervals instead of one row per
+                   day, readers expand it to daily rows on request.  Rebuilds keep the
+                   encoding the cache is stored in.
+        adjust_on_read: only download and store unadjusted prices along with every
+                        corporate action factor, split and spin-off adjusted prices are
+                        computed by readers.  None keeps the mode of an existing cache
+                        and defaults to False.
+        float32: store price and volume columns as float32 instead of float64.  None
+                 keeps the precision of an existing cache and defaults to False.  ID
+                 columns are always dictionary encoded and dates stored as date32, see
+                 FdsDtypePolicy.
+        metrics: a sink, or list of sinks, receiving the timing records of every
+                 query, build stage and file write, see fds.datax.utils.metrics.  None
+                 uses the sinks set with set_metrics_sinks, if any.
+        keep_snapshots: number of earlier versions of a cache kept after a build.
+                        Builds write a new version next to the published one and
+                        publish it atomically once complete, see
+                        fds.datax.utils.snapshots, so readers always see a complete
+                        cache and those still reading an earlier version can finish.
+        price_query: "calendar", "window" or "trading", the price query the caches are
+                     built from, see GetSDFData.fds_prices.
+        """
         self.dir_path = dir_path
+        self.stream_prices = stream_prices
+        self.max_workers = max_workers
+        self.progress = progress
+        self.price_shards = price_shards
+        if price_query not in PRICE_QUERIES:
+            raise ValueError("price_query must be one of {}".format(PRICE_QUERIES))
+        self.price_query = price_query
+        if layout is not None and layout not in store.LAYOUTS:
+            raise ValueError("layout must be one of {}".format(store.LAYOUTS))
+        self.layout = layout
+        self.sidecar = sidecar
+        self.intervals = intervals
+        self.adjust_on_read = adjust_on_read
+        self.float32 = float32
+        self.dtypes = {}
+        self.metrics = metrics
+        self.keep_snapshots = keep_snapshots
+        # the published cache each staged build replaces, see __source__
+        self.sources = {}
+        # the writer options of the shared layout per staged build, see __run_build__
+        self.shared = {}
+        # answers the queries of the build steps, an FdsBatchData in build_batch
+        self.data = fd
+        # persist table entitlement checks alongside the cache files
+        set_entitlement_store(os.path.join(self.dir_path, "fdsDataStore"))
+
+    def __source__(self, fname):
+        """
+        The published files of the cache a staged build writes to fname, where the
+        options that keep the mode of an existing cache are read from.
+        """
+        return self.sources.get(fname, fname)
+
+    def __layout__(self, fname, name):
+        layout = self.layout or store.detect_layout(self.__source__(fname), name)
+        return layout or "file"
+
+    def __adjust_on_read__(self, fname):
+        if self.adjust_on_read is not None:
+            return self.adjust_on_read
+        source = self.__source__(fname)
+        return store.exists(source, "_prices") and is_unadjusted(
+            store.read_schema(source, "_prices")
+        )
+
+    def __dtypes__(self, fname):
+        """
+        The FdsDtypePolicy cache components are written with, resolved once per build
+        by __get_data__.
+        """
+        if fname in self.dtypes:
+            return self.dtypes[fname]
+        float32 = self.float32
+        source = self.__source__(fname)
+        if float32 is None:
+            float32 = store.exists(source, "_prices") and stored_float32(
+                store.read_arrow_schema(source, "_prices")
+            )
+        return FdsDtypePolicy(float32=float32)
+
+    def __collect__(self, cache_name):
+        """
+        Collects the metrics of a build, see fds.datax.utils.metrics.collecting.
+        """
+        return collecting(self.metrics, cache_name=cache_name, dir_path=self.dir_path)
+
+    def __write__(self, df, fname, name):
+        """
+        Writes a cache component in the layout and dtypes of this data store.
+        """
+        layout = self.__layout__(fname, name)
+        with timed("write", name, rows=len(df)):
+            if layout == "shared" and name in securities.COMPONENTS:
+                store.remove(fname, name)
+                writer = self.__shared_writer__(fname, name)
+                writer.write(df)
+                writer.close()
+            else:
+                store.write_frame(df, fname, name, layout, self.__dtypes__(fname))
+
+    def __shared_writer__(self, fname, name):
+        """
+        An FdsSecurityWriter for a component of the staged build at fname.
+        """
+        shared = self.shared[fname]
+        start_date = shared["start_date"]
+        if name == "_corp_actions" and not shared["key"]["adjusted"]:
+            # every corporate action factor is kept, see factor_table
+            start_date = None
+        return securities.FdsSecurityWriter(
+            fname,
+            name,
+            os.path.join(self.dir_path, "fdsDataStore", securities.SECURITIES),
+            self.__dtypes__(fname),
+            key=shared["key"],
+            start_date=start_date,
+        )
+
+    def __write_sidecars__(self, fname):
+        """
+        Refreshes or removes the Arrow sidecars of a cache after a build.
+        """
+        for name in store.COMPONENTS:
+            if self.sidecar is None:
+                source = self.__source__(fname)
+                keep = os.path.exists(store.sidecar_path(source, name))
+            else:
+                keep = self.sidecar
+            if keep:
+                with timed("write", name + " sidecar"):
+                    store.write_sidecar(fname, name)
+            else:
+                store.remove_sidecar(fname, name)
 
     def __get_data__(
         self,
@@ -21,23 +240,122 @@ class FdsDataStore:
         start_date: object,
         fname: object,
         df_type: object,
+        lookback_days: object = None,
     ) -> object:
         """
         df_type is used to flag the import type.  Different queries are used for
         Step 1 depending on file import vs Ownership universe.  
         0: Ownership
         1: import. 
+
+        lookback_days switches pricing to an incremental refresh of the existing cache
+        files, see __build_prices_incremental__.
+
+        The files are written to a staging directory and published as a new version of
+        the cache once every step succeeded, see fds.datax.utils.snapshots.  A failed
+        build leaves the published cache untouched.
+
+        Returns the high water mark, the most recent price date in the cache.
         """
+        with self.__collect__(cache_name):
+            return self.__run_build__(
+                univ, mssql_dsn, currency, start_date, fname, df_type, lookback_days
+            )
 
+    def __run_build__(
+        self, univ, mssql_dsn, currency, start_date, fname, df_type, lookback_days
+    ):
+        """
+        Stages, builds and publishes a new version of the cache at fname.
+        """
         ed = pd.to_datetime("today").strftime("%Y-%m-%d")
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
+        staged = snapshots.stage(fname)
+        self.sources[staged] = snapshots.resolve(fname)
+        try:
+            self.dtypes[staged] = self.__dtypes__(staged)
+            # shared blobs are reused by builds of the same data as of the same day
+            key = {
+                "currency": currency.upper(),
+                "adjusted": not self.__adjust_on_read__(staged),
+                "float32": bool(self.dtypes[staged].float32),
+                "as_of": ed,
+            }
+            self.shared[staged] = {"key": key, "start_date": start_date}
+            high_water = self.__run_steps__(
+                univ,
+                mssql_dsn,
+                currency,
+                start_date,
+                ed,
+                staged,
+                df_type,
+                lookback_days,
+            )
+        except BaseException:
+            snapshots.discard(staged)
+            raise
+        finally:
+            self.sources.pop(staged)
+            self.dtypes.pop(staged, None)
+            self.shared.pop(staged, None)
+        with timed("write", "publish"):
+            snapshots.publish(fname, staged, self.keep_snapshots)
+        print("FDS Cache Created.")
+        return high_water
 
-        #####################################
-        ## Step 1: Attach FDS Symbology
-        #####################################
+    def __run_steps__(
+        self, univ, mssql_dsn, currency, start_date, ed, fname, df_type, lookback_days
+    ):
+        """
+        The build steps of __get_data__, run as an FdsBuildPipeline writing the cache
+        files to the staged fname with data up to ed.
+        """
+        # Sec ref only needs the entity IDs and prices only need the regional IDs,
+        # so both start as soon as symbology is saved.  FX rates do not depend on
+        # the universe and are downloaded alongside everything else.
+        pipeline = FdsBuildPipeline(
+            max_workers=self.max_workers, progress=self.progress
+        )
+        pipeline.add(
+            "symbology",
+            lambda: self.__build_symbology__(univ, mssql_dsn, df_type, fname),
+            description="Downloading FDS Symbology for Universe File",
+        )
+        pipeline.add(
+            "sec_ref",
+            lambda symbology: self.__build_sec_ref__(symbology, mssql_dsn, fname),
+            deps=["symbology"],
+            description="Downloading Security Reference Data for Universe File",
+        )
+        pipeline.add(
+            "fx_rates",
+            lambda: self.__build_fx_rates__(currency, start_date, ed, mssql_dsn),
+            description="Downloading FX Rates",
+        )
+        if lookback_days is None:
+            build_prices = self.__build_prices__
+        else:
+
+            def build_prices(*args):
+                return self.__build_prices_incremental__(*args, lookback_days)
 
-        print("Downloading FDS Symbology for Universe File...")
-        fds_sym = fd.fds_symbology(
+        pipeline.add(
+            "prices",
+            lambda symbology, fx_rates: build_prices(
+                symbology, fx_rates, currency, start_date, ed, mssql_dsn, fname
+            ),
+            deps=["symbology", "fx_rates"],
+            description="Downloading Pricing for Universe File",
+        )
+        results = pipeline.run()
+        self.__write_sidecars__(fname)
+        return results["prices"]
+
+    def __build_symbology__(self, univ, mssql_dsn, df_type, fname):
+        """
+        Step 1: attach FDS Symbology to the universe and save the _univ file.
+        """
+        fds_sym = self.data.fds_symbology(
             univ_df=univ,
             mssql_dsn=mssql_dsn,
             id_type=df_type,
@@ -45,22 +363,17 @@ class FdsDataStore:
             ref_date="date",
         )
 
-        print("\tFDS Symbology Downloaded.")
-        ## Create Master Universe DataFrame
-        sec_ref_univ = fds_sym.factset_entity_id.dropna().unique().tolist()
-        prices_univ = fds_sym.fsym_primary_listing_id.dropna().unique().tolist()
-
-        ## Export file to Feather
-
-        print("\tSaving FDS Universe File as {}_univ.snappy\n".format(fname))
+        self.__write__(fds_sym, fname, "_univ")
+        return fds_sym
 
-        fds_sym.reset_index(drop=True).to_parquet(fname + "_univ.snappy")
-
-        ######################################
-        ## Step 2: Grabbing Security Reference
-        ######################################
-        print("Downloading Security Reference Data for Universe File...")
-        ref_data = fd.fds_sec_ref(entity_id_list=sec_ref_univ, mssql_dsn=mssql_dsn)
+    def __build_sec_ref__(self, fds_sym, mssql_dsn, fname):
+        """
+        Step 2: download security reference data for the universe entities and save the _ref_data file.
+        """
+        sec_ref_univ = fds_sym.factset_entity_id.dropna().unique().tolist()
+        ref_data = self.data.fds_sec_ref(
+            entity_id_list=sec_ref_univ, mssql_dsn=mssql_dsn
+        )
 
         id_map = dict(zip(fds_sym.factset_entity_id.tolist(), fds_sym.ref_id.tolist()))
         ref_data["ref_id"] = ref_data.factset_entity_id.map(id_map)
@@ -81,56 +394,423 @@ class FdsDataStore:
             ]
         ]
 
-        print("\tSaving Universe Metadata File as {}_ref_data.snappy\n".format(fname))
-        # feather.write_dataframe(ref_data,fname+'_ref_data.feather')
+        self.__write__(ref_data, fname, "_ref_data")
 
-        ref_data.to_parquet(fname + "_ref_data.snappy")
+    def __build_fx_rates__(self, currency, start_date, end_date, mssql_dsn):
+        """
+        FX rates for every currency, shared by all caches in the data store.  The rates
+        persisted in fds_fx_rates.snappy are reused and only the dates they do not
+        cover yet are downloaded.  None for LOCAL currency caches.
+        """
+        if currency.upper() == "LOCAL":
+            return None
+        store_dir = os.path.join(self.dir_path, "fdsDataStore")
+        with fx_lock():
+            fx = load_fx(store_dir)
+            if fx is not None and fx.covers(start_date, end_date):
+                return fx
+            sd, ed = pd.Timestamp(start_date), pd.Timestamp(end_date)
+            day = pd.Timedelta(days=1)
+            if fx is None:
+                missing = [(sd, ed)]
+            else:
+                fx_start, fx_end = pd.Timestamp(fx.start), pd.Timestamp(fx.end())
+                missing = []
+                if sd < fx_start:
+                    missing.append((sd, fx_start - day))
+                if ed > fx_end:
+                    missing.append((fx_end + day, ed))
+            for first, last in missing:
+                table = fd.fds_fx_table(
+                    first.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d"), mssql_dsn
+                )
+                downloaded = FdsFxRates.from_frame(table, np.datetime64(first, "D"))
+                fx = downloaded if fx is None else fx.combine(downloaded)
+            with timed("write", "fx_rates"):
+                fx = merge_fx(fx, store_dir)
+        return fx
 
-        #####################################
-        ## Step 3: Grab Pricings
-        #####################################
-        print(
-            "Downloading Pricing for Universe File...\n \tThis can take a few minutes...\n\n"
+    def __build_prices__(
+        self, fds_sym, fx_rates, currency, start_date, end_date, mssql_dsn, fname
+    ):
+        """
+        Step 3: download pricing for the universe and save the _corp_actions and _prices files.
+        """
+        prices_univ = fds_sym.fsym_primary_listing_id.dropna().unique().tolist()
+        id_map = dict(
+            zip(fds_sym.fsym_primary_listing_id.tolist(), fds_sym.ref_id.tolist())
         )
-        prices = fd.fds_prices(
+        adjusted = not self.__adjust_on_read__(fname)
+        if self.__layout__(fname, "_prices") == "shared":
+            return self.__build_shared_prices__(
+                prices_univ,
+                start_date,
+                end_date,
+                currency,
+                mssql_dsn,
+                id_map,
+                fname,
+                fx_rates,
+            )
+        if self.stream_prices:
+            return self.__stream_prices__(
+                prices_univ,
+                start_date,
+                end_date,
+                currency,
+                mssql_dsn,
+                id_map,
+                fname,
+                fx_rates,
+            )
+
+        prices = self.data.fds_prices(
             regional_id_list=prices_univ,
             start_date=start_date,
-            end_date=ed,
+            end_date=end_date,
             currency=currency,
             adjtype=3,
             mssql_dsn=mssql_dsn,
+            fx_rates=fx_rates,
+            shards=self.price_shards,
+            adjusted=adjusted,
+            query=self.price_query,
         )
+
+        if adjusted:
+            prices, corp_actions = __split_corp_actions__(prices, id_map)
+        else:
+            prices["ref_id"] = prices.fsym_id.map(id_map)
+            corp_actions = self.__factor_table__(prices_univ, mssql_dsn, id_map)
+
+        ########################################
+        ## Create Corporate Actions File
+        ########################################
+
+        self.__write__(corp_actions, fname, "_corp_actions")
+        del corp_actions
+
+        self.__write__(prices, fname, "_prices")
+        return prices.price_date.max()
+
+    def __build_shared_prices__(
+        self,
+        prices_univ,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        id_map,
+        fname,
+        fx_rates=None,
+    ):
+        """
+        Step 3 in the shared layout.  Securities another cache of the data store holds
+        with the same currency, adjustment mode and precision, as of the same day and
+        from start_date or earlier, are referenced rather than downloaded, see
+        securities.reusable.  The others are downloaded and written as security blobs,
+        then both manifests are written.
+        """
+        adjusted = not self.__adjust_on_read__(fname)
+        reused = securities.reusable(
+            os.path.join(self.dir_path, "fdsDataStore"),
+            self.shared[fname]["key"],
+            prices_univ,
+            start_date,
+        )
+        held = set(reused["_prices"].fsym_id)
+        fetch = [i for i in prices_univ if i not in held]
+        writers = {
+            name: self.__shared_writer__(fname, name) for name in securities.COMPONENTS
+        }
+        if fetch and self.stream_prices:
+            self.__spool_prices__(
+                fetch,
+                start_date,
+                end_date,
+                currency,
+                mssql_dsn,
+                id_map,
+                fname,
+                fx_rates,
+                writers,
+            )
+        elif fetch:
+            prices = self.data.fds_prices(
+                regional_id_list=fetch,
+                start_date=start_date,
+                end_date=end_date,
+                currency=currency,
+                adjtype=3,
+                mssql_dsn=mssql_dsn,
+                fx_rates=fx_rates,
+                shards=self.price_shards,
+                adjusted=adjusted,
+                query=self.price_query,
+            )
+            if adjusted:
+                prices, corp_actions = __split_corp_actions__(prices, id_map)
+                with timed("write", "_corp_actions", rows=len(corp_actions)):
+                    writers["_corp_actions"].write(corp_actions)
+                del corp_actions
+            else:
+                prices["ref_id"] = prices.fsym_id.map(id_map)
+            with timed("write", "_prices", rows=len(prices)):
+                writers["_prices"].write(prices)
+            del prices
+        if fetch and not adjusted:
+            corp_actions = self.__factor_table__(fetch, mssql_dsn, id_map)
+            with timed("write", "_corp_actions", rows=len(corp_actions)):
+                writers["_corp_actions"].write(corp_actions)
+
+        for name, writer in writers.items():
+            with timed("write", name + " manifest"):
+                writer.reuse(reused[name], id_map, reused["schema"].get(name))
+                writer.close()
+        return writers["_prices"].high_water
+
+    def __spool_prices__(
+        self,
+        prices_univ,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        id_map,
+        fname,
+        fx_rates,
+        writers,
+    ):
+        """
+        Streams the prices of a shared build to spool files one fetch batch at a time,
+        as __stream_prices__ does, then splits them into security blobs with writers.
+        The price query returns securities in no particular order, so a security is
+        only complete once the stream is done.
+        """
+        adjusted = not self.__adjust_on_read__(fname)
+        dtypes = self.__dtypes__(fname)
+        spools = {}
+        try:
+            for prices in self.data.fds_prices_batches(
+                regional_id_list=prices_univ,
+                start_date=start_date,
+                end_date=end_date,
+                currency=currency,
+                mssql_dsn=mssql_dsn,
+                fx_rates=fx_rates,
+                adjusted=adjusted,
+                query=self.price_query,
+            ):
+                if adjusted:
+                    prices, corp_actions = __split_corp_actions__(prices, id_map)
+                    frames = (("_corp_actions", corp_actions), ("_prices", prices))
+                else:
+                    prices["ref_id"] = prices.fsym_id.map(id_map)
+                    frames = (("_prices", prices),)
+                for name, df in frames:
+                    with timed("write", name + " spool", rows=len(df)):
+                        spools[name] = __write_batch__(
+                            spools.get(name), fname + name + ".spool", df, dtypes
+                        )
+        finally:
+            for writer in spools.values():
+                writer.close()
+        for name in spools:
+            with timed("write", name):
+                writers[name].write_file(fname + name + ".spool")
+            os.remove(fname + name + ".spool")
+
+    def __factor_table__(self, prices_univ, mssql_dsn, id_map):
+        """
+        Downloads every corporate action factor of the universe for a cache that adjusts
+        prices on read.
+        """
+        ca = self.data.fds_corp_actions(
+            regional_id_list=prices_univ, mssql_dsn=mssql_dsn, shards=self.price_shards
+        )
+        return factor_table(ca, id_map)
+
+    def __build_prices_incremental__(
+        self,
+        fds_sym,
+        fx_rates,
+        currency,
+        start_date,
+        end_date,
+        mssql_dsn,
+        fname,
+        lookback_days,
+    ):
+        """
+        Step 3, incremental: refresh the existing _prices and _corp_actions files.
+
+        Only prices after the current high water mark, less lookback_days, are
+        downloaded.  Securities with a corporate action inside that window have their
+        adjusted history restated, so their full history is downloaded again along
+        with any security new to the universe.  Securities that left the universe are
+        dropped, as in a full rebuild.  Caches that adjust prices on read never need a
+        restatement, their corporate action factors are replaced instead.
+        """
+        adjusted = not self.__adjust_on_read__(fname)
+        source = self.__source__(fname)
+        if not store.exists(source, "_prices") or adjusted == is_unadjusted(
+            store.read_schema(source, "_prices")
+        ):
+            # nothing to refresh, or the cache switches to or from adjusting on read
+            return self.__build_prices__(
+                fds_sym, fx_rates, currency, start_date, end_date, mssql_dsn, fname
+            )
+
+        prices_univ = fds_sym.fsym_primary_listing_id.dropna().unique().tolist()
         id_map = dict(
             zip(fds_sym.fsym_primary_listing_id.tolist(), fds_sym.ref_id.tolist())
         )
 
-        prices["ref_id"] = prices.fsym_id.map(id_map)
+        existing = store.read_frame(source, "_prices")
+        existing_ca = store.read_frame(source, "_corp_actions")
+        high_water = existing.price_date.max()
+        window_start = high_water - pd.Timedelta(days=lookback_days)
 
-        corp_actions = prices.loc[prices.adj_factor_flag == 1][
-            ["ref_id", "fsym_id", "price_date", "cum_split_factor", "cum_spin_factor"]
-        ].copy()
+        ca = self.data.fds_corp_actions(
+            regional_id_list=prices_univ, mssql_dsn=mssql_dsn, shards=self.price_shards
+        )
+        if adjusted:
+            restated = set(
+                ca.loc[pd.to_datetime(ca.price_date) > window_start, "fsym_id"]
+            )
+        else:
+            restated = set()
+        new_ids = set(prices_univ) - set(existing.fsym_id.unique())
+        full_ids = sorted((restated | new_ids) & set(prices_univ))
+        delta_ids = sorted(set(prices_univ) - set(full_ids))
 
-        ########################################
-        ## Step 5: Create Corporate Actions File
-        ########################################
+        fetched = []
+        for ids, sd in [
+            (delta_ids, window_start.strftime("%Y-%m-%d")),
+            (full_ids, start_date),
+        ]:
+            if ids:
+                fetched.append(
+                    self.data.fds_prices(
+                        regional_id_list=ids,
+                        start_date=sd,
+                        end_date=end_date,
+                        currency=currency,
+                        adjtype=3,
+                        mssql_dsn=mssql_dsn,
+                        fx_rates=fx_rates,
+                        shards=self.price_shards,
+                        adjusted=adjusted,
+                        query=self.price_query,
+                    )
+                )
 
-        print("\tSaving Universe Prices File as {}_corp_actions.snappy\n".format(fname))
+        # keep the untouched history of the delta securities only
+        keep = existing.fsym_id.isin(delta_ids) & (existing.price_date < window_start)
+        keep_ca = existing_ca.fsym_id.isin(delta_ids) & (
+            existing_ca.price_date < window_start
+        )
+        prices, corp_actions = [existing.loc[keep]], [existing_ca.loc[keep_ca]]
+        for frame in fetched:
+            if adjusted:
+                frame_prices, frame_ca = __split_corp_actions__(frame, id_map)
+                corp_actions.append(frame_ca)
+            else:
+                frame_prices = frame
+            prices.append(frame_prices)
+        if not adjusted:
+            corp_actions = [factor_table(ca, id_map)]
+        del existing, existing_ca, fetched
 
-        corp_actions.reset_index(drop=True).to_parquet(fname + "_corp_actions.snappy")
+        corp_actions = pd.concat(corp_actions, ignore_index=True)
+        corp_actions["ref_id"] = corp_actions.fsym_id.map(id_map)
+        self.__write__(
+            corp_actions.sort_values(["fsym_id", "price_date"]), fname, "_corp_actions"
+        )
         del corp_actions
 
+        currency_dtype = prices[0].currency.dtype
+        prices = pd.concat(prices, ignore_index=True)
         prices["ref_id"] = prices.fsym_id.map(id_map)
-        prices = prices.loc[
-            :,
-            ~prices.columns.isin(
-                ["cum_split_factor", "cum_spin_factor", "adj_factor_flag"]
-            ),
-        ]
-
-        print("\tSaving Universe Prices File as {}_prices.snappy\n\n".format(fname))
+        if isinstance(currency_dtype, pd.CategoricalDtype):
+            prices["currency"] = prices.currency.astype("category")
+        prices = prices.sort_values(["fsym_id", "price_date"]).reset_index(drop=True)
+        self.__write__(prices, fname, "_prices")
+        return prices.price_date.max()
 
-        prices.reset_index(drop=True).to_parquet(fname + "_prices.snappy")
-        print("FDS Cache Created.")
+    def __stream_prices__(
+        self,
+        prices_univ,
+        start_date,
+        end_date,
+        currency,
+        mssql_dsn,
+        id_map,
+        fname,
+        fx_rates=None,
+    ):
+        """
+        Writes the _prices and _corp_actions files batch by batch from fds_prices_batches,
+        one parquet row group per batch, so peak memory stays bounded by the batch size.
+        Caches that adjust prices on read write the corporate action factors in one go.
+        """
+        adjusted = not self.__adjust_on_read__(fname)
+        dtypes = self.__dtypes__(fname)
+        layouts = {
+            name: self.__layout__(fname, name) for name in ("_prices", "_corp_actions")
+        }
+        writers = {}
+        for name, layout in layouts.items():
+            store.remove(fname, name)
+            if layout == "dataset":
+                os.makedirs(store.dataset_path(fname, name))
+        high_water = None
+        try:
+            for batch, prices in enumerate(
+                self.data.fds_prices_batches(
+                    regional_id_list=prices_univ,
+                    start_date=start_date,
+                    end_date=end_date,
+                    currency=currency,
+                    mssql_dsn=mssql_dsn,
+                    fx_rates=fx_rates,
+                    adjusted=adjusted,
+                    query=self.price_query,
+                )
+            ):
+                if adjusted:
+                    prices, corp_actions = __split_corp_actions__(prices, id_map)
+                    frames = (("_corp_actions", corp_actions), ("_prices", prices))
+                else:
+                    prices["ref_id"] = prices.fsym_id.map(id_map)
+                    frames = (("_prices", prices),)
+                for name, df in frames:
+                    with timed("write", name, rows=len(df)):
+                        if layouts[name] == "dataset":
+                            store.write_dataset_part(
+                                df, fname, name, part=batch, dtypes=dtypes
+                            )
+                        else:
+                            writers[name] = __write_batch__(
+                                writers.get(name),
+                                store.file_path(fname, name),
+                                df,
+                                dtypes,
+                            )
+                if len(prices) > 0:
+                    batch_max = prices.price_date.max()
+                    if high_water is None or batch_max > high_water:
+                        high_water = batch_max
+        finally:
+            for writer in writers.values():
+                writer.close()
+        if not adjusted:
+            self.__write__(
+                self.__factor_table__(prices_univ, mssql_dsn, id_map),
+                fname,
+                "_corp_actions",
+            )
+        return high_water
 
     def build_universe(
         self, cache_name, mssql_dsn, etf_ticker, currency, start_date, end_date
@@ -202,11 +882,7 @@ class FdsDataStore:
         else:
             pass
 
-            df = FdsDataStoreLedger(self.dir_path).avail_caches()
-
-            if type(df) == type(None):
-                pass
-            elif cache_name in df.index.get_level_values(0).tolist():
+            if FdsDataStoreLedger(self.dir_path).cache_exists(cache_name):
                 print(
                     """This cache name is already in use!
                          Please select a new name, use rebuild_cache to refresh,
@@ -214,8 +890,6 @@ class FdsDataStore:
                 )
                 raise IpyExit
 
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-
         #####################################
         ## Step 1: Universe Creation
         #####################################
@@ -226,14 +900,18 @@ class FdsDataStore:
             )
         )
 
-        univ = fd.etf_universe(
-            etf_ticker=etf_ticker,
-            start_date=start_date,
-            end_date=ed,
-            mssql_dsn=mssql_dsn,
-        )
+        with self.__collect__(cache_name):
+            univ = fd.etf_universe(
+                etf_ticker=etf_ticker,
+                start_date=start_date,
+                end_date=ed,
+                mssql_dsn=mssql_dsn,
+                intervals=self.intervals,
+            )
 
-        self.__get_data__(cache_name, univ, mssql_dsn, currency, sd, fname, 0)
+            high_water = self.__get_data__(
+                cache_name, univ, mssql_dsn, currency, sd, fname, 0
+            )
         FdsDataStoreLedger(dir_path=self.dir_path).cache_ledger(
             cache_name,
             "FDS Ownership",
@@ -242,6 +920,7 @@ class FdsDataStore:
             etf_ticker,
             start_date,
             end_date,
+            high_water,
         )
 
         return True
@@ -312,13 +991,10 @@ class FdsDataStore:
         else:
             pass
 
-            df = FdsDataStoreLedger(self.dir_path).avail_caches()
             fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
             data.to_parquet(fname + "_imported.snappy")
 
-            if type(df) == type(None):
-                pass
-            elif cache_name in df.index.get_level_values(0).tolist():
+            if FdsDataStoreLedger(self.dir_path).cache_exists(cache_name):
                 print(
                     """This cache name is already in use!
                          Please select a new name, use rebuild_cache to refresh,
@@ -326,68 +1002,241 @@ class FdsDataStore:
                 )
                 raise IpyExit
 
-        connection = pyodbc.connect("DSN={}".format(mssql_dsn))
-
         #####################################
         ## Step 1: Universe Creation
         #####################################
 
         data["date"] = pd.to_datetime(data["date"], format="%Y-%m-%d")
 
-        self.__get_data__(cache_name, data, mssql_dsn, currency, sd, fname, 1)
+        high_water = self.__get_data__(
+            cache_name, data, mssql_dsn, currency, sd, fname, 1
+        )
         FdsDataStoreLedger(self.dir_path).cache_ledger(
-            cache_name, "Imported", mssql_dsn, currency, "", start_date, ""
+            cache_name, "Imported", mssql_dsn, currency, "", start_date, "", high_water
         )
 
-    def rebuild_cache(self, cache_name):
-        df = FdsDataStoreLedger(self.dir_path).avail_caches()
-        try:
-            fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
-            df = df.loc[cache_name]
-        except:
+    def rebuild_cache(self, cache_name, incremental=False, lookback_days=30):
+        """
+        Rebuilds an existing cache with the details contained in the ledger.
+
+        incremental: only download prices after the cache's high water mark, less
+                     lookback_days, and merge them into the existing files.  Securities
+                     with corporate actions inside the lookback window are re-downloaded
+                     in full so their adjusted history is restated.
+        lookback_days: number of days before the high water mark that are re-downloaded
+                       in an incremental rebuild.
+        """
+        job = self.__rebuild_job__(cache_name)
+        if job is None:
             print("Cache Not Found. Check for available caches with avail_caches.")
             raise IpyExit
-        if df["Source"] == "Imported":
-            data = pd.read_parquet(fname + "_imported.snappy")
-            self.__get_data__(
-                cache_name,
-                data,
-                df["MSSQL DSN"],
-                df["Currency"],
-                df["Start Date"],
-                fname,
-                1,
+        self.__build_job__(job, lookback_days if incremental else None)
+
+        print("Cache Rebuilt.")
+        return True
+
+    def build_batch(self, caches):
+        """
+        Builds several caches at once, downloading the securities they share once.
+
+        caches: a list of cache definitions, each either the name of an existing cache,
+                rebuilt with the details contained in the ledger, or a dict defining a
+                new cache with the arguments of build_universe (cache_name, mssql_dsn,
+                etf_ticker, currency, start_date, end_date) or, when it holds data, of
+                load_universe (data, cache_name, mssql_dsn, currency, start_date).
+
+        The universes are downloaded first.  Symbology, security reference data,
+        prices and corporate actions are then queried once for the union of the IDs
+        of every cache sharing the DSN, and for prices the currency, see
+        FdsBatchData, and the results are split into the files of each cache.  Each
+        cache is published and recorded in the ledger as soon as its files are
+        written.  The shared query results are held in memory until the batch is
+        done.
+        """
+        names = [c if isinstance(c, str) else c["cache_name"] for c in caches]
+        if len(set(names)) < len(names):
+            print("A cache can only appear once in a batch.")
+            raise IpyExit
+        ledger = FdsDataStoreLedger(self.dir_path)
+        for cache in caches:
+            if isinstance(cache, str):
+                if not ledger.cache_exists(cache):
+                    print(
+                        "Cache {} Not Found. Check for available caches with "
+                        "avail_caches.".format(cache)
+                    )
+                    raise IpyExit
+            else:
+                self.__check_new__(cache)
+        os.makedirs(os.path.join(self.dir_path, "fdsDataStore"), exist_ok=True)
+
+        jobs = [
+            self.__rebuild_job__(c) if isinstance(c, str) else self.__create_job__(c)
+            for c in caches
+        ]
+        # the shared prices are converted from the earliest start date of the batch
+        ed = pd.to_datetime("today").strftime("%Y-%m-%d")
+        for currency in sorted({job["currency"] for job in jobs}):
+            group = [job for job in jobs if job["currency"] == currency]
+            sd = min(pd.Timestamp(job["start_date"]) for job in group)
+            self.__build_fx_rates__(
+                currency, sd.strftime("%Y-%m-%d"), ed, group[0]["mssql_dsn"]
             )
-            FdsDataStoreLedger(self.dir_path).cache_ledger(
-                cache_name,
-                "Imported",
-                df["MSSQL DSN"],
-                df["Currency"],
-                "",
-                df["Start Date"],
-                "",
+
+        self.data = FdsBatchData(jobs, shards=self.price_shards)
+        try:
+            for job in jobs:
+                self.__build_job__(job)
+        finally:
+            self.data = fd
+
+        print("{} Caches Built.".format(len(jobs)))
+        return True
+
+    def __check_new__(self, definition):
+        """
+        Checks the definition of a new cache in a batch before anything is downloaded.
+        """
+        __valid_cache_name__(definition["cache_name"])
+        data = definition.get("data")
+        if data is not None and not {"ref_id", "date"} <= set(data.columns):
+            print(
+                """Dataframe must have columns labeled "date" and "ref_id".
+    See docstring for more details"""
             )
-        else:
-            data = pd.read_parquet(fname + "_univ.snappy").iloc[:, 0:4]
-            self.__get_data__(
-                cache_name,
-                data,
-                df["MSSQL DSN"],
-                df["Currency"],
-                df["Start Date"],
-                fname,
-                0,
+            raise IpyExit
+        if FdsDataStoreLedger(self.dir_path).cache_exists(definition["cache_name"]):
+            print(
+                """This cache name is already in use!
+                     Please select a new name, use rebuild_cache to refresh,
+                     or delete_cache to remove."""
             )
-            FdsDataStoreLedger(self.dir_path).cache_ledger(
+            raise IpyExit
+
+    def __job__(
+        self,
+        cache_name,
+        univ,
+        id_type,
+        source,
+        mssql_dsn,
+        currency,
+        etf_ticker,
+        start_date,
+        end_date,
+    ):
+        """
+        Everything __build_job__ needs to build a cache, including the parameters
+        FdsBatchData groups caches by.
+        """
+        fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+        return {
+            "cache_name": cache_name,
+            "fname": fname,
+            "univ": univ,
+            "id_type": id_type,
+            "mssql_dsn": mssql_dsn,
+            "currency": currency,
+            "start_date": start_date,
+            "adjusted": not self.__adjust_on_read__(snapshots.resolve(fname)),
+            # the cache_ledger arguments, less the high water mark
+            "ledger": [
                 cache_name,
-                "FDS Ownership",
-                df["MSSQL DSN"],
-                df["Currency"],
-                df["ETF Ticker"],
-                df["Start Date"],
-                df["End Date"],
+                source,
+                mssql_dsn,
+                currency,
+                etf_ticker,
+                start_date,
+                end_date,
+            ],
+        }
+
+    def __create_job__(self, definition):
+        """
+        The job of a new cache defined by the arguments of build_universe, or of
+        load_universe when it holds data.  Downloads the ETF universe.
+        """
+        cache_name = definition["cache_name"]
+        mssql_dsn, currency = definition["mssql_dsn"], definition["currency"]
+        start_date = definition["start_date"]
+        if definition.get("data") is not None:
+            data = definition["data"]
+            fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+            data.to_parquet(fname + "_imported.snappy")
+            data = data.assign(date=pd.to_datetime(data["date"], format="%Y-%m-%d"))
+            return self.__job__(
+                cache_name, data, 1, "Imported", mssql_dsn, currency, "", start_date, ""
             )
 
-        print("Cache Rebuilt.")
-        return True
+        etf_ticker, end_date = definition["etf_ticker"], definition["end_date"]
+        print(
+            "Downloading ETF Constituents for {t} from {s} to {e}".format(
+                t=etf_ticker, s=start_date, e=end_date
+            )
+        )
+        univ = fd.etf_universe(
+            etf_ticker=etf_ticker,
+            start_date=start_date,
+            end_date=end_date,
+            mssql_dsn=mssql_dsn,
+            intervals=self.intervals,
+        )
+        return self.__job__(
+            cache_name,
+            univ,
+            0,
+            "FDS Ownership",
+            mssql_dsn,
+            currency,
+            etf_ticker,
+            start_date,
+            end_date,
+        )
 
+    def __rebuild_job__(self, cache_name):
+        """
+        The job of an existing cache, rebuilt from the universe it was built from and
+        the details contained in the ledger.  None when the cache is not in the ledger.
+        """
+        df = FdsDataStoreLedger(self.dir_path).cache_details(cache_name)
+        if df is None:
+            return None
+        fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+        tablecache.invalidate(fname)
+        if df["Source"] == "Imported":
+            data = pd.read_parquet(fname + "_imported.snappy")
+            id_type, etf_ticker, end_date = 1, "", ""
+        else:
+            # the universe IDs followed by either date or start_date/end_date
+            source = snapshots.resolve(fname)
+            columns = store.read_schema(source, "_univ")
+            ncols = 5 if set(INTERVAL_COLUMNS) <= set(columns) else 4
+            data = store.read_frame(source, "_univ", columns=columns[:ncols])
+            id_type, etf_ticker, end_date = 0, df["ETF Ticker"], df["End Date"]
+        return self.__job__(
+            cache_name,
+            data,
+            id_type,
+            df["Source"],
+            df["MSSQL DSN"],
+            df["Currency"],
+            etf_ticker,
+            df["Start Date"],
+            end_date,
+        )
+
+    def __build_job__(self, job, lookback_days=None):
+        """
+        Builds, publishes and records the cache of a job.
+        """
+        high_water = self.__get_data__(
+            job["cache_name"],
+            job["univ"],
+            job["mssql_dsn"],
+            job["currency"],
+            job["start_date"],
+            job["fname"],
+            job["id_type"],
+            lookback_days,
+        )
+        FdsDataStoreLedger(self.dir_path).cache_ledger(*job["ledger"], high_water)
@@ -1,35 +1,68 @@
-import glob
 import os
 import pandas as pd
 
+from fds.datax.utils import securities, snapshots, store, tablecache
 from fds.datax.utils.ipyexit import IpyExit
+from fds.datax.utils.ledger import FdsLedgerDB
+
+LEDGER_COLUMNS = [
+    "Cache Name",
+    "Source",
+    "Cache Location",
+    "MSSQL DSN",
+    "ETF Ticker",
+    "Currency",
+    "Start Date",
+    "End Date",
+    "Last Update Date",
+    "High Water Date",
+]
+DATE_COLUMNS = ["Start Date", "End Date", "Last Update Date", "High Water Date"]
 
 
 class FdsDataStoreLedger:
+    """
+    The caches of a data store, recorded in an FdsLedgerDB in its fdsDataStore
+    directory along with the row counts, sizes and checksums of their files.
+    """
+
     def __init__(self, dir_path):
         self.dir_path = dir_path
+        self.db = FdsLedgerDB(os.path.join(self.dir_path, "fdsDataStore"))
 
     def __load_cache_details__(self):
         """
         This function will check for available FDS Caches within the
-        existing working directory. The full list will be stored in a
-        "fds_cache_details.txt" file within an fdsDataStore directory within
-        the current working directory. 
-        
+        existing working directory.  Returns a DataFrame indexed by cache name, None
+        when there are none.
         """
-
-        cache = os.path.join(self.dir_path, "fdsDataStore", "fds_cache_details.txt")
-
-        if len(glob.glob(cache, recursive=False)) == 0:
+        entries = self.db.entries()
+        if not entries:
             return None
-        else:
-            caches = pd.read_csv(
-                cache,
-                sep="|",
-                index_col="Cache Name",
-                parse_dates=["Start Date", "End Date", "Last Update Date"],
+        caches = pd.DataFrame(entries, columns=LEDGER_COLUMNS).set_index("Cache Name")
+        for col in DATE_COLUMNS:
+            # rows may mix date and timestamp formats, parse them one by one
+            caches[col] = pd.to_datetime(
+                caches[col].map(pd.Timestamp, na_action="ignore")
             )
-            return caches
+        return caches
+
+    def cache_exists(self, cache_name):
+        return self.db.exists(cache_name)
+
+    def cache_details(self, cache_name):
+        """
+        Returns the ledger entry of a cache as a dict keyed by the ledger column names,
+        None when the cache does not exist.
+        """
+        return self.db.get(cache_name)
+
+    def cache_files(self, cache_name):
+        """
+        Returns a DataFrame of the components recorded for a cache: layout, path,
+        rows, bytes, checksum, schema_version, high_water_date and updated.
+        """
+        return pd.DataFrame(self.db.files(cache_name))
 
     def avail_caches(self):
         """
@@ -46,88 +79,76 @@ class FdsDataStoreLedger:
             )
 
     def cache_ledger(
-        self, cache_name, source, mssql_dsn, currency, etf_ticker, start_date, end_date
+        self,
+        cache_name,
+        source,
+        mssql_dsn,
+        currency,
+        etf_ticker,
+        start_date,
+        end_date,
+        high_water_date=None,
     ):
         """
         This function is used to:
-        
-        -Determine if the fdsDataStore directory exists in the current working dir.
-        -Check if a fds_cache_details.txt file exists.
-        -Create or update the fds_cache_details with latest information. 
-        """
 
-        cols = [
-            "Cache Name",
-            "Source",
-            "Cache Location",
-            "MSSQL DSN",
-            "ETF Ticker",
-            "Currency",
-            "Start Date",
-            "End Date",
-            "Last Update Date",
-        ]
+        -Create or update the ledger entry of a cache with the latest information.
+        -Record the layout, rows, bytes, checksum and most recent date of each of its
+         files.
 
-        cache = os.path.join(self.dir_path, "fdsDataStore", "fds_cache_details.txt")
-
-        if len(glob.glob(cache, recursive=False)) > 0:
-            print("Cache Detail File Found.")
-            # cache file exists create, read in cache
-            df = pd.read_csv(
-                cache,
-                sep="|",
-                index_col="Cache Name",
-                parse_dates=["Start Date", "End Date", "Last Update Date"],
+        high_water_date is the most recent price date stored in the cache, used by
+        incremental rebuilds.
+        """
+        fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+        published = snapshots.resolve(fname)
+        updated = pd.Timestamp.now()
+        files = []
+        for name in store.COMPONENTS:
+            meta = store.describe(published, name)
+            if meta is not None:
+                files.append(dict(meta, updated=str(updated)))
+
+        entry = dict(
+            zip(
+                LEDGER_COLUMNS,
+                [
+                    cache_name,
+                    source,
+                    os.path.join(self.dir_path, "fdsDataStore"),
+                    mssql_dsn,
+                    etf_ticker,
+                    currency,
+                    start_date,
+                    end_date,
+                    updated,
+                    high_water_date,
+                ],
             )
-
-        else:
-            # no ledger, create new dataframe:
-            print("Cache Detail Not File Found, Creating File.")
-            df = pd.DataFrame(columns=cols)
-            df.set_index("Cache Name", inplace=True)
-
-        df.loc[cache_name] = [
-            source,
-            os.path.join(self.dir_path, "fdsDataStore"),
-            mssql_dsn,
-            etf_ticker,
-            currency,
-            start_date,
-            end_date,
-            pd.to_datetime("today"),
-        ]
-        df.to_csv(cache, sep="|")
+        )
+        self.db.put(entry, files)
+        tablecache.invalidate(fname)
         print("Cache Details Saved.")
 
     def delete_cache(self, cache_name):
         """
         Based on an input cache name, the related components are deleted and wiped from the fds_cache_details.txt file.
         """
-        df = self.__load_cache_details__()
-        try:
-            df.drop(cache_name, inplace=True)
-            if len(df) == 0:
-                os.remove(
-                    os.path.join(self.dir_path, "fdsDataStore", "fds_cache_details.txt")
-                )
-            else:
-                df.to_csv(
-                    os.path.join(
-                        self.dir_path, "fdsDataStore", "fds_cache_details.txt"
-                    ),
-                    sep="|",
-                )
-        except:
+        # readers stop finding the cache before its files go
+        if not self.db.delete(cache_name):
             print("Cache Not Found. Check for available caches with avail_caches.")
             raise IpyExit
         filenames = [
-            "_univ.snappy",
-            "_ref_data.snappy",
-            "_prices.snappy",
-            "_corp_actions.snappy",
+            "_univ",
+            "_ref_data",
+            "_prices",
+            "_corp_actions",
         ]
 
+        fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+        snapshots.remove(fname)
         for fn in filenames:
-            os.remove(os.path.join(self.dir_path, "fdsDataStore", cache_name + fn))
+            store.remove(fname, fn)
+        # security blobs only this cache referenced, in the shared layout
+        securities.collect_garbage(os.path.join(self.dir_path, "fdsDataStore"))
 
         print("Cache Deleted.")
@@ -1,51 +1,162 @@
 import os
 import pandas as pd
+import pyarrow as pa
 
 from fds.datax._sdfhelpers._find import FdsDataStoreLedger as ledger
+from fds.datax.utils import snapshots, store
+from fds.datax.utils.adjust import (
+    ADJUSTMENTS,
+    FACTOR_COLUMNS,
+    adjust_prices,
+    is_unadjusted,
+)
+from fds.datax.utils.intervals import INTERVAL_COLUMNS, expand_intervals
 from fds.datax.utils.ipyexit import IpyExit
 
 
-def __load_file__(cn, dir_path, ft):
+def __load_file__(
+    fname,
+    ft,
+    columns=None,
+    start_date=None,
+    end_date=None,
+    ids=None,
+    arrow=False,
+    dtypes=None,
+):
     """
-    Generic function used to load a feather file from the defined working directory within the instance.
-    cn - cache name
+    Generic function used to load a cache file from the defined working directory within the instance.
+    fname - path prefix of the cache files, see FdsReadCache.__cache_check__
     ft - file type, one of the following:
-            *_univ.snappy
-            *_ref_data.snappy
-            *_prices.snappy
-            *_corp_actions.snappy
+            *_univ
+            *_ref_data
+            *_prices
+            *_corp_actions
+    columns - optional list of columns to read, other columns are never decoded
+    start_date/end_date - optional inclusive date range, ignored for *_ref_data
+    ids - optional list of ref_ids or FactSet identifiers to keep
+    arrow - return a pyarrow Table instead of a pandas DataFrame
+    dtypes - optional FdsDtypePolicy the columns are cast to, see fds.datax.utils.dtypes
+
+    Both single snappy parquet files and year/month partitioned dataset directories are supported.
+    Caches built with Arrow sidecars are memory mapped from the uncompressed *.arrow files.
+    Otherwise the columns and the date and ID filters are pushed down to the parquet scan, and the
+    result is kept in the process wide table cache, see fds.datax.utils.tablecache, so repeating
+    the same read skips the parquet decode.
     """
-    fname = os.path.join(dir_path, "fdsDataStore", cn + ft)
-    return pd.read_parquet(fname)
+    return store.load_frame(
+        fname,
+        ft,
+        columns=columns,
+        start_date=start_date,
+        end_date=end_date,
+        ids=ids,
+        arrow=arrow,
+        dtypes=dtypes,
+    )
+
+
+def __price_column__(col):
+    return (
+        col.replace("unadj_", "")
+        .replace("split_spin_adj_", "")
+        .replace("split_adj_", "")
+    )
 
 
 class FdsReadCache:
-    def __init__(self, dir_path):
+    def __init__(self, dir_path, dtypes=None):
+        """
+        dtypes: optional FdsDtypePolicy applied to every frame read, e.g. to return
+                price and volume columns as float32 or strings as Arrow backed pandas
+                strings.  Otherwise caches are returned with their stored types.
+        """
         self.dir_path = dir_path
+        self.dtypes = dtypes
 
     def __cache_check__(self, cache_name, show_details):
-        cwd = self.dir_path
-        df = ledger(self.dir_path).avail_caches()
-        try:
-            df = df.loc[cache_name]
-            if show_details == 1:
-                print("Cache Details:")
-                print(df)
-                print("\n")
-        except:
+        """
+        Returns the path prefix of the files of the published version of a cache,
+        resolved once per read so every component read comes from the same version.
+        """
+        details = ledger(self.dir_path).cache_details(cache_name)
+        if details is None:
             print("Cache Not Found. Check for available caches with avail_caches.")
             raise IpyExit
+        if show_details == 1:
+            print("Cache Details:")
+            print(pd.Series(details).drop("Cache Name").rename(cache_name))
+            print("\n")
+        fname = os.path.join(self.dir_path, "fdsDataStore", cache_name)
+        return snapshots.resolve(fname)
 
-    def load_sym(self, cache_name, show_details):
-        self.__cache_check__(cache_name, show_details)
-        return __load_file__(cache_name, self.dir_path, "_univ.snappy")
+    def load_sym(
+        self,
+        cache_name,
+        show_details,
+        start_date=None,
+        end_date=None,
+        ids=None,
+        columns=None,
+        arrow=False,
+        intervals=False,
+    ):
+        """
+        Interval encoded universes are expanded to one row per day unless intervals is
+        set, in which case the [start_date, end_date) rows are returned as stored.
+        """
+        fname = self.__cache_check__(cache_name, show_details)
+        stored = store.read_schema(fname, "_univ")
+        expand = not intervals and all(col in stored for col in INTERVAL_COLUMNS)
+        read_columns = columns
+        if expand and columns is not None:
+            read_columns = [col for col in stored if col in columns]
+            read_columns = [col for col in read_columns if col != "date"]
+            read_columns = read_columns + INTERVAL_COLUMNS
+        univ = __load_file__(
+            fname,
+            "_univ",
+            columns=read_columns,
+            start_date=start_date,
+            end_date=end_date,
+            ids=ids,
+            arrow=arrow and not expand,
+            dtypes=self.dtypes,
+        )
+        if not expand:
+            return univ
+        univ = expand_intervals(univ, min_date=start_date, max_date=end_date)
+        if columns is not None:
+            univ = univ[[col for col in univ.columns if col in columns]]
+        if arrow:
+            return pa.Table.from_pandas(univ, preserve_index=False)
+        return univ
 
-    def load_sec_ref(self, cache_name, show_details):
-        self.__cache_check__(cache_name, show_details)
-        return __load_file__(cache_name, self.dir_path, "_ref_data.snappy")
+    def load_sec_ref(
+        self, cache_name, show_details, ids=None, columns=None, arrow=False
+    ):
+        fname = self.__cache_check__(cache_name, show_details)
+        return __load_file__(
+            fname,
+            "_ref_data",
+            columns=columns,
+            ids=ids,
+            arrow=arrow,
+            dtypes=self.dtypes,
+        )
 
-    def load_prices(self, cache_name, adj, show_details):
-        self.__cache_check__(cache_name, show_details)
+    def load_prices(
+        self,
+        cache_name,
+        adj,
+        show_details,
+        start_date=None,
+        end_date=None,
+        ids=None,
+        columns=None,
+        arrow=False,
+    ):
+        fname = self.__cache_check__(cache_name, show_details)
 
         if adj == 0:
             # unadjusted data
@@ -98,17 +209,123 @@ class FdsReadCache:
             ]
         else:
             print("Enter a 0, 1, or 2!  Returning all columns")
+            p_type = None
+
+        stored = store.read_schema(fname, "_prices")
+        if columns is not None:
+            # columns are given by their returned names, e.g. price_close, which with
+            # all types selects the stored columns of every adjustment type
+            p_type = [
+                col
+                for col in (stored if p_type is None else p_type)
+                if col in columns or __price_column__(col) in columns
+            ]
 
-        prices = __load_file__(cache_name, self.dir_path, "_prices.snappy")
+        if is_unadjusted(stored):
+            prices = self.__load_adjusted__(
+                fname,
+                stored if p_type is None else p_type,
+                start_date,
+                end_date,
+                ids,
+                arrow,
+            )
+        else:
+            # only the columns of the requested adjustment type are read from disk
+            prices = __load_file__(
+                fname,
+                "_prices",
+                columns=p_type,
+                start_date=start_date,
+                end_date=end_date,
+                ids=ids,
+                arrow=arrow,
+                dtypes=self.dtypes,
+            )
+        if adj not in (0, 1, 2):
+            # all types keep the stored names, they would collide once shortened
+            return prices
+        if arrow:
+            return prices.rename_columns(
+                [__price_column__(col) for col in prices.column_names]
+            )
+        prices.columns = [__price_column__(col) for col in prices.columns]
+        return prices
+
+    def __load_adjusted__(self, fname, p_type, start_date, end_date, ids, arrow):
+        """
+        Loads prices from a cache storing unadjusted prices only, computing the adjusted
+        columns in p_type from the corporate action factors.
+        """
+        adjust = [col for col in p_type if col in ADJUSTMENTS]
+        read = [col for col in p_type if col not in ADJUSTMENTS]
+        for col in ["fsym_id", "price_date"] + [ADJUSTMENTS[c][0] for c in adjust]:
+            if adjust and col not in read:
+                read.append(col)
+        prices = __load_file__(
+            fname,
+            "_prices",
+            columns=read,
+            start_date=start_date,
+            end_date=end_date,
+            ids=ids,
+            dtypes=self.dtypes,
+        )
+        if adjust:
+            # a price takes the factors of the next corporate action on or after its
+            # date, so factors after end_date are still needed
+            corp_actions = __load_file__(
+                fname,
+                "_corp_actions",
+                columns=["fsym_id", "price_date"] + FACTOR_COLUMNS,
+                start_date=start_date,
+                ids=ids,
+                dtypes=self.dtypes,
+            )
+            prices = adjust_prices(prices, corp_actions, adjust)
         prices = prices[p_type]
-        prices.columns = [
-            col.replace("unadj_", "")
-            .replace("split_spin_adj_", "")
-            .replace("split_adj_", "")
-            for col in prices.columns
-        ]
+        if arrow:
+            return pa.Table.from_pandas(prices, preserve_index=False)
         return prices
 
-    def load_corp_actions(self, cache_name, show_details):
-        self.__cache_check__(cache_name, show_details)
-        return __load_file__(cache_name, self.dir_path, "_corp_actions.snappy")
+    def __priced_dates__(self, cache_name, start_date, end_date):
+        """
+        Narrows an inclusive date range to the Start Date and High Water Date of a cache.
+        """
+        details = ledger(self.dir_path).cache_details(cache_name)
+        bounds = []
+        for date, limit, pick in [
+            (start_date, details["Start Date"], max),
+            (end_date, details["High Water Date"], min),
+        ]:
+            dates = [pd.Timestamp(d) for d in (date, limit) if pd.notna(d) and d != ""]
+            bounds.append(pick(dates) if dates else None)
+        return bounds
+
+    def load_corp_actions(
+        self,
+        cache_name,
+        show_details,
+        start_date=None,
+        end_date=None,
+        ids=None,
+        columns=None,
+        arrow=False,
+    ):
+        fname = self.__cache_check__(cache_name, show_details)
+        if is_unadjusted(store.read_schema(fname, "_prices")):
+            # the factor table of a cache adjusting on read keeps every corporate action
+            # of the universe, only those of the priced dates are returned
+            start_date, end_date = self.__priced_dates__(
+                cache_name, start_date, end_date
+            )
+        return __load_file__(
+            fname,
+            "_corp_actions",
+            columns=columns,
+            start_date=start_date,
+            end_date=end_date,
+            ids=ids,
+            arrow=arrow,
+            dtypes=self.dtypes,
+        )
@@ -0,0 +1,135 @@
+
+SET NOCOUNT ON;
+-- Unadjusted prices only, adjustment factors come from fds_corp_actions.sql
+DECLARE @sd DATE= '{sd}';
+DECLARE @ed DATE= '{ed}';
+IF OBJECT_ID('tempdb..#listofIDS') IS NOT NULL
+    DROP TABLE #listofIDS;
+CREATE TABLE #listofIDS
+(
+    id NVARCHAR(50),
+    PRIMARY KEY(id)
+);
+{insert_statements}
+WITH
+    prices
+    AS
+    (
+        SELECT cov.fsym_id,
+            cal.ref_date AS p_date,
+            cal.day_of_week,
+            p.currency,
+            p.p_price,
+            CASE
+                       WHEN p.p_date = cal.ref_date
+                       THEN p.p_price_open
+                       ELSE 0
+                   END AS p_price_open,
+            CASE
+                       WHEN p.p_date = cal.ref_date
+                       THEN p.p_price_high
+                       ELSE 0
+                   END AS p_price_high,
+            CASE
+                       WHEN p.p_date = cal.ref_date
+                       THEN p.p_price_low
+                       ELSE 0
+                   END AS p_price_low,
+            CASE
+                       WHEN p.p_date = cal.ref_date
+                       THEN p.p_volume
+                       ELSE 0
+                   END AS p_volume
+        FROM ref_v2.ref_calendar_dates AS cal
+         CROSS JOIN fp_v2.fp_sec_coverage AS cov
+            -- Limit to last trade date
+            JOIN
+            (
+             SELECT fsym_id,
+                MAX(p_date) AS last_trade_date,
+                MIN(p_date) AS first_trade_date
+            FROM fp_v2.fp_basic_prices AS fp2
+            GROUP BY fsym_id
+         ) AS fp_max
+            ON fp_max.fsym_id = cov.fsym_id
+                AND cal.ref_date <= fp_max.last_trade_date
+                AND cal.ref_date >= fp_max.first_trade_date
+            --Convert to 7 Day calendar
+            LEFT JOIN fp_v2.fp_basic_prices AS p
+            ON fp_max.fsym_id = p.fsym_id
+                AND p.p_date =
+         (
+             SELECT MAX(p_date)
+                FROM fp_v2.fp_basic_prices AS fp2
+                WHERE  fp2.fsym_id = p.fsym_id
+                    AND fp2.p_date <= cal.ref_date
+         )
+        WHERE cal.ref_date >= @sd
+            AND cal.ref_date <= @ed
+            AND cov.fsym_id IN
+         (
+             SELECT id
+            FROM #listofIDS
+         )
+    ),
+    shares_out
+    AS
+    (
+        SELECT shs_out.fsym_id,
+            shs_out.p_date,
+            ISNULL(LEAD(shs_out.p_date) OVER(PARTITION BY shs_out.
+                   fsym_id
+                   ORDER BY shs_out.p_date), '3001-01-01') AS
+                   p_shs_out_end_date,
+            shs_out.p_com_shs_out
+        FROM
+            (
+                                                                                             SELECT s.fsym_id,
+                    cov.p_first_date AS p_date,
+                    s.p_com_shs_out
+                FROM fp_v2.fp_sec_coverage AS cov
+                    JOIN fp_v2.fp_basic_shares_current AS s
+                    ON cov.fsym_id = s.fsym_id
+                WHERE   cov.fsym_id NOT IN
+             (
+                 SELECT DISTINCT
+                        FSYM_ID
+                    FROM fp_v2.fp_basic_shares_hist
+             )
+                    AND p_com_shs_out <> 0
+                    AND cov.fsym_id IN
+             (
+                 SELECT id
+                    FROM #listofIDS
+             )
+            UNION
+                SELECT sh.fsym_id,
+                    sh.p_date,
+                    sh.p_com_shs_out
+                FROM fp_v2.fp_basic_shares_hist AS sh
+                WHERE  sh.fsym_id IN
+             (
+                 SELECT id
+                FROM #listofIDS
+             )
+         ) AS shs_out
+    )
+SELECT p.fsym_id,
+    p.p_date AS price_date,
+    p.currency,
+    shs.p_com_shs_out AS unadj_shares_outstanding,
+    shs.p_com_shs_out * p.p_price AS market_value,
+    p.p_volume AS unadj_volume,
+    p.p_price AS unadj_price_close,
+    p.p_price_high AS unadj_price_high,
+    p.p_price_low AS unadj_price_low,
+    p.p_price_open AS unadj_price_open,
+    tr.one_day_pct AS one_day_total_return
+FROM prices AS p
+    JOIN fp_v2.fp_total_returns_daily AS tr
+    ON tr.fsym_id = p.fsym_id
+        AND tr.p_date = p.p_date
+    LEFT JOIN shares_out AS shs
+    ON shs.fsym_id = p.fsym_id
+        AND p.p_date < shs.p_shs_out_end_date
+        AND p.p_date >= shs.p_date;
\ No newline at end of file
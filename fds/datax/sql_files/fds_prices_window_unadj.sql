@@ -0,0 +1,212 @@
+SET NOCOUNT ON;
+DECLARE @sd DATE= '{sd}';
+DECLARE @ed DATE= '{ed}';
+-- 1 returns trading days only, with the end of the calendar days each row fills
+DECLARE @trading_days BIT= {trading_days};
+IF OBJECT_ID('tempdb..#listofIDS') IS NOT NULL
+    DROP TABLE #listofIDS;
+CREATE TABLE #listofIDS
+(
+    id NVARCHAR(50),
+    PRIMARY KEY(id)
+);
+{insert_statements}
+WITH
+    bounds
+    AS
+    (
+        -- last trade date and last trade on or before @sd of the listed IDs only
+        SELECT fp.fsym_id,
+            MAX(fp.p_date) AS last_trade_date,
+            MAX(CASE
+                       WHEN fp.p_date <= @sd
+                       THEN fp.p_date
+                   END) AS seed_date
+        FROM fp_v2.fp_basic_prices AS fp
+            JOIN #listofIDS AS ids
+            ON ids.id = fp.fsym_id
+        GROUP BY fp.fsym_id
+    ),
+    trades
+    AS
+    (
+        -- each trading row fills the calendar days until the next one, the last one
+        -- until @ed unless the security stopped trading
+        SELECT p.fsym_id,
+            p.p_date,
+            p.currency,
+            p.p_price,
+            p.p_price_open,
+            p.p_price_high,
+            p.p_price_low,
+            p.p_volume,
+            CASE
+                       WHEN p.p_date < @sd
+                       THEN @sd
+                       ELSE p.p_date
+                   END AS fill_start_date,
+            ISNULL(LEAD(p.p_date) OVER(PARTITION BY p.fsym_id
+                ORDER BY p.p_date), CASE
+                       WHEN b.last_trade_date > p.p_date
+                       THEN DATEADD(D, 1, @ed)
+                       ELSE DATEADD(D, 1, p.p_date)
+                   END) AS fill_end_date
+        FROM fp_v2.fp_basic_prices AS p
+            JOIN bounds AS b
+            ON b.fsym_id = p.fsym_id
+        WHERE p.p_date >= ISNULL(b.seed_date, @sd)
+            AND p.p_date <= @ed
+    ),
+    prices
+    AS
+    (
+        --Convert to 7 Day calendar
+        SELECT t.fsym_id,
+            cal.ref_date AS p_date,
+            cal.day_of_week,
+            t.currency,
+            t.p_price,
+            CASE
+                       WHEN t.p_date = cal.ref_date
+                       THEN t.p_price_open
+                       ELSE 0
+                   END AS p_price_open,
+            CASE
+                       WHEN t.p_date = cal.ref_date
+                       THEN t.p_price_high
+                       ELSE 0
+                   END AS p_price_high,
+            CASE
+                       WHEN t.p_date = cal.ref_date
+                       THEN t.p_price_low
+                       ELSE 0
+                   END AS p_price_low,
+            CASE
+                       WHEN t.p_date = cal.ref_date
+                       THEN t.p_volume
+                       ELSE 0
+                   END AS p_volume,
+            t.fill_start_date,
+            t.fill_end_date
+        FROM trades AS t
+            JOIN ref_v2.ref_calendar_dates AS cal
+            ON cal.ref_date >= t.fill_start_date
+                AND cal.ref_date < t.fill_end_date
+    ),
+    shares_out
+    AS
+    (
+        SELECT shs_out.fsym_id,
+            shs_out.p_date,
+            ISNULL(LEAD(shs_out.p_date) OVER(PARTITION BY shs_out.
+                   fsym_id
+                   ORDER BY shs_out.p_date), '3001-01-01') AS
+                   p_shs_out_end_date,
+            shs_out.p_com_shs_out
+        FROM
+            (
+                                                                                             SELECT s.fsym_id,
+                    cov.p_first_date AS p_date,
+                    s.p_com_shs_out
+                FROM fp_v2.fp_sec_coverage AS cov
+                    JOIN fp_v2.fp_basic_shares_current AS s
+                    ON cov.fsym_id = s.fsym_id
+                WHERE   cov.fsym_id NOT IN
+             (
+                 SELECT DISTINCT
+                        FSYM_ID
+                    FROM fp_v2.fp_basic_shares_hist
+             )
+                    AND p_com_shs_out <> 0
+                    AND cov.fsym_id IN
+             (
+                 SELECT id
+                    FROM #listofIDS
+             )
+            UNION
+                SELECT sh.fsym_id,
+                    sh.p_date,
+                    sh.p_com_shs_out
+                FROM fp_v2.fp_basic_shares_hist AS sh
+                WHERE  sh.fsym_id IN
+             (
+                 SELECT id
+                FROM #listofIDS
+             )
+         ) AS shs_out
+    ),
+    breaks
+    AS
+    (
+        -- calendar days a client cannot fill from the trading day before them
+        SELECT fsym_id,
+            p_date
+        FROM shares_out
+    ),
+    days
+    AS
+    (
+        -- every calendar day with its total return, no_return flags the days missing
+        -- from fp_total_returns_daily, which the calendar query drops
+        SELECT p.*,
+            tr.one_day_pct,
+            CASE
+                       WHEN tr.fsym_id IS NULL
+                       THEN 1
+                       ELSE 0
+                   END AS no_return,
+            LAG(CASE
+                       WHEN tr.fsym_id IS NULL
+                       THEN 1
+                       ELSE 0
+                   END, 1, 0) OVER(PARTITION BY p.fsym_id
+                ORDER BY p.p_date) AS after_no_return,
+            CASE
+                       WHEN brk.fsym_id IS NULL
+                       THEN 0
+                       ELSE 1
+                   END AS is_break
+        FROM prices AS p
+            LEFT JOIN fp_v2.fp_total_returns_daily AS tr
+            ON tr.fsym_id = p.fsym_id
+                AND tr.p_date = p.p_date
+            LEFT JOIN breaks AS brk
+            ON brk.fsym_id = p.fsym_id
+                AND brk.p_date = p.p_date
+    ),
+    kept
+    AS
+    (
+        -- trading days only keeps the days a client cannot fill from the row before
+        -- them: the first day of every trade, breaks, days with a non-zero or NULL
+        -- total return and the days around a missing one.  Days missing a total return
+        -- end the fill of the row before them and are dropped below.
+        SELECT d.*,
+            ISNULL(LEAD(d.p_date) OVER(PARTITION BY d.fsym_id
+                ORDER BY d.p_date), d.fill_end_date) AS next_date
+        FROM days AS d
+        WHERE @trading_days = 0
+            OR d.p_date = d.fill_start_date
+            OR d.is_break = 1
+            OR d.no_return = 1
+            OR d.after_no_return = 1
+            OR ISNULL(d.one_day_pct, 1) <> 0
+    )
+SELECT p.fsym_id,
+    p.p_date AS price_date,
+    p.currency,
+    shs.p_com_shs_out AS unadj_shares_outstanding,
+    shs.p_com_shs_out * p.p_price AS market_value,
+    p.p_volume AS unadj_volume,
+    p.p_price AS unadj_price_close,
+    p.p_price_high AS unadj_price_high,
+    p.p_price_low AS unadj_price_low,
+    p.p_price_open AS unadj_price_open,
+    p.one_day_pct AS one_day_total_return,
+    p.next_date AS fill_end_date
+FROM kept AS p
+    LEFT JOIN shares_out AS shs
+    ON shs.fsym_id = p.fsym_id
+        AND p.p_date < shs.p_shs_out_end_date
+        AND p.p_date >= shs.p_date
+WHERE p.no_return = 0;
@@ -1,8 +1,16 @@
-from fds.datax._sdfhelpers._create import FdsDataStore as hcreate
 from fds.datax._sdfhelpers._find import FdsDataStoreLedger as hfind
 from fds.datax._sdfhelpers._read import FdsReadCache as hread
 
 
+def hcreate(*args, **kwargs):
+    """
+    FdsDataStore, imported on first use so reading caches never loads the SQL layer.
+    """
+    from fds.datax._sdfhelpers._create import FdsDataStore
+
+    return FdsDataStore(*args, **kwargs)
+
+
 class Universe:
     def __init__(self, dir_path):
         self.dir_path = dir_path
@@ -62,6 +70,16 @@ The "fds.datax.universe.delete" module allows you to delete an individual cache
         currency="",
         start_date="",
         end_date="",
+        stream_prices=False,
+        price_shards=None,
+        layout="file",
+        sidecar=False,
+        intervals=False,
+        adjust_on_read=False,
+        float32=False,
+        metrics=None,
+        keep_snapshots=1,
+        price_query="calendar",
     ):
         """
     create
@@ -121,24 +139,115 @@ curreny (string) – currency for pricing data to be return, if local currency i
 start_date (date - YYYY-MM-DD) – date for the start of the universe pull (first available)
 
 
+    Build Parameters
+    --------------------------
+    These optional inputs apply to both options:
+
+stream_prices (bool) – write pricing and corporate actions to disk one fetch batch at a time so memory use stays
+bounded for large universes or long date ranges. Default False.
+
+price_shards (int) – split the price query into this many ID partitions that run concurrently on separate
+connections. Default None, a single query.
+
+layout (string) – "file" stores each cache component as a single snappy parquet file. "dataset" stores the
+universe, prices and corporate actions as directories partitioned by year/month, sorted by ID and date, so reads
+only decode the columns and partitions they need. "shared" stores prices and corporate actions once per security
+for the whole data store and the cache as a manifest of its securities, so overlapping caches share one copy of
+each price history, and a cache built the same day as another with the same currency reuses its securities rather
+than downloading them again. Unused security files are removed a day after the last cache referencing them is
+rebuilt or deleted. Default "file".
+
+sidecar (bool) – also store an uncompressed Arrow IPC (Feather v2) copy of each cache component. "read" memory
+maps it, so kernels on the same host share one copy in the page cache instead of each decompressing the parquet
+files. Uses more disk space. Components stored in the "shared" layout have none. Default False.
+
+intervals (bool) – "generate" only. Store the ETF universe as one row per membership interval (start_date,
+end_date) instead of one row per day, which is orders of magnitude smaller to download and store. "read" expands
+it to daily rows unless asked for the intervals. Default False.
+
+adjust_on_read (bool) – download and store unadjusted prices only, along with every split and spin-off factor.
+"read" computes split (adj=1) and split & spin-off (adj=2) adjusted prices from the factors, roughly halving the
+download and the size of the pricing file. Default False.
+
+float32 (bool) – store price and volume columns as float32, halving their size on disk and in memory at the cost
+of precision beyond about 7 significant digits. ID columns are always stored dictionary encoded, read back as
+pandas categoricals, and dates as date32. Default False.
+
+metrics (callable or list) – a sink, or list of sinks, receiving timing records for every query (server, fetch and processing time,
+rows and bytes), build stage and file write, along with the peak RSS. A sink is any callable taking a record dict;
+fds.datax.utils.metrics provides LoggingSink and JsonFileSink, which appends one line per build to
+fdsDataStore/fds_build_metrics.jsonl. Default None, see fds.datax.utils.metrics.set_metrics_sinks.
+
+keep_snapshots (int) – number of earlier versions of the cache kept on disk. A build writes a new version of the
+cache next to the published one and switches readers over to it in one step once every file is written, so "read"
+never sees a partially built cache and a failed build leaves the previous version in place. Readers that started
+on an earlier version can finish as long as it is kept. Default 1.
+
+price_query (string) – the price query run on the server. "calendar" crosses the 7-day calendar with every security
+covered by the feed and looks up the last trade of each day with a correlated subquery. "window" forward fills the
+trading days of the universe over the calendar with window functions instead, scanning the price history of the
+universe only. "trading" runs the "window" query for trading days only, along with the days a split, spin-off or
+change of shares outstanding takes effect, and fills the other calendar days in Python, so about five rows in
+seven are downloaded. "window" and "trading" are written to build the same cache as "calendar" but have only been
+compared with it on the synthetic backend of the benchmarks, compare them on your own server before relying on
+them. Default "calendar".
+
+
     Returns
     -----------
 
     Each option will return a status message. To access the content created, utilize "fds.universe.read"
         """
         if (option.lower() == "generate") & (source.lower() == "sdf"):
-            obj = hcreate(dir_path=self.dir_path).build_universe(
+            obj = hcreate(
+                dir_path=self.dir_path,
+                stream_prices=stream_prices,
+                price_shards=price_shards,
+                layout=layout,
+                sidecar=sidecar,
+                intervals=intervals,
+                adjust_on_read=adjust_on_read,
+                float32=float32,
+                metrics=metrics,
+                keep_snapshots=keep_snapshots,
+                price_query=price_query,
+            ).build_universe(
                 cache_name, mssql_dsn, etf_ticker, currency, start_date, end_date
             )
         elif (option.lower() == "load") & (source.lower() == "sdf"):
-            obj = hcreate(dir_path=self.dir_path).load_universe(
+            obj = hcreate(
+                dir_path=self.dir_path,
+                stream_prices=stream_prices,
+                price_shards=price_shards,
+                layout=layout,
+                sidecar=sidecar,
+                adjust_on_read=adjust_on_read,
+                float32=float32,
+                metrics=metrics,
+                keep_snapshots=keep_snapshots,
+                price_query=price_query,
+            ).load_universe(
                 data, cache_name, mssql_dsn, currency, start_date
             )
         else:
             print("Select the option of Generate or Load!")
         return obj
 
-    def rebuild(self, cache_name=""):
+    def rebuild(
+        self,
+        cache_name="",
+        stream_prices=False,
+        price_shards=None,
+        incremental=False,
+        lookback_days=30,
+        layout=None,
+        sidecar=None,
+        adjust_on_read=None,
+        float32=None,
+        metrics=None,
+        keep_snapshots=1,
+        price_query="calendar",
+    ):
         """
     create
 
@@ -149,16 +258,127 @@ The `fds.universe.rebuild` module rebuilds an existing cache with the details co
 
 cache_name (string) – A Universe cache name found in the available cache data store.
 
+stream_prices (bool) – write pricing and corporate actions to disk one fetch batch at a time, see create.
+
+price_shards (int) – number of concurrent partitions for the price query, see create.
+
+incremental (bool) – only download prices after the most recent price date in the cache, less lookback_days, and
+merge them into the existing files. Securities with a split or spin-off inside that window are downloaded again in
+full so their adjusted history is restated. Default False.
+
+lookback_days (int) – number of days before the most recent cached price date re-downloaded by an incremental
+rebuild. Default 30.
+
+layout (string) – "file", "dataset" or "shared", see create. Default None keeps the layout the cache is stored in.
+
+sidecar (bool) – write Arrow IPC sidecars, see create. Default None keeps the sidecars of the cache.
+
+adjust_on_read (bool) – store unadjusted prices only, see create. Default None keeps the mode of the cache.
+
+float32 (bool) – store price and volume columns as float32, see create. Default None keeps the precision of the
+cache.
+
+metrics (callable or list) – sinks receiving the build timing records, see create.
+
+keep_snapshots (int) – number of earlier versions of the cache kept on disk, see create. Default 1.
+
+price_query (string) – "calendar", "window" or "trading", the price query the cache is built from, see create.
+Default "calendar".
+
     Returns
     -----------
 
 A string status message informing you that the universe was rebuilt. To access the content created,
 utilize “fds.universe.read”
 """
-        obj = hcreate(dir_path=self.dir_path).rebuild_cache(cache_name)
+        obj = hcreate(
+            dir_path=self.dir_path,
+            stream_prices=stream_prices,
+            price_shards=price_shards,
+            layout=layout,
+            sidecar=sidecar,
+            adjust_on_read=adjust_on_read,
+            float32=float32,
+            metrics=metrics,
+            keep_snapshots=keep_snapshots,
+            price_query=price_query,
+        ).rebuild_cache(
+            cache_name, incremental=incremental, lookback_days=lookback_days
+        )
         return obj
 
-    def read(self, cache_name, option="Universe", adj=1, show_details=1):
+    def batch(
+        self,
+        caches=[],
+        stream_prices=False,
+        price_shards=None,
+        layout=None,
+        sidecar=None,
+        intervals=False,
+        adjust_on_read=None,
+        float32=None,
+        metrics=None,
+        keep_snapshots=1,
+        price_query="calendar",
+    ):
+        """
+    batch
+
+The `fds.universe.batch` module creates and rebuilds several caches at once. Securities held by more than one
+cache, e.g. overlapping ETFs, are downloaded once: symbology, security reference data, prices and corporate
+actions are each queried once for the union of the caches and split into the files of every cache, so a batch of
+overlapping caches builds in about the time of a single cache holding all of their securities.
+
+    Parameter
+    ------------------------------
+
+caches (list) – the caches to build. Each is either the name of an existing cache, rebuilt with the details in
+the fds details file, or a dict defining a new cache with the "generate" parameters of create (cache_name,
+mssql_dsn, etf_ticker, currency, start_date, end_date) or, when it holds data, the "load" parameters (data,
+cache_name, mssql_dsn, currency, start_date).
+
+Prices are shared by the caches with the same mssql_dsn and currency, from the earliest start_date among them.
+The shared query results are held in memory until every cache of the batch is built.
+
+stream_prices, price_shards, layout, sidecar, intervals, adjust_on_read, float32, metrics, keep_snapshots,
+price_query – see create and rebuild. Options left at None keep the settings of existing caches and use the defaults of create for
+new ones.
+
+    Returns
+    -----------
+
+A string status message informing you that the caches were built. To access the content created,
+utilize “fds.universe.read”
+"""
+        obj = hcreate(
+            dir_path=self.dir_path,
+            stream_prices=stream_prices,
+            price_shards=price_shards,
+            layout=layout,
+            sidecar=sidecar,
+            intervals=intervals,
+            adjust_on_read=adjust_on_read,
+            float32=float32,
+            metrics=metrics,
+            keep_snapshots=keep_snapshots,
+            price_query=price_query,
+        ).build_batch(caches)
+        return obj
+
+    def read(
+        self,
+        cache_name,
+        option="Universe",
+        adj=1,
+        show_details=1,
+        start_date=None,
+        end_date=None,
+        ids=None,
+        columns=None,
+        arrow=False,
+        intervals=False,
+        dtypes=None,
+    ):
         """
     read
     ------
@@ -183,6 +403,21 @@ The `fds.universe.read` module will load data files specific to the universe and
              2:  Split and spin-off adjusted values.
              3:  All types.
 
+    Filter Parameters
+    ----------------------
+    Filters are applied while the cache files are scanned, so only matching data is read from disk:
+    - start_date: Optional first date to load (inclusive). Not used for "sec ref".
+    - end_date: Optional last date to load (inclusive). Not used for "sec ref".
+    - ids: Optional list of ref_ids or FactSet identifiers (fsym_id, factset_entity_id) to load.
+    - columns: Optional list of columns to load. For "prices" use the returned names, e.g. price_close. With adj=3
+      the columns keep their stored names, e.g. unadj_price_close, and price_close loads it for every adjustment.
+    - arrow: Return a pyarrow Table instead of a pandas DataFrame. For caches built with sidecar=True the table
+      is a zero-copy view of the memory mapped cache file.
+    - intervals: "universe" only. Return an interval encoded universe as stored, one row per
+      ref_id | ... | start_date | end_date, instead of expanding it to one row per day.
+    - dtypes: Optional fds.datax.utils.dtypes.FdsDtypePolicy the loaded columns are cast to, e.g.
+      FdsDtypePolicy(float32=True, arrow_strings=True) for float32 prices and Arrow backed strings.
+
     Returns
     ------------
 
@@ -216,21 +451,31 @@ The `fds.universe.read` module will load data files specific to the universe and
     price_high | price_low | price_open | market_value
 
         """
+        filters = dict(ids=ids, columns=columns, arrow=arrow)
+        dates = dict(start_date=start_date, end_date=end_date)
         if option.lower() == "universe":
-            obj = hread(dir_path=self.dir_path).load_sym(
-                cache_name=cache_name, show_details=show_details
+            obj = hread(dir_path=self.dir_path, dtypes=dtypes).load_sym(
+                cache_name=cache_name,
+                show_details=show_details,
+                intervals=intervals,
+                **filters,
+                **dates
             )
         elif option.lower() == "sec ref":
-            obj = hread(dir_path=self.dir_path).load_sec_ref(
-                cache_name=cache_name, show_details=show_details
+            obj = hread(dir_path=self.dir_path, dtypes=dtypes).load_sec_ref(
+                cache_name=cache_name, show_details=show_details, **filters
             )
         elif option.lower() == "prices":
-            obj = hread(dir_path=self.dir_path).load_prices(
-                cache_name=cache_name, adj=adj, show_details=show_details
+            obj = hread(dir_path=self.dir_path, dtypes=dtypes).load_prices(
+                cache_name=cache_name,
+                adj=adj,
+                show_details=show_details,
+                **filters,
+                **dates
             )
         elif option.lower() == "corp actions":
-            obj = hread(dir_path=self.dir_path).load_corp_actions(
-                cache_name=cache_name, show_details=show_details
+            obj = hread(dir_path=self.dir_path, dtypes=dtypes).load_corp_actions(
+                cache_name=cache_name, show_details=show_details, **filters, **dates
             )
         else:
             print("Select the option of Generate, Load, or Rebuild")
@@ -0,0 +1,98 @@
+import pandas as pd
+
+from fds.datax.utils.intervals import asof_join
+
+FACTOR_COLUMNS = ["cum_split_factor", "cum_spin_factor"]
+
+# adjusted price column: (unadjusted source column, factors, divide by the factors).
+# Mirrors the adjusted columns of fds_prices.sql.
+ADJUSTMENTS = {
+    "split_adj_shares_outstanding": (
+        "unadj_shares_outstanding",
+        ["cum_split_factor"],
+        True,
+    ),
+    "split_adj_volume": ("unadj_volume", ["cum_split_factor"], True),
+    "split_adj_price_close": ("unadj_price_close", ["cum_split_factor"], False),
+    "split_adj_price_high": ("unadj_price_high", ["cum_split_factor"], False),
+    "split_adj_price_low": ("unadj_price_low", ["cum_split_factor"], False),
+    "split_adj_price_open": ("unadj_price_open", ["cum_split_factor"], False),
+    "split_spin_adj_price_close": ("unadj_price_close", FACTOR_COLUMNS, False),
+    "split_spin_adj_price_high": ("unadj_price_high", FACTOR_COLUMNS, False),
+    "split_spin_adj_price_low": ("unadj_price_low", FACTOR_COLUMNS, False),
+    "split_spin_adj_price_open": ("unadj_price_open", FACTOR_COLUMNS, False),
+}
+
+
+def is_unadjusted(columns):
+    """
+    True when a price frame or schema only holds unadjusted prices, the adjusted
+    columns being computed on read from the corporate action factors.
+    """
+    return not any(col in columns for col in ADJUSTMENTS)
+
+
+def factor_table(corp_actions, id_map=None):
+    """
+    Converts the output of GetSDFData.fds_corp_actions into the _corp_actions layout.
+
+    Each row holds the cumulative factors of the prices up to and including
+    price_date, the day before the corporate action, matching the rows flagged by
+    adj_factor_flag in fds_prices.sql.  Every corporate action of the universe is kept,
+    so adjusted prices can be computed for any date range.
+    """
+    ca = pd.DataFrame(
+        {
+            "ref_id": None,
+            "fsym_id": corp_actions.fsym_id.values,
+            "price_date": pd.to_datetime(corp_actions.price_date).values
+            - pd.Timedelta(days=1),
+        }
+    )
+    for col in FACTOR_COLUMNS:
+        ca[col] = corp_actions[col].astype(float).fillna(1).values
+    if id_map is not None:
+        ca["ref_id"] = ca.fsym_id.map(id_map)
+    return ca.sort_values(["fsym_id", "price_date"]).reset_index(drop=True)
+
+
+def adjust_prices(prices, corp_actions, columns=None):
+    """
+    Adds split and spin-off adjusted columns to an unadjusted price frame.
+
+    The factors of each price row are those of the first corporate action row of the
+    same fsym_id on or after its price_date, 1 when there is none, found with a
+    forward as-of join rather than a merge on every date.  columns lists the adjusted
+    columns to compute, all of ADJUSTMENTS by default.
+    """
+    if columns is None:
+        columns = list(ADJUSTMENTS)
+    columns = [col for col in columns if col in ADJUSTMENTS]
+    if not columns:
+        return prices
+    factors = corp_actions[["fsym_id", "price_date"] + FACTOR_COLUMNS].rename(
+        columns={"price_date": "factor_date"}
+    )
+    factors["factor_date"] = pd.to_datetime(factors.factor_date)
+    joined = asof_join(
+        prices[["fsym_id", "price_date"]],
+        factors,
+        "fsym_id",
+        "price_date",
+        "factor_date",
+        direction="forward",
+        how="left",
+    )
+    scale = {col: joined[col].fillna(1).values for col in FACTOR_COLUMNS}
+    prices = prices.copy()
+    for col in columns:
+        source, factor_cols, divide = ADJUSTMENTS[col]
+        factor = scale[factor_cols[0]]
+        for factor_col in factor_cols[1:]:
+            factor = factor * scale[factor_col]
+        # float32 prices stay float32, see FdsDtypePolicy
+        dtype = prices[source].dtype if prices[source].dtype.kind == "f" else float
+        values = prices[source].values.astype(dtype)
+        adjusted = values / factor if divide else values * factor
+        prices[col] = adjusted.astype(dtype, copy=False)
+    return prices
@@ -0,0 +1,224 @@
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def __pyodbc__():
+    """
+    Imports pyodbc on the first database call, so workflows that only read caches do
+    not need pyodbc or an ODBC driver installed.
+    """
+    import pyodbc
+
+    return pyodbc
+
+
+def __db_error__():
+    """
+    The exception type of the database driver, an empty tuple that matches nothing
+    while pyodbc has not been imported, e.g. with a custom connection factory.
+    """
+    pyodbc = sys.modules.get("pyodbc")
+    return () if pyodbc is None else pyodbc.Error
+
+
+class FdsConnectionPool:
+    """
+    A pool of reusable ODBC connections keyed by DSN name.
+
+    Each DSN keeps at most max_size open connections. Idle connections are
+    closed once they have not been used for idle_timeout seconds, and a
+    connection is health checked with a trivial query before it is handed
+    out again. Use checkout() as a context manager so the connection is
+    always returned to the pool:
+
+        with pool.checkout("SDF") as connection:
+            pd.read_sql(q, connection)
+
+    connect is an optional callable returning a new DB-API connection for a DSN name,
+    used instead of pyodbc, e.g. an in memory stand-in for benchmarks.
+    """
+
+    def __init__(
+        self, max_size=4, idle_timeout=300, checkout_timeout=None, connect=None
+    ):
+        self.connect = connect
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._idle = {}
+        self._in_use = {}
+        self._cond = threading.Condition()
+
+    def __connect__(self, mssql_dsn):
+        if self.connect is not None:
+            return self.connect(mssql_dsn)
+        return __pyodbc__().connect("DSN={}".format(mssql_dsn))
+
+    @staticmethod
+    def __close__(connection):
+        try:
+            connection.close()
+        except __db_error__():
+            pass
+
+    @staticmethod
+    def __healthy__(connection):
+        """
+        Runs a trivial query against the connection to make sure the session is still alive.
+        """
+        try:
+            cursor = connection.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchall()
+            cursor.close()
+            return True
+        except __db_error__():
+            return False
+
+    def __evict_idle__(self, mssql_dsn):
+        """
+        Drops connections that have been idle for longer than idle_timeout. Must be called with the lock held.
+        """
+        now = time.monotonic()
+        keep, stale = [], []
+        for connection, last_used in self._idle.get(mssql_dsn, []):
+            if now - last_used > self.idle_timeout:
+                stale.append(connection)
+            else:
+                keep.append((connection, last_used))
+        self._idle[mssql_dsn] = keep
+        return stale
+
+    def acquire(self, mssql_dsn):
+        """
+        Returns an open connection for the DSN, reusing an idle one when possible.
+        """
+        deadline = (
+            None
+            if self.checkout_timeout is None
+            else time.monotonic() + self.checkout_timeout
+        )
+        while True:
+            with self._cond:
+                stale = self.__evict_idle__(mssql_dsn)
+                idle = self._idle[mssql_dsn]
+                in_use = self._in_use.get(mssql_dsn, 0)
+                if idle:
+                    connection, _ = idle.pop()
+                    create = False
+                elif in_use + len(idle) < self.max_size:
+                    connection = None
+                    create = True
+                else:
+                    remaining = (
+                        None if deadline is None else deadline - time.monotonic()
+                    )
+                    if remaining is not None and remaining <= 0:
+                        raise TimeoutError(
+                            "Timed out waiting for a connection to DSN {}.".format(
+                                mssql_dsn
+                            )
+                        )
+                    self._cond.wait(remaining)
+                    connection, create = None, None
+                if create is not None:
+                    self._in_use[mssql_dsn] = in_use + 1
+
+            for conn in stale:
+                self.__close__(conn)
+
+            if create is None:
+                continue
+            try:
+                if create:
+                    return self.__connect__(mssql_dsn)
+                if self.__healthy__(connection):
+                    return connection
+                self.__close__(connection)
+                return self.__connect__(mssql_dsn)
+            except Exception:
+                self.__release_slot__(mssql_dsn)
+                raise
+
+    def __release_slot__(self, mssql_dsn):
+        with self._cond:
+            self._in_use[mssql_dsn] -= 1
+            self._cond.notify()
+
+    def release(self, mssql_dsn, connection, discard=False):
+        """
+        Returns a connection to the pool. Connections flagged with discard are closed instead.
+        """
+        if discard:
+            self.__close__(connection)
+        else:
+            try:
+                # never hand out a connection with an open transaction
+                connection.rollback()
+            except __db_error__():
+                discard = True
+                self.__close__(connection)
+        with self._cond:
+            self._in_use[mssql_dsn] -= 1
+            if not discard:
+                self._idle.setdefault(mssql_dsn, []).append(
+                    (connection, time.monotonic())
+                )
+            self._cond.notify()
+
+    @contextmanager
+    def checkout(self, mssql_dsn):
+        """
+        Context managed checkout of a connection for the DSN.
+        """
+        connection = self.acquire(mssql_dsn)
+        try:
+            yield connection
+        except __db_error__():
+            self.release(mssql_dsn, connection, discard=True)
+            raise
+        except BaseException:
+            self.release(mssql_dsn, connection)
+            raise
+        else:
+            self.release(mssql_dsn, connection)
+
+    def close_all(self, mssql_dsn=None):
+        """
+        Closes every idle connection, optionally only those for a single DSN.
+        """
+        with self._cond:
+            dsns = list(self._idle) if mssql_dsn is None else [mssql_dsn]
+            to_close = []
+            for dsn in dsns:
+                to_close.extend(c for c, _ in self._idle.pop(dsn, []))
+        for connection in to_close:
+            self.__close__(connection)
+
+
+_pool = FdsConnectionPool()
+
+
+def get_pool():
+    """
+    Returns the process wide connection pool shared by GetSDFData and FdsDataStore.
+    """
+    return _pool
+
+
+def set_connection_factory(connect=None):
+    """
+    Makes the shared pool open connections with connect(mssql_dsn) instead of pyodbc,
+    None restores pyodbc.  Idle connections of the previous factory are closed.
+    """
+    _pool.close_all()
+    _pool.connect = connect
+
+
+def checkout(mssql_dsn):
+    """
+    Shortcut for get_pool().checkout(mssql_dsn).
+    """
+    return _pool.checkout(mssql_dsn)
@@ -0,0 +1,134 @@
+import pandas as pd
+import pyarrow as pa
+
+# identifier columns repeated on every daily row, stored dictionary encoded
+DICTIONARY_COLUMNS = [
+    "ref_id",
+    "fsym_id",
+    "factset_entity_id",
+    "fsym_primary_listing_id",
+    "fsym_primary_equity_id",
+    "currency",
+]
+
+# day resolution columns, stored as date32
+DATE_COLUMNS = ["date", "price_date", "start_date", "end_date"]
+
+# price and volume valued columns, stored as float32 when asked for.  Returns and the
+# cumulative adjustment factors always keep float64.
+FLOAT32_SUFFIXES = (
+    "price_close",
+    "price_high",
+    "price_low",
+    "price_open",
+    "volume",
+    "shares_outstanding",
+    "market_value",
+)
+
+DICTIONARY_TYPE = pa.dictionary(pa.int32(), pa.string())
+
+
+def is_float32_column(name):
+    return name.endswith(FLOAT32_SUFFIXES)
+
+
+def __is_string__(t):
+    return pa.types.is_string(t) or pa.types.is_large_string(t)
+
+
+class FdsDtypePolicy:
+    """
+    Column types of cached frames.
+
+    categorical_ids: dictionary encode the ID columns and any other categorical column,
+                     read back as pandas categoricals.
+    float32: store and return price and volume columns as float32.
+    date32: store date columns as date32, returned as datetime64[ns] by pandas.
+    arrow_strings: return the remaining string columns as Arrow backed pandas strings.
+
+    The same policy is applied by FdsDataStore before a cache component is written and,
+    when given to FdsReadCache, to every table read, so caches written before a policy
+    existed are returned with the same types.
+    """
+
+    def __init__(
+        self, categorical_ids=True, float32=False, date32=True, arrow_strings=False
+    ):
+        self.categorical_ids = categorical_ids
+        self.float32 = float32
+        self.date32 = date32
+        self.arrow_strings = arrow_strings
+
+    def __field_type__(self, field):
+        t = field.type
+        if self.categorical_ids:
+            if pa.types.is_dictionary(t):
+                # one type for every batch, pandas picks int8 or int16 indices by size
+                if __is_string__(t.value_type):
+                    return DICTIONARY_TYPE
+                return pa.dictionary(pa.int32(), t.value_type)
+            if field.name in DICTIONARY_COLUMNS and __is_string__(t):
+                return DICTIONARY_TYPE
+        if self.date32 and field.name in DATE_COLUMNS and pa.types.is_timestamp(t):
+            return pa.date32()
+        if self.float32 and is_float32_column(field.name) and pa.types.is_float64(t):
+            return pa.float32()
+        return t
+
+    def schema(self, schema):
+        """
+        Returns the schema a table with the given schema is stored with.
+        """
+        fields = [field.with_type(self.__field_type__(field)) for field in schema]
+        return pa.schema(fields)
+
+    def cast(self, table):
+        """
+        Casts a pyarrow Table to the policy, returning it unchanged when nothing changes.
+        """
+        schema = self.schema(table.schema)
+        if schema.equals(table.schema):
+            return table
+        return table.cast(schema)
+
+    def table(self, df):
+        """
+        Converts a DataFrame into a pyarrow Table with the policy's types.
+        """
+        return self.cast(pa.Table.from_pandas(df, preserve_index=False))
+
+    def types_mapper(self):
+        if not self.arrow_strings:
+            return None
+        strings = {
+            pa.string(): pd.StringDtype("pyarrow"),
+            pa.large_string(): pd.StringDtype("pyarrow"),
+        }
+        return strings.get
+
+
+def to_pandas(table, dtypes=None):
+    """
+    Converts a cache table to pandas.  date32 columns are returned as datetime64[ns],
+    as caches stored timestamps before, and every column gets its own block so null
+    free numeric columns are wrapped without a copy.
+    """
+    if dtypes is not None:
+        table = dtypes.cast(table)
+    return table.to_pandas(
+        split_blocks=True,
+        date_as_object=False,
+        coerce_temporal_nanoseconds=True,
+        types_mapper=None if dtypes is None else dtypes.types_mapper(),
+    )
+
+
+def stored_float32(schema):
+    """
+    True when a stored schema holds its price and volume columns as float32.
+    """
+    return any(
+        is_float32_column(field.name) and pa.types.is_float32(field.type)
+        for field in schema
+    )
@@ -0,0 +1,135 @@
+import decimal
+
+import numpy as np
+import pandas as pd
+
+# python types reported by pyodbc in cursor.description mapped to numpy dtypes,
+# anything else is stored as object.  Integers are fetched as float64 so NULLs
+# become NaN, and are narrowed back to int64 when no NULLs were returned.
+_NUMERIC_TYPES = {float: np.float64, decimal.Decimal: np.float64, int: np.float64}
+
+
+def __execute__(connection, q, arraysize):
+    """
+    Executes the query and advances past the result-less statements (temp table
+    setup, inserts) at the top of the SQL templates.
+    """
+    cursor = connection.cursor()
+    cursor.arraysize = arraysize
+    cursor.execute(q)
+    while cursor.description is None:
+        if not cursor.nextset():
+            break
+    return cursor
+
+
+def __column_dtypes__(description):
+    return [_NUMERIC_TYPES.get(col[1], object) for col in description]
+
+
+def __fetch_rows__(connection, q, arraysize):
+    """
+    Executes the query once and yields (description, rows) for each
+    cursor.fetchmany batch.  A query returning no rows yields a single empty batch
+    so callers still see the columns.
+    """
+    cursor = __execute__(connection, q, arraysize)
+    try:
+        if cursor.description is None:
+            return
+        fetched = False
+        while True:
+            rows = cursor.fetchmany(arraysize)
+            if not rows:
+                break
+            fetched = True
+            yield cursor.description, rows
+        if not fetched:
+            yield cursor.description, []
+    finally:
+        cursor.close()
+
+
+def __fill__(arrays, offset, rows):
+    """
+    Writes a batch of rows column by column into the arrays starting at offset.
+    """
+    if rows:
+        for arr, col in zip(arrays, zip(*rows)):
+            arr[offset : offset + len(rows)] = col
+
+
+def iter_batches(connection, q, arraysize=10000):
+    """
+    Executes the query and yields (columns, type_codes, values) for each
+    cursor.fetchmany batch, values being a list of one NumPy array per column.
+    """
+    for description, rows in __fetch_rows__(connection, q, arraysize):
+        columns = [col[0] for col in description]
+        type_codes = [col[1] for col in description]
+        values = [np.empty(len(rows), dtype=d) for d in __column_dtypes__(description)]
+        __fill__(values, 0, rows)
+        yield columns, type_codes, values
+
+
+def __to_series__(name, arr, type_code):
+    if arr.dtype == object:
+        return pd.Series(arr, name=name).infer_objects()
+    if type_code is int and not np.isnan(arr).any():
+        return pd.Series(arr.astype(np.int64), name=name)
+    return pd.Series(arr, name=name)
+
+
+def __finalize__(columns, arrays, parse_dates, type_codes=None):
+    frame = {}
+    type_codes = type_codes or [None] * len(columns)
+    for name, arr, type_code in zip(columns, arrays, type_codes):
+        series = __to_series__(name, arr, type_code)
+        if parse_dates is not None and name in parse_dates:
+            series = pd.to_datetime(series)
+        frame[name] = series
+    return pd.DataFrame(frame, columns=columns)
+
+
+def read_sql_stream(q, connection, arraysize=10000, parse_dates=None):
+    """
+    Single pass replacement for pd.read_sql(..., chunksize=...).
+
+    Rows are fetched with cursor.fetchmany(arraysize) and written straight into
+    preallocated NumPy column arrays, which grow geometrically as needed, so there is
+    no per-chunk DataFrame or concat and the query is never executed twice.
+
+    Parameters
+    -----------
+    q: query text
+    connection: open pyodbc connection
+    arraysize: rows per fetchmany call
+    parse_dates: list of columns to convert to datetime64
+    """
+    description, arrays, n = None, None, 0
+    for description, rows in __fetch_rows__(connection, q, arraysize):
+        k = len(rows)
+        if arrays is None:
+            arrays = [
+                np.empty(max(k, arraysize), dtype=d)
+                for d in __column_dtypes__(description)
+            ]
+        elif n + k > len(arrays[0]):
+            capacity = max(2 * len(arrays[0]), n + k)
+            grown = []
+            for arr in arrays:
+                new = np.empty(capacity, dtype=arr.dtype)
+                new[:n] = arr[:n]
+                grown.append(new)
+            arrays = grown
+        __fill__(arrays, n, rows)
+        n += k
+
+    if description is None:
+        return pd.DataFrame()
+    return __finalize__(
+        [col[0] for col in description],
+        [arr[:n] for arr in arrays],
+        parse_dates,
+        [col[1] for col in description],
+    )
@@ -0,0 +1,242 @@
+import os
+import threading
+import uuid
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from fds.datax.utils.ledger import FdsLedgerDB
+
+FX_FILE = "fds_fx_rates.snappy"
+
+_fx_cache = {}
+_fx_lock = threading.Lock()
+
+
+class FdsFxRates:
+    """
+    Dense (date x currency) FX rate matrices.
+
+    to_usd holds exch_rate_usd, the USD value of one unit of each currency, and
+    per_usd holds exch_rate_per_usd, units of each currency per USD, as float64
+    arrays of shape (len(dates), len(currencies)) with NaN where there is no rate.
+    The rate from currency c to target t on date d is to_usd[d, c] * per_usd[d, t],
+    so a single matrix pair converts to any target currency.
+
+    start is the first date the rates were requested for, the rates are complete
+    from start through the last date in dates.
+    """
+
+    def __init__(self, dates, currencies, to_usd, per_usd, start=None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.currencies = list(currencies)
+        self.to_usd = to_usd
+        self.per_usd = per_usd
+        self.start = self.dates[0] if start is None and len(self.dates) else start
+        self._index = {c: i for i, c in enumerate(self.currencies)}
+
+    @classmethod
+    def from_frame(cls, fx, start=None):
+        """
+        Builds the matrices from a long frame of price_date | currency | exch_rate_usd |
+        exch_rate_per_usd, as returned by GetSDFData.fds_fx_table.  The output of
+        GetSDFData.fds_fx_rates is accepted as well, it only converts to its target.
+        """
+        if "exch_rate_per_usd" not in fx.columns:
+            # fds_fx_rates output, per_usd is only known for the target currency
+            per_usd = fx.exch_rate_per_usd_to.where(fx.currency == fx.currency_to)
+            fx = fx.assign(exch_rate_per_usd=per_usd)
+        dates, date_idx = np.unique(
+            pd.to_datetime(fx.price_date).values.astype("datetime64[D]"),
+            return_inverse=True,
+        )
+        currencies, ccy_idx = np.unique(
+            fx.currency.astype(str).str.strip().values, return_inverse=True
+        )
+        matrices = []
+        for col in ["exch_rate_usd", "exch_rate_per_usd"]:
+            matrix = np.full((len(dates), len(currencies)), np.nan)
+            matrix[date_idx, ccy_idx] = fx[col].astype(float).values
+            matrices.append(matrix)
+        return cls(dates, currencies, matrices[0], matrices[1], start)
+
+    def to_frame(self):
+        """
+        Long form of the matrices, the inverse of from_frame.
+        """
+        d, c = np.nonzero(~(np.isnan(self.to_usd) & np.isnan(self.per_usd)))
+        return pd.DataFrame(
+            {
+                "price_date": self.dates[d].astype("datetime64[ns]"),
+                "currency": np.asarray(self.currencies, dtype=object)[c],
+                "exch_rate_usd": self.to_usd[d, c],
+                "exch_rate_per_usd": self.per_usd[d, c],
+            }
+        )
+
+    def end(self):
+        return self.dates[-1] if len(self.dates) else None
+
+    def covers(self, start_date, end_date):
+        """
+        True when rates were downloaded for every date from start_date to end_date.
+        """
+        if not len(self.dates):
+            return False
+        start_date = np.datetime64(pd.Timestamp(start_date), "D")
+        end_date = np.datetime64(pd.Timestamp(end_date), "D")
+        return self.start <= start_date and end_date <= self.end()
+
+    def combine(self, other):
+        """
+        Returns the union of two rate sets, rates in other win where both have one.
+        """
+        fx = pd.concat([self.to_frame(), other.to_frame()]).drop_duplicates(
+            ["price_date", "currency"], keep="last"
+        )
+        starts = [f.start for f in (self, other) if f.start is not None]
+        return FdsFxRates.from_frame(fx, min(starts) if starts else None)
+
+    def lookup(self, price_dates, currencies, target):
+        """
+        Gathers the rate to target for each (price_date, currency) pair, NaN where there
+        is none.  Dates and currencies are mapped to matrix positions with
+        np.searchsorted and a per currency lookup, then read with one fancy index.
+        """
+        price_dates = pd.to_datetime(price_dates).values.astype("datetime64[D]")
+        out = np.full(len(price_dates), np.nan)
+        t = self._index.get(target)
+        if t is None or not len(self.dates):
+            return out
+        rows = np.searchsorted(self.dates, price_dates)
+        rows = np.minimum(rows, len(self.dates) - 1)
+        found = self.dates[rows] == price_dates
+
+        currencies = pd.Categorical(currencies)
+        codes = np.array(
+            [self._index.get(str(c).strip(), -1) for c in currencies.categories],
+            dtype=np.int64,
+        )
+        cols = np.where(currencies.codes >= 0, codes[currencies.codes], -1)
+        found &= cols >= 0
+
+        r, c = rows[found], cols[found]
+        out[found] = self.to_usd[r, c] * self.per_usd[r, t]
+        return out
+
+    def target_frame(self, target, currencies=None):
+        """
+        Rates to target in the long layout of GetSDFData.fds_fx_rates:
+        price_date | currency | currency_to | exch_rate_usd | exch_rate_per_usd_to | fx_rate
+        """
+        fx = self.to_frame()
+        if currencies is not None:
+            fx = fx.loc[fx.currency.isin(list(currencies) + [target])]
+        t = self._index.get(target)
+        if t is None:
+            per_usd_to = np.full(len(fx), np.nan)
+        else:
+            rows = np.searchsorted(
+                self.dates, fx.price_date.values.astype("datetime64[D]")
+            )
+            per_usd_to = self.per_usd[rows, t]
+        fx = fx.drop(columns="exch_rate_per_usd").assign(
+            currency_to=target, exch_rate_per_usd_to=per_usd_to
+        )
+        fx = fx.loc[fx.exch_rate_per_usd_to.notnull()]
+        fx["fx_rate"] = fx["exch_rate_usd"] * fx["exch_rate_per_usd_to"]
+        return fx[
+            [
+                "price_date",
+                "currency",
+                "currency_to",
+                "exch_rate_usd",
+                "exch_rate_per_usd_to",
+                "fx_rate",
+            ]
+        ].reset_index(drop=True)
+
+    def convert(self, prices, target, columns):
+        """
+        Converts the price valued columns of a frame with price_date and currency
+        columns to target, multiplying in place by the gathered rates.  The rate is
+        kept in an fx_rate column and currency is set to target, missing where there
+        was no rate, as the former merge based conversion did.
+        """
+        fx_rate = self.lookup(prices.price_date, prices.currency, target)
+        columns = [col for col in columns if col in prices.columns]
+        prices[columns] = prices[columns].values * fx_rate[:, None]
+        prices["currency"] = pd.Categorical(
+            np.where(np.isnan(fx_rate), None, target), categories=[target]
+        )
+        prices["fx_rate"] = fx_rate
+        return prices
+
+
+def fx_file(store_dir):
+    return os.path.join(store_dir, FX_FILE)
+
+
+def load_fx(store_dir):
+    """
+    Returns the FX rates persisted in a data store directory, None when there are none.
+    The parsed matrices are kept in process while the file is unchanged.
+    """
+    path = fx_file(store_dir)
+    if not os.path.exists(path):
+        return None
+    mtime = os.stat(path).st_mtime_ns
+    cached = _fx_cache.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+    table = pq.read_table(path)
+    meta = table.schema.metadata or {}
+    start = meta.get(b"fx_start")
+    fx = FdsFxRates.from_frame(
+        table.to_pandas(),
+        None if start is None else np.datetime64(start.decode(), "D"),
+    )
+    _fx_cache[path] = (mtime, fx)
+    return fx
+
+
+def save_fx(fx, store_dir):
+    """
+    Persists FX rates to a data store directory, renaming the file into place so
+    concurrent readers never see a partial file.  Builds update the rates with
+    merge_fx, which also keeps other processes from overwriting them.
+    """
+    path = fx_file(store_dir)
+    table = pa.Table.from_pandas(fx.to_frame(), preserve_index=False)
+    table = table.replace_schema_metadata(
+        {**(table.schema.metadata or {}), b"fx_start": str(fx.start).encode()}
+    )
+    tmp = "{}.{}.tmp".format(path, uuid.uuid4().hex)
+    pq.write_table(table, tmp, compression="snappy")
+    os.replace(tmp, path)
+    _fx_cache[path] = (os.stat(path).st_mtime_ns, fx)
+
+
+def merge_fx(fx, store_dir):
+    """
+    Merges FX rates into those persisted in a data store directory and saves the
+    result, which is returned.  The write lock of the cache ledger is held from the
+    read to the rename, so rates another process saved meanwhile are kept rather
+    than overwritten, and rates in fx win where both have one.
+    """
+    with FdsLedgerDB(store_dir).transaction():
+        current = load_fx(store_dir)
+        if current is not None:
+            fx = current.combine(fx)
+        save_fx(fx, store_dir)
+    return fx
+
+
+def fx_lock():
+    """
+    Lock serializing FX store updates within the process, across processes see
+    merge_fx.
+    """
+    return _fx_lock
@@ -19,6 +19,22 @@ def __chunker__(seq, size):
     return (seq[pos : pos + size] for pos in range(0, len(seq), size))
 
 
+def __partition__(seq, parts):
+    """
+    Splits the sequence into at most `parts` contiguous partitions whose sizes differ by at most one.
+    """
+    if not parts or parts <= 1 or len(seq) <= 1:
+        return [seq]
+    parts = min(parts, len(seq))
+    size, extra = divmod(len(seq), parts)
+    out, pos = [], 0
+    for i in range(parts):
+        step = size + (1 if i < extra else 0)
+        out.append(seq[pos : pos + step])
+        pos += step
+    return out
+
+
 def __insert_values__(list_of_ids):
     """
     This function is used to dynamically created insert statements
@@ -31,3 +47,24 @@ def __insert_values__(list_of_ids):
             "('" + "'),('".join(i for i in group) + "')"
         )
     return insert_string
+
+
+def __bulk_insert_values__(connection, list_of_ids):
+    """
+    Loads the IDs into a #bulkIDS temp table on the connection with a parameterized
+    executemany and returns the statement that copies them into #listofIDS.  Unlike
+    __insert_values__ the returned SQL is the same size regardless of the number of
+    IDs, so the query must be executed on the same connection.
+    """
+    cursor = connection.cursor()
+    cursor.execute(
+        "IF OBJECT_ID('tempdb..#bulkIDS') IS NOT NULL DROP TABLE #bulkIDS;\n"
+        "CREATE TABLE #bulkIDS(id NVARCHAR(50));"
+    )
+    if len(list_of_ids) > 0:
+        cursor.fast_executemany = True
+        cursor.executemany(
+            "INSERT #bulkIDS (id) VALUES (?)", [(i,) for i in list_of_ids]
+        )
+    cursor.close()
+    return "INSERT #listofIDS (id) SELECT DISTINCT id FROM #bulkIDS;\n"
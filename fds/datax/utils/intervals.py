@@ -0,0 +1,205 @@
+import numpy as np
+import pandas as pd
+
+# interval encoded universes store membership as [start_date, end_date) per row
+INTERVAL_COLUMNS = ["start_date", "end_date"]
+
+_DAY = np.timedelta64(1, "D")
+
+# trading day prices hold until the day before fill_end_date, see expand_trading_days
+FILL_END = "fill_end_date"
+
+# price columns the 7-day calendar price queries return as 0 on non-trading days
+FILL_ZERO_COLUMNS = [
+    "unadj_volume",
+    "split_adj_volume",
+    "unadj_price_high",
+    "unadj_price_low",
+    "unadj_price_open",
+    "split_adj_price_high",
+    "split_adj_price_low",
+    "split_adj_price_open",
+    "split_spin_adj_price_high",
+    "split_spin_adj_price_low",
+    "split_spin_adj_price_open",
+    "adj_factor_flag",
+]
+
+# the query returns every day with a non-zero total return, see expand_trading_days
+FILL_RETURN = "one_day_total_return"
+
+
+def is_interval_frame(df):
+    """
+    True when a universe frame is interval encoded rather than one row per day.
+    """
+    return all(col in df.columns for col in INTERVAL_COLUMNS)
+
+
+def expand_intervals(
+    df, start="start_date", end="end_date", date="date", min_date=None, max_date=None
+):
+    """
+    Expands [start, end) intervals into one row per calendar day, vectorized in NumPy.
+
+    The date column replaces the interval columns at the position of start, so an
+    expanded interval universe has the same columns as a daily universe.  min_date and
+    max_date clip the expansion to an inclusive date range.
+    """
+    starts = pd.to_datetime(df[start]).values.astype("datetime64[D]")
+    ends = pd.to_datetime(df[end]).values.astype("datetime64[D]")
+    if min_date is not None:
+        starts = np.maximum(starts, np.datetime64(pd.Timestamp(min_date), "D"))
+    if max_date is not None:
+        ends = np.minimum(ends, np.datetime64(pd.Timestamp(max_date), "D") + _DAY)
+    lengths = np.maximum((ends - starts) // _DAY, 0)
+    lengths[np.isnat(starts) | np.isnat(ends)] = 0
+
+    rows = np.repeat(np.arange(len(df)), lengths)
+    # day offset of every output row within its interval
+    offsets = np.arange(len(rows)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    dates = starts[rows] + offsets * _DAY
+
+    position = df.columns.get_loc(start)
+    out = df.drop(columns=[start, end]).iloc[rows].reset_index(drop=True)
+    out.insert(position, date, dates.astype("datetime64[ns]"))
+    return out
+
+
+def expand_trading_days(prices, date="price_date", end=FILL_END):
+    """
+    Expands the rows of a trading days price query, see GetSDFData.fds_prices, to the
+    7-day calendar the other price queries return.
+
+    Every row holds from its date until the day before its end.  The days in between
+    repeat it with the columns of FILL_ZERO_COLUMNS set to 0, as the calendar queries
+    return them on non-trading days.  The query returns every day whose total return
+    is not 0, so the total return of the days in between is 0.  It also returns the
+    days with a split, spin-off or change of shares outstanding, and ends a row before
+    the days missing from fp_total_returns_daily, which the calendar queries drop.
+    """
+    trade_date = "__trade_date__"
+    dtype = prices[date].dtype
+    out = expand_intervals(
+        prices.assign(**{trade_date: prices[date]}), start=date, end=end, date=date
+    )
+    out[date] = out[date].astype(dtype)
+    filled = (out[date] != out[trade_date]).values
+    for col in FILL_ZERO_COLUMNS + [FILL_RETURN]:
+        if col in out.columns:
+            out[col] = out[col].where(~filled, 0)
+    return out.drop(columns=trade_date)
+
+
+def intersect_intervals(
+    df, start, end, other_start, other_end, out_start="start_date", out_end="end_date"
+):
+    """
+    Intersects two [start, end) intervals held on the same rows, e.g. after a merge,
+    and keeps the rows where they overlap.  A missing other_end is open ended.  The
+    intersection is written to out_start/out_end and the other interval columns are
+    dropped.
+    """
+    new_start = np.maximum(df[start].values, df[other_start].values)
+    bound = df[other_end].values
+    new_end = np.where(
+        pd.isnull(bound), df[end].values, np.minimum(df[end].values, bound)
+    )
+    df = df.drop(columns=[c for c in (other_start, other_end) if c in df.columns])
+    df = df.assign(**{out_start: new_start, out_end: new_end})
+    return df.loc[df[out_start] < df[out_end]].reset_index(drop=True)
+
+
+def asof_join(left, right, by, left_on, right_on, direction="backward", how="inner"):
+    """
+    Point in time join: attaches to every left row the last right row with the same
+    by key and right_on <= left_on, e.g. the adjustment factor or shares outstanding
+    in effect on a date.  direction="forward" takes the first right row with
+    right_on >= left_on instead.
+
+    Built on pd.merge_asof, so each left row matches at most one right row and the
+    cross product of the two frames is never materialized.  Left rows with no match
+    or a missing left_on are dropped, or kept with missing right values when how is
+    "left".  The left row order is kept.
+    """
+    position = "__left_position__"
+    left = left.assign(**{position: np.arange(len(left))})
+    valid = left[left_on].notnull() & left[by].notnull()
+    # categorical keys only match within the categories of the left frame
+    right = right.astype({by: left[by].dtype})
+    # datetime keys must share a resolution, cached frames are read back as ns
+    left_type, right_type = left[left_on].dtype, right[right_on].dtype
+    if left_type != right_type and all(
+        pd.api.types.is_datetime64_dtype(t) for t in (left_type, right_type)
+    ):
+        right = right.astype({right_on: left_type})
+    right = right.loc[right[right_on].notnull() & right[by].notnull()]
+    joined = pd.merge_asof(
+        left.loc[valid].sort_values(left_on, kind="stable"),
+        right.sort_values(right_on, kind="stable"),
+        left_on=left_on,
+        right_on=right_on,
+        by=by,
+        direction=direction,
+    )
+    if how == "left":
+        joined = pd.concat([joined, left.loc[~valid]])
+    else:
+        joined = joined.loc[joined[right_on].notnull()]
+    joined = joined.sort_values(position, kind="stable")
+    return joined.drop(columns=position).reset_index(drop=True)
+
+
+def overlapping_keys(df, by, start, end):
+    """
+    Returns the by keys of df with [start, end) intervals that overlap, including
+    duplicated rows.  A missing end is open ended, rows with a missing start never
+    match a date and are ignored.
+    """
+    df = df.loc[df[start].notnull()].sort_values([by, start], kind="stable")
+    keys = df[by]
+    ends = df[end].fillna(pd.Timestamp.max)
+    # the latest end of the intervals before each row of its key
+    previous = ends.groupby(keys, sort=False).cummax().groupby(keys, sort=False).shift()
+    return df.loc[(df[start] < previous).values, by].unique()
+
+
+def __asof_interval_join__(left, right, by, date, start, end):
+    joined = asof_join(left, right, by, date, start)
+    inside = joined[end].isnull() | (joined[date] < joined[end])
+    return joined.loc[inside].reset_index(drop=True)
+
+
+def interval_join(left, right, by, date, start, end):
+    """
+    Attaches to every left row the right rows with the same by key whose [start, end)
+    interval contains the left date, a missing end being open ended.
+
+    Equivalent to merging on by and filtering start <= date < end.  Keys whose right
+    intervals do not overlap, as in most entity histories, run as a sorted as-of join
+    so memory stays proportional to the left frame.  The rows of keys with
+    overlapping intervals, e.g. a reused CUSIP held by two securities at once, can
+    match several right rows and are merged and filtered.  The left row order is
+    kept, matches of a left row following the right row order.
+    """
+    overlaps = overlapping_keys(right, by, start, end)
+    if not len(overlaps):
+        return __asof_interval_join__(left, right, by, date, start, end)
+
+    position = "__interval_position__"
+    left = left.assign(**{position: np.arange(len(left))})
+    in_left = left[by].isin(overlaps).values
+    in_right = right[by].isin(overlaps).values
+    # both joins keep the left columns followed by the right ones
+    fast = __asof_interval_join__(
+        left.loc[~in_left], right.loc[~in_right], by, date, start, end
+    )
+    merged = left.loc[in_left].merge(
+        right.loc[in_right].astype({by: left[by].dtype}), how="inner", on=by
+    )
+    inside = (merged[date] >= merged[start]) & (
+        merged[end].isnull() | (merged[date] < merged[end])
+    )
+    joined = pd.concat([fast, merged.loc[inside]], ignore_index=True)
+    joined = joined.sort_values(position, kind="stable")
+    return joined.drop(columns=position).reset_index(drop=True)
@@ -0,0 +1,261 @@
+import csv
+import os
+import sqlite3
+from contextlib import contextmanager
+
+LEDGER_DB = "fds_cache_ledger.sqlite"
+LEDGER_FILE = "fds_cache_details.txt"
+
+# ledger columns, as named in fds_cache_details.txt, and their database columns
+FIELDS = [
+    ("Cache Name", "cache_name"),
+    ("Source", "source"),
+    ("Cache Location", "location"),
+    ("MSSQL DSN", "mssql_dsn"),
+    ("ETF Ticker", "etf_ticker"),
+    ("Currency", "currency"),
+    ("Start Date", "start_date"),
+    ("End Date", "end_date"),
+    ("Last Update Date", "last_update"),
+    ("High Water Date", "high_water_date"),
+]
+
+FILE_FIELDS = [
+    "component",
+    "layout",
+    "path",
+    "rows",
+    "bytes",
+    "checksum",
+    "schema_version",
+    "high_water_date",
+    "updated",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS caches (
+    cache_name TEXT PRIMARY KEY,
+    source TEXT,
+    location TEXT,
+    mssql_dsn TEXT,
+    etf_ticker TEXT,
+    currency TEXT,
+    start_date TEXT,
+    end_date TEXT,
+    last_update TEXT,
+    high_water_date TEXT
+);
+CREATE TABLE IF NOT EXISTS files (
+    cache_name TEXT NOT NULL,
+    component TEXT NOT NULL,
+    layout TEXT,
+    path TEXT,
+    rows INTEGER,
+    bytes INTEGER,
+    checksum TEXT,
+    schema_version INTEGER,
+    high_water_date TEXT,
+    updated TEXT,
+    PRIMARY KEY (cache_name, component)
+);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+
+def __text__(value):
+    """
+    Ledger values are stored as text, missing values as NULL.
+    """
+    if value is None or value != value or value == "":
+        return None
+    return str(value)
+
+
+class FdsLedgerDB:
+    """
+    The cache ledger of a data store, an SQLite database in its fdsDataStore
+    directory.
+
+    Every change is a single transaction started with BEGIN IMMEDIATE, so builds
+    sharing a store take turns updating it rather than overwriting each other's
+    entries, and lookups by cache name are primary key reads that need no pandas.
+    The default rollback journal is used rather than WAL, which does not work on
+    network file systems.
+
+    fds_cache_details.txt is kept as a read only copy for older versions of the
+    package, rewritten and renamed into place within every change.  A data store that
+    only has the text file is imported on first use.
+    """
+
+    def __init__(self, store_dir, timeout=60):
+        self.store_dir = store_dir
+        self.path = os.path.join(store_dir, LEDGER_DB)
+        self.text_path = os.path.join(store_dir, LEDGER_FILE)
+        self.timeout = timeout
+
+    def __connect__(self, create=False):
+        connection = sqlite3.connect(
+            self.path, timeout=self.timeout, isolation_level=None
+        )
+        connection.row_factory = sqlite3.Row
+        if create:
+            connection.executescript(SCHEMA)
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        """
+        Yields a connection holding the database write lock, committing on exit.
+        """
+        os.makedirs(self.store_dir, exist_ok=True)
+        connection = self.__connect__(create=True)
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                self.__import_text__(connection)
+                yield connection
+                connection.execute("COMMIT")
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+        finally:
+            connection.close()
+
+    @contextmanager
+    def __reader__(self):
+        """
+        Yields a connection for lookups, None when the store has no ledger.  A text
+        only ledger is imported first.  The tables exist once the database does, they
+        are created by the transaction that creates it.
+        """
+        if not os.path.exists(self.path):
+            if not os.path.exists(self.text_path):
+                yield None
+                return
+            with self.transaction():
+                pass
+        connection = self.__connect__()
+        try:
+            yield connection
+        finally:
+            connection.close()
+
+    def __import_text__(self, connection):
+        imported = connection.execute(
+            "SELECT value FROM meta WHERE key = 'imported'"
+        ).fetchone()
+        if imported is not None:
+            return
+        if os.path.exists(self.text_path):
+            with open(self.text_path, newline="") as fd:
+                for row in csv.DictReader(fd, delimiter="|"):
+                    values = [__text__(row.get(column)) for column, _ in FIELDS]
+                    connection.execute(
+                        "INSERT OR IGNORE INTO caches VALUES ({})".format(
+                            ",".join("?" * len(FIELDS))
+                        ),
+                        values,
+                    )
+        connection.execute("INSERT INTO meta VALUES ('imported', '1')")
+
+    def __export_text__(self, connection):
+        """
+        Rewrites fds_cache_details.txt from the database, or removes it when the ledger
+        is empty.
+        """
+        rows = connection.execute("SELECT * FROM caches ORDER BY rowid").fetchall()
+        if not rows:
+            if os.path.exists(self.text_path):
+                os.remove(self.text_path)
+            return
+        tmp = "{}.{}.tmp".format(self.text_path, os.getpid())
+        with open(tmp, "w", newline="") as fd:
+            writer = csv.writer(fd, delimiter="|", lineterminator="\n")
+            writer.writerow([column for column, _ in FIELDS])
+            for row in rows:
+                writer.writerow(["" if v is None else v for v in row])
+        os.replace(tmp, self.text_path)
+
+    @staticmethod
+    def __entry__(row):
+        return {column: row[field] for column, field in FIELDS}
+
+    def exists(self, cache_name):
+        return self.get(cache_name) is not None
+
+    def get(self, cache_name):
+        """
+        Returns the ledger entry of a cache as a dict keyed by the ledger column names,
+        None when there is none.
+        """
+        with self.__reader__() as connection:
+            if connection is None:
+                return None
+            row = connection.execute(
+                "SELECT * FROM caches WHERE cache_name = ?", (cache_name,)
+            ).fetchone()
+        return None if row is None else self.__entry__(row)
+
+    def entries(self):
+        """
+        Returns every ledger entry, in the order the caches were first recorded.
+        """
+        with self.__reader__() as connection:
+            if connection is None:
+                return []
+            rows = connection.execute("SELECT * FROM caches ORDER BY rowid").fetchall()
+        return [self.__entry__(row) for row in rows]
+
+    def files(self, cache_name):
+        """
+        Returns the recorded metadata of every component of a cache.
+        """
+        with self.__reader__() as connection:
+            if connection is None:
+                return []
+            rows = connection.execute(
+                "SELECT * FROM files WHERE cache_name = ? ORDER BY rowid", (cache_name,)
+            ).fetchall()
+        return [{field: row[field] for field in FILE_FIELDS} for row in rows]
+
+    def put(self, entry, files=None):
+        """
+        Records a cache entry, a dict keyed by the ledger column names, and, when given,
+        replaces the metadata of its files, in one transaction.
+        """
+        values = [__text__(entry.get(column)) for column, _ in FIELDS]
+        fields = [field for _, field in FIELDS]
+        with self.transaction() as connection:
+            connection.execute(
+                "INSERT INTO caches ({}) VALUES ({}) "
+                "ON CONFLICT (cache_name) DO UPDATE SET {}".format(
+                    ",".join(fields),
+                    ",".join("?" * len(fields)),
+                    ",".join("{0} = excluded.{0}".format(f) for f in fields[1:]),
+                ),
+                values,
+            )
+            if files is not None:
+                connection.execute(
+                    "DELETE FROM files WHERE cache_name = ?", (values[0],)
+                )
+                for meta in files:
+                    connection.execute(
+                        "INSERT INTO files (cache_name, {}) VALUES (?, {})".format(
+                            ",".join(FILE_FIELDS), ",".join("?" * len(FILE_FIELDS))
+                        ),
+                        [values[0]] + [meta.get(field) for field in FILE_FIELDS],
+                    )
+            self.__export_text__(connection)
+
+    def delete(self, cache_name):
+        """
+        Removes a cache from the ledger.  Returns False when it was not recorded.
+        """
+        with self.transaction() as connection:
+            deleted = connection.execute(
+                "DELETE FROM caches WHERE cache_name = ?", (cache_name,)
+            ).rowcount
+            connection.execute("DELETE FROM files WHERE cache_name = ?", (cache_name,))
+            self.__export_text__(connection)
+        return deleted > 0
@@ -1,10 +1,12 @@
 import os
 import pandas as pd
-import pyodbc
 import re
 import sys
+import time
 from io import StringIO
 
+from fds.datax.utils.connection import checkout
+
 cwd = os.getcwd()
 
 
@@ -57,20 +59,96 @@ def parse_tables_from_query(query_text):
     return sql_tables
 
 
-def get_sql_q(filename, show=1, connection="SDF"):
+ENTITLEMENT_TTL = 24 * 60 * 60
+
+_entitlement_store = None
+_entitlement_cache = {}
+_template_cache = {}
+
+SCHEMA_QUERY = """
+           SELECT CONCAT(ds.schema_name,'.',ds.table_name) AS 'table_access',
+                  CONCAT(mp.feed_schema,'.',mp.table_name) AS 'table_ref',
+                  package_name
+             FROM ref_v2.ref_metadata_packages AS mp
+        LEFT JOIN fds.fds_data_sequences AS ds
+               ON ds.schema_name = mp.feed_schema
+              AND ds.table_name = mp.table_name
+        """
+
+
+def set_entitlement_store(store_dir=None, ttl=None):
     """
-    Notice: Default behavior references DSN named SDF. If DSN name not SDF, set connection
-    argument.
+    Configures the entitlement cache used by get_sql_q.
 
-    Parameters
-    -----------
-    filename: sql script to load
-    show: output query text, default show=1
-    connection: set to pyodbc connection, default connection='SDF'
+    store_dir: directory used to persist entitlements between sessions, typically the
+               fdsDataStore directory.  None keeps the cache in process only.
+    ttl: number of seconds before a cached entitlement check is re-run against the DSN.
+    """
+    global _entitlement_store, ENTITLEMENT_TTL
+    _entitlement_store = store_dir
+    if ttl is not None:
+        ENTITLEMENT_TTL = ttl
+
+
+def clear_entitlement_cache(connection=None):
     """
+    Drops cached entitlements for a DSN, or for every DSN when connection is None.
+    """
+    dsns = list(_entitlement_cache) if connection is None else [connection]
+    for dsn in dsns:
+        _entitlement_cache.pop(dsn, None)
+        fname = __entitlement_file__(dsn)
+        if fname is not None and os.path.exists(fname):
+            os.remove(fname)
+
+
+def __entitlement_file__(connection):
+    if _entitlement_store is None:
+        return None
+    return os.path.join(
+        _entitlement_store,
+        "fds_entitlements_{}.snappy".format(re.sub(r"[^a-zA-Z0-9_-]", "_", connection)),
+    )
+
+
+def __load_template__(filename):
+    """
+    Reads a SQL file and parses the tables it references.  Results are memoized per
+    file and refreshed when the file changes on disk.
+    """
+    path = os.path.join(cwd, filename)
+    mtime = os.path.getmtime(path)
+    cached = _template_cache.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path, "r", encoding="utf-8-sig") as fd:
+            sqlFile = fd.read()
+        cached = (mtime, sqlFile, parse_tables_from_query(sqlFile))
+        _template_cache[path] = cached
+    return cached[1], cached[2]
+
+
+def __load_entitlements__(connection, refresh=False):
+    """
+    Returns the table entitlements for a DSN from the in process cache, the on disk
+    cache, or the database, in that order, along with a flag that is True when the
+    entitlements were fetched from the database.  refresh skips both caches.
+    """
+    now = time.time()
+    cached = _entitlement_cache.get(connection)
+    if not refresh and cached is not None and now - cached[0] < ENTITLEMENT_TTL:
+        return cached[1], False
+
+    fname = __entitlement_file__(connection)
+    if not refresh and fname is not None and os.path.exists(fname):
+        fetched = os.path.getmtime(fname)
+        if now - fetched < ENTITLEMENT_TTL:
+            tables = pd.read_parquet(fname)
+            _entitlement_cache[connection] = (fetched, tables)
+            return tables, False
 
     try:
-        default_cxn = pyodbc.connect("DSN={d}".format(d=connection))
+        with checkout(connection) as default_cxn:
+            tables = pd.read_sql(SCHEMA_QUERY, default_cxn)
 
     except:
         print(
@@ -81,30 +159,46 @@ calls with your ODBC name,\nsee docstring for example."""
 
         ipy_exit()
 
-        # create dataframe containing tables used within SQL query
-    with open(os.path.join(cwd, filename), "r", encoding="utf-8-sig") as fd:
-        sqlFile = fd.read()
-        of_results = parse_tables_from_query(sqlFile)
+    _entitlement_cache[connection] = (now, tables)
+    if fname is not None and os.path.isdir(_entitlement_store):
+        tables.to_parquet(fname)
+    return tables, True
 
-        # check client's access to tables
-        schema_query = """
-           SELECT CONCAT(ds.schema_name,'.',ds.table_name) AS 'table_access',
-                  CONCAT(mp.feed_schema,'.',mp.table_name) AS 'table_ref',
-                  package_name
-             FROM ref_v2.ref_metadata_packages AS mp
-        LEFT JOIN fds.fds_data_sequences AS ds
-               ON ds.schema_name = mp.feed_schema
-              AND ds.table_name = mp.table_name
-        """
-        default_cxn = pyodbc.connect("DSN={d}".format(d=connection))
-        tables = pd.read_sql(schema_query, default_cxn)
-        default_cxn.close()
 
-        # compare client's access to query tables by merging two togethor
-        df = of_results.merge(tables, how="left", left_on="table", right_on="table_ref")
+def __missing_tables__(of_results, tables):
+    # compare client's access to query tables by merging two togethor
+    df = of_results.merge(tables, how="left", left_on="table", right_on="table_ref")
+
+    # check for which tables did not map and store in new list
+    return df[df["table_access"] == "."]
+
+
+def get_sql_q(filename, show=1, connection="SDF"):
+    """
+    Notice: Default behavior references DSN named SDF. If DSN name not SDF, set connection
+    argument.
+
+    Table entitlements are cached per DSN for ENTITLEMENT_TTL seconds, see
+    set_entitlement_store to persist them on disk.
+
+    Parameters
+    -----------
+    filename: sql script to load
+    show: output query text, default show=1
+    connection: DSN name, connections are checked out from the shared pool, default connection='SDF'
+    """
+
+    # create dataframe containing tables used within SQL query
+    sqlFile, of_results = __load_template__(filename)
+
+    # check client's access to tables
+    tables, fresh = __load_entitlements__(connection)
+    nulls = __missing_tables__(of_results, tables)
 
-        # check for which tables did not map and store in new list
-        nulls = df[df["table_access"] == "."]
+    if not nulls.empty and not fresh:
+        # a cached check may predate a newly granted package, re-check once
+        tables, fresh = __load_entitlements__(connection, refresh=True)
+        nulls = __missing_tables__(of_results, tables)
 
     if nulls.empty:
         if show == 1:
@@ -0,0 +1,357 @@
+import contextvars
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_FILE = "fds_build_metrics.jsonl"
+
+# the FdsMetrics collecting for the running build, copied into its worker threads
+_active = contextvars.ContextVar("fds_datax_metrics", default=None)
+_default_sinks = []
+_file_lock = threading.Lock()
+
+# summed by FdsMetrics.summary
+SUMMED_FIELDS = [
+    "wall_seconds",
+    "server_seconds",
+    "fetch_seconds",
+    "process_seconds",
+    "rows",
+    "bytes",
+]
+
+
+def peak_rss():
+    """
+    Peak resident set size of the process in bytes, None where it is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class FdsMetrics:
+    """
+    Collects the timing records of a cache build and hands each one to its sinks.
+
+    A record is a dict holding kind, one of "query", "process", "stage", "write" or
+    "build", name, status, wall_seconds, max_rss_bytes, the thread and time it was
+    recorded at and the context of the build, e.g. cache_name and dir_path.  Query
+    records also hold:
+
+        server_seconds: time spent in execute, executemany and nextset, up to the
+                        first result set.
+        fetch_seconds: time spent in the cursor fetch calls.
+        process_seconds: the remainder, waiting for a pooled connection and building
+                         and post-processing the DataFrame.
+        rows: rows fetched.
+        bytes: in memory size of the resulting DataFrames.
+
+    A sink is any callable taking a record, e.g. a LoggingSink or a plain callback.
+    Sinks with a close method, such as JsonFileSink, are also called with the
+    FdsMetrics once the build is over.
+    """
+
+    def __init__(self, sinks=(), **context):
+        self.sinks = list(sinks)
+        self.context = context
+        self.records = []
+        self._lock = threading.Lock()
+
+    def record(self, kind, name, **fields):
+        record = dict(self.context)
+        record.update(kind=kind, name=name, **fields)
+        record.update(
+            max_rss_bytes=peak_rss(),
+            thread=threading.current_thread().name,
+            time=time.time(),
+        )
+        with self._lock:
+            self.records.append(record)
+        for sink in self.sinks:
+            sink(record)
+        return record
+
+    def summary(self):
+        """
+        Totals per kind and name, in the order they were first recorded.
+        """
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            key = (record["kind"], record["name"])
+            total = totals.setdefault(key, {"kind": key[0], "name": key[1], "count": 0})
+            total["count"] += 1
+            for field in SUMMED_FIELDS:
+                if record.get(field) is not None:
+                    total[field] = total.get(field, 0) + record[field]
+        return list(totals.values())
+
+    def close(self):
+        for sink in self.sinks:
+            close = getattr(sink, "close", None)
+            if close is not None:
+                close(self)
+
+
+class LoggingSink:
+    """
+    Logs every record as a line of JSON, to the fds.datax.metrics logger by default.
+    """
+
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger("fds.datax.metrics")
+        self.level = level
+
+    def __call__(self, record):
+        self.logger.log(self.level, json.dumps(record, default=str))
+
+
+class JsonFileSink:
+    """
+    Appends one line of JSON per build to a file: the build context, wall time and
+    peak RSS, the summary and every record.  path defaults to fds_build_metrics.jsonl
+    next to the cache ledger in the fdsDataStore directory of the build, so nightly
+    builds accumulate a history that can be loaded with pd.read_json(path, lines=True).
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+
+    def __call__(self, record):
+        pass
+
+    def close(self, metrics):
+        path = self.path
+        if path is None:
+            dir_path = metrics.context.get("dir_path")
+            if dir_path is None:
+                return
+            path = os.path.join(dir_path, "fdsDataStore", METRICS_FILE)
+        build = [r for r in metrics.records if r["kind"] == "build"]
+        document = dict(metrics.context)
+        document.update(
+            time=time.time(),
+            wall_seconds=build[-1]["wall_seconds"] if build else None,
+            status=build[-1]["status"] if build else None,
+            max_rss_bytes=peak_rss(),
+            summary=metrics.summary(),
+            records=metrics.records,
+        )
+        line = json.dumps(document, default=str) + "\n"
+        with _file_lock, open(path, "a") as fd:
+            fd.write(line)
+
+
+def set_metrics_sinks(*sinks):
+    """
+    Sinks used by builds that are not given any, and receiving the records of
+    GetSDFData calls made outside a build.  No arguments turns them off.
+    """
+    _default_sinks[:] = sinks
+
+
+def current():
+    """
+    The FdsMetrics collecting in the calling context, None when metrics are off.
+    """
+    metrics = _active.get()
+    if metrics is None and _default_sinks:
+        return FdsMetrics(_default_sinks)
+    return metrics
+
+
+@contextmanager
+def collecting(sinks=None, **context):
+    """
+    Collects the records of the block into a new FdsMetrics with the given sinks, or
+    the default sinks, recording the block itself as a "build" record and closing the
+    sinks at the end.  Nested blocks add to the collector already running.  Yields
+    the FdsMetrics, None when there are no sinks.
+    """
+    active = _active.get()
+    if active is not None:
+        yield active
+        return
+    if callable(sinks):
+        sinks = [sinks]
+    sinks = list(sinks or _default_sinks)
+    if not sinks:
+        yield None
+        return
+    metrics = FdsMetrics(sinks, **context)
+    token = _active.set(metrics)
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        yield metrics
+        status = "finished"
+    finally:
+        _active.reset(token)
+        metrics.record(
+            "build",
+            context.get("cache_name", ""),
+            status=status,
+            wall_seconds=time.perf_counter() - start,
+        )
+        metrics.close()
+
+
+@contextmanager
+def timed(kind, name, **fields):
+    """
+    Records the wall time of the block.  Yields the dict of extra fields of the
+    record, which the block may add to, e.g. rows.
+    """
+    metrics = current()
+    if metrics is None:
+        yield fields
+        return
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        yield fields
+        status = "finished"
+    finally:
+        fields.update(status=status, wall_seconds=time.perf_counter() - start)
+        metrics.record(kind, name, **fields)
+
+
+def run_in_context(executor, func, *args):
+    """
+    Submits func(*args) to an executor in a copy of the calling context, so work on
+    pool threads is recorded by the running build.
+    """
+    return executor.submit(contextvars.copy_context().run, func, *args)
+
+
+class FdsQueryTimer:
+    """
+    Splits the time of a query into server, fetch and processing time.  wrap returns
+    the connection to run the query on, timed through a cursor proxy while metrics
+    are on and unchanged otherwise.
+    """
+
+    def __init__(self, enabled):
+        self.enabled = enabled
+        self.server_seconds = 0.0
+        self.fetch_seconds = 0.0
+        self.idle_seconds = 0.0
+        self.rows = 0
+        self.bytes = 0
+
+    def wrap(self, connection):
+        return _TimedConnection(connection, self) if self.enabled else connection
+
+    def result(self, df):
+        """
+        Adds the in memory size of a DataFrame produced by the query.
+        """
+        if self.enabled:
+            self.bytes += int(df.memory_usage(index=False, deep=True).sum())
+
+    def idle(self, seconds):
+        """
+        Excludes time spent outside the query, e.g. in the consumer of a generator.
+        """
+        self.idle_seconds += seconds
+
+
+@contextmanager
+def timed_query(name):
+    """
+    Records a "query" record for the block, see FdsQueryTimer.  Yields the timer.
+    """
+    metrics = current()
+    timer = FdsQueryTimer(metrics is not None)
+    if metrics is None:
+        yield timer
+        return
+    start = time.perf_counter()
+    status = "failed"
+    try:
+        yield timer
+        status = "finished"
+    finally:
+        wall = time.perf_counter() - start - timer.idle_seconds
+        metrics.record(
+            "query",
+            name,
+            status=status,
+            wall_seconds=wall,
+            server_seconds=timer.server_seconds,
+            fetch_seconds=timer.fetch_seconds,
+            process_seconds=max(wall - timer.server_seconds - timer.fetch_seconds, 0),
+            rows=timer.rows,
+            bytes=timer.bytes,
+        )
+
+
+class _TimedConnection:
+    def __init__(self, connection, timer):
+        self._connection = connection
+        self._timer = timer
+
+    def cursor(self):
+        return _TimedCursor(self._connection.cursor(), self._timer)
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+
+class _TimedCursor:
+    def __init__(self, cursor, timer):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_timer", timer)
+
+    def __server__(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            self._timer.server_seconds += time.perf_counter() - start
+
+    def __fetch__(self, method, *args):
+        start = time.perf_counter()
+        try:
+            rows = method(*args)
+        finally:
+            self._timer.fetch_seconds += time.perf_counter() - start
+        if rows is not None:
+            self._timer.rows += len(rows) if isinstance(rows, list) else 1
+        return rows
+
+    def execute(self, *args):
+        self.__server__(self._cursor.execute, *args)
+        return self
+
+    def executemany(self, *args):
+        self.__server__(self._cursor.executemany, *args)
+        return self
+
+    def nextset(self):
+        return self.__server__(self._cursor.nextset)
+
+    def fetchone(self):
+        return self.__fetch__(self._cursor.fetchone)
+
+    def fetchmany(self, *args):
+        return self.__fetch__(self._cursor.fetchmany, *args)
+
+    def fetchall(self):
+        return self.__fetch__(self._cursor.fetchall)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._cursor, name, value)
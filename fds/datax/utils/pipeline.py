@@ -0,0 +1,90 @@
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from fds.datax.utils.metrics import run_in_context, timed
+
+
+def print_progress(task, status, elapsed, description=""):
+    """
+    Default progress reporter for FdsBuildPipeline.
+    """
+    if status == "started":
+        print("{}...".format(description or task))
+    elif status == "finished":
+        print("\t{} done in {:.1f}s.".format(description or task, elapsed))
+    else:
+        print("\t{} failed after {:.1f}s.".format(description or task, elapsed))
+
+
+class FdsBuildPipeline:
+    """
+    A small dependency graph executor for cache builds.
+
+    Tasks are added with the names of the tasks they depend on and are started on a
+    thread pool as soon as all of their dependencies have finished.  Each task is
+    called with the results of its dependencies as keyword arguments.  pyodbc
+    releases the GIL while waiting on the server, and each task checks out its own
+    pooled connection, so independent queries run concurrently.
+
+    progress is called as progress(task, status, elapsed, description) with status
+    one of "started", "finished" or "failed".  Tasks run in a copy of the context of
+    run, and each is recorded as a "stage" by the running FdsMetrics, if any.
+    """
+
+    def __init__(self, max_workers=4, progress=print_progress):
+        self.max_workers = max_workers
+        self.progress = progress
+        self.tasks = {}
+
+    def add(self, name, func, deps=(), description=""):
+        """
+        Registers a task.  func is called as func(**{dep: result_of_dep}).
+        """
+        for dep in deps:
+            if dep not in self.tasks:
+                raise ValueError(
+                    "Task {} depends on unknown task {}.".format(name, dep)
+                )
+        self.tasks[name] = (func, tuple(deps), description)
+
+    def __report__(self, name, status, elapsed=0.0):
+        if self.progress is not None:
+            self.progress(name, status, elapsed, self.tasks[name][2])
+
+    def __run_task__(self, name, func, kwargs):
+        self.__report__(name, "started")
+        start = time.monotonic()
+        try:
+            with timed("stage", name):
+                result = func(**kwargs)
+        except BaseException:
+            self.__report__(name, "failed", time.monotonic() - start)
+            raise
+        self.__report__(name, "finished", time.monotonic() - start)
+        return result
+
+    def run(self):
+        """
+        Runs every task and returns a dict of results keyed by task name.  The first
+        task failure cancels the tasks that have not started and is re-raised.
+        """
+        results = {}
+        pending = dict(self.tasks)
+        futures = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        try:
+            while pending or futures:
+                for name, (func, deps, _) in list(pending.items()):
+                    if all(dep in results for dep in deps):
+                        del pending[name]
+                        kwargs = {dep: results[dep] for dep in deps}
+                        future = run_in_context(
+                            executor, self.__run_task__, name, func, kwargs
+                        )
+                        futures[future] = name
+                done, _ = wait(futures, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[futures.pop(future)] = future.result()
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+        return results
@@ -0,0 +1,468 @@
+import base64
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+# The "shared" layout stores the prices and corporate actions of every security once
+# per data store rather than once per cache:
+#
+#   fdsDataStore/fdsSecurities/<xx>/<digest>.arrow   one security's history
+#   <fname>_prices.manifest                          what a cache holds of it
+#
+# Blobs are named by a blake2b digest of their content, so a history written by any
+# number of caches is stored once and a rebuild only writes the securities whose data
+# changed.  They are lz4 compressed Arrow IPC files, which are several times cheaper
+# to open than parquet files when a cache is read from thousands of them.  A manifest lists the securities of a cache, with the ref_id the cache maps
+# each one to, its blob, and the first date of the history the cache holds, which
+# may start after the first date of a blob written by another cache.
+SECURITIES = "fdsSecurities"
+MANIFEST = ".manifest"
+
+# cache components stored in the shared layout, mapped to their date column
+COMPONENTS = {"_prices": "price_date", "_corp_actions": "price_date"}
+
+# blobs no manifest references are removed once they are this old, so blobs written
+# or reused by builds that have not published their manifest yet are kept
+GRACE_SECONDS = 24 * 3600
+
+MANIFEST_SCHEMA = pa.schema(
+    [
+        ("fsym_id", pa.string()),
+        ("ref_id", pa.string()),
+        ("blob", pa.string()),
+        ("start_date", pa.date32()),
+        ("rows", pa.int64()),
+        ("high_water", pa.date32()),
+    ]
+)
+
+
+def manifest_path(fname, name):
+    """
+    Path of the manifest of a cache component in the shared layout, e.g.
+    <cache>_prices.manifest.
+    """
+    return fname + name + MANIFEST
+
+
+def blob_path(root, blob):
+    return os.path.join(root, blob[:2], blob + ".arrow")
+
+
+def __read_blobs__(root, blobs, columns=None):
+    """
+    Reads and concatenates the blobs of a security store, memory mapped.
+    """
+    tables = []
+    for blob in blobs:
+        table = pa.ipc.open_file(pa.memory_map(blob_path(root, blob))).read_all()
+        tables.append(table if columns is None else table.select(columns))
+    return pa.concat_tables(tables, promote_options="permissive")
+
+
+def __plain__(schema):
+    """
+    The schema security blobs are stored with: no ref_id, which belongs to the cache,
+    and dictionary columns decoded, as a dictionary shared with other securities
+    would make identical histories differ.
+    """
+    fields = []
+    for field in schema:
+        if field.name == "ref_id":
+            continue
+        if pa.types.is_dictionary(field.type):
+            field = field.with_type(field.type.value_type)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+def __scalar__(date, column):
+    return pa.scalar(pd.Timestamp(date)).cast(column.type)
+
+
+def __metadata__(path):
+    """
+    Returns the schema of the component a manifest describes, the security store it
+    references and the key it was built with.
+    """
+    metadata = pq.read_schema(path).metadata
+    schema = pa.ipc.read_schema(pa.py_buffer(base64.b64decode(metadata[b"fds.schema"])))
+    root = os.path.normpath(
+        os.path.join(os.path.dirname(path), metadata[b"fds.root"].decode())
+    )
+    return schema, root, json.loads(metadata[b"fds.key"])
+
+
+def __manifest__(path):
+    return pq.read_table(path).to_pandas(date_as_object=False)
+
+
+def exists(fname, name):
+    return name in COMPONENTS and os.path.exists(manifest_path(fname, name))
+
+
+def schema(fname, name):
+    """
+    Returns the pyarrow schema of a shared cache component without reading any data.
+    """
+    return __metadata__(manifest_path(fname, name))[0]
+
+
+def read(fname, name, columns=None, start_date=None, end_date=None, ids=None):
+    """
+    Reads a shared cache component as a pyarrow Table with its stored schema, rows
+    sorted by fsym_id then date.  The manifest selects the blobs of the securities in
+    ids, matched on fsym_id or ref_id, the date range is pushed down to the blob scan
+    and the ref_id of the cache is attached from the manifest.
+    """
+    path = manifest_path(fname, name)
+    stored, root, _ = __metadata__(path)
+    manifest = pq.read_table(path)
+    if ids is not None:
+        ids = pa.array([ids] if isinstance(ids, str) else list(ids), type=pa.string())
+        manifest = manifest.filter(
+            pc.or_(
+                pc.is_in(manifest["fsym_id"], value_set=ids),
+                pc.fill_null(pc.is_in(manifest["ref_id"], value_set=ids), False),
+            )
+        )
+    if columns is None:
+        columns = stored.names
+    target = pa.schema([stored.field(col) for col in columns])
+    if manifest.num_rows == 0:
+        return target.empty_table()
+
+    date_col = COMPONENTS[name]
+    read_columns = ["fsym_id", date_col]
+    read_columns += [c for c in columns if c not in read_columns and c != "ref_id"]
+    table = __read_blobs__(root, manifest["blob"].to_pylist(), read_columns)
+
+    # the part of each blob the cache holds and the requested dates, and its ref_ids
+    dates = table[date_col]
+    index = pc.index_in(table["fsym_id"], value_set=manifest["fsym_id"])
+    starts = manifest["start_date"].take(index).cast(dates.type)
+    keep = pc.or_kleene(pc.is_null(starts), pc.greater_equal(dates, starts))
+    if start_date is not None:
+        keep = pc.and_(keep, pc.greater_equal(dates, __scalar__(start_date, dates)))
+    if end_date is not None:
+        keep = pc.and_(keep, pc.less_equal(dates, __scalar__(end_date, dates)))
+    if not pc.all(keep).as_py():
+        table, index = table.filter(keep), index.filter(keep)
+    table = table.append_column("ref_id", manifest["ref_id"].take(index))
+    return table.select(columns).cast(target)
+
+
+def describe(fname, name):
+    """
+    The ledger metadata of a shared cache component, see store.describe.  bytes
+    counts the manifest and every blob it references, shared or not, and the
+    checksum of the manifest identifies the content, blobs being content addressed.
+    """
+    path = manifest_path(fname, name)
+    _, root, _ = __metadata__(path)
+    manifest = __manifest__(path)
+    size = os.path.getsize(path)
+    for blob in manifest.blob.unique():
+        size += os.path.getsize(blob_path(root, blob))
+    with open(path, "rb") as fd:
+        checksum = hashlib.blake2b(fd.read(), digest_size=16).hexdigest()
+    high_water = manifest.high_water.max() if len(manifest) else None
+    return {
+        "component": name,
+        "layout": "shared",
+        "path": path,
+        "rows": int(manifest.rows.sum()),
+        "bytes": size,
+        "checksum": checksum,
+        "high_water_date": None if pd.isna(high_water) else str(high_water.date()),
+    }
+
+
+def remove(fname, name):
+    if os.path.exists(manifest_path(fname, name)):
+        os.remove(manifest_path(fname, name))
+
+
+class FdsSecurityWriter:
+    """
+    Writes a cache component in the shared layout: the history of every security to
+    its content addressed blob, unless an identical one is stored already, then the
+    manifest of the cache.
+
+    root is the fdsSecurities directory of the data store.  dtypes is an optional
+    FdsDtypePolicy applied before the blobs are written.  key describes the data,
+    e.g. currency and adjustment mode, and is recorded in the manifest so later
+    builds with the same key can reuse the blobs, see reusable.  start_date is the
+    first date of the history the cache holds, None when it holds every row.
+
+    write may be called any number of times, each security appearing in a single
+    call, and close writes the manifest.
+    """
+
+    def __init__(self, fname, name, root, dtypes=None, key=None, start_date=None):
+        self.fname = fname
+        self.name = name
+        self.root = root
+        self.dtypes = dtypes
+        self.key = key
+        self.start_date = None if start_date is None else pd.Timestamp(start_date)
+        self.schema = None
+        self.entries = []
+
+    def write(self, df):
+        """
+        Writes the securities of a DataFrame, or of a pyarrow Table already cast to
+        dtypes.
+        """
+        if isinstance(df, pd.DataFrame):
+            if self.dtypes is None:
+                table = pa.Table.from_pandas(df, preserve_index=False)
+            else:
+                table = self.dtypes.table(df)
+        else:
+            table = df
+        table = table.replace_schema_metadata(None)
+        if self.schema is None:
+            self.schema = table.schema
+        if table.num_rows == 0:
+            return
+        plain = __plain__(table.schema)
+        ref_ids = None
+        if "ref_id" in table.column_names:
+            ref_ids = table["ref_id"]
+            if pa.types.is_dictionary(ref_ids.type):
+                ref_ids = ref_ids.cast(ref_ids.type.value_type)
+        table = table.select(plain.names).cast(plain)
+        date_col = COMPONENTS[self.name]
+        order = pc.sort_indices(
+            table, sort_keys=[("fsym_id", "ascending"), (date_col, "ascending")]
+        )
+        table = table.take(order)
+        fsym = table["fsym_id"].to_numpy(zero_copy_only=False)
+        bounds = np.concatenate(
+            [[0], np.flatnonzero(fsym[1:] != fsym[:-1]) + 1, [len(fsym)]]
+        )
+        if ref_ids is None:
+            ref_ids = [None] * (len(bounds) - 1)
+        else:
+            ref_ids = ref_ids.take(order.take(pa.array(bounds[:-1]))).to_pylist()
+        for start, stop, ref_id in zip(bounds[:-1], bounds[1:], ref_ids):
+            part = table.slice(start, stop - start)
+            self.entries.append(
+                {
+                    "fsym_id": fsym[start],
+                    "ref_id": ref_id,
+                    "blob": self.__put__(part),
+                    "start_date": self.start_date,
+                    "rows": part.num_rows,
+                    "high_water": pc.max(part[date_col]).as_py(),
+                }
+            )
+
+    def write_file(self, path, chunk=500):
+        """
+        Writes the securities of a parquet file, chunk securities at a time so memory
+        stays bounded whatever the order of its rows.
+        """
+        ids = pq.read_table(path, columns=["fsym_id"])["fsym_id"]
+        ids = pc.unique(ids.combine_chunks()).to_pylist()
+        dataset = ds.dataset(path, format="parquet")
+        if not ids:
+            self.write(dataset.to_table())
+        for i in range(0, len(ids), chunk):
+            expr = ds.field("fsym_id").isin(ids[i : i + chunk])
+            self.write(dataset.to_table(filter=expr))
+
+    def __put__(self, table):
+        sink = pa.BufferOutputStream()
+        feather.write_feather(table, sink, compression="lz4")
+        data = sink.getvalue()
+        blob = hashlib.blake2b(data, digest_size=16).hexdigest()
+        path = blob_path(self.root, blob)
+        if os.path.exists(path):
+            # a reused blob is as young as a new one for garbage collection
+            os.utime(path)
+            return blob
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as fd:
+            fd.write(data)
+        os.replace(tmp, path)
+        return blob
+
+    def reuse(self, manifest, id_map=None, schema=None):
+        """
+        Adds the securities of another cache's manifest rows, see reusable, mapping
+        their ref_ids with id_map.  The rows each blob holds from start_date on are
+        counted from its date column.
+        """
+        if self.schema is None:
+            self.schema = schema
+        if len(manifest) == 0:
+            return
+        date_col = COMPONENTS[self.name]
+        counts = None
+        if self.start_date is not None:
+            paths = [blob_path(self.root, blob) for blob in manifest.blob]
+            for path in paths:
+                os.utime(path)
+            dates = __read_blobs__(self.root, manifest.blob, ["fsym_id", date_col])
+            start = __scalar__(self.start_date, dates[date_col])
+            dates = dates.filter(pc.greater_equal(dates[date_col], start))
+            counts = dates.group_by("fsym_id").aggregate(
+                [(date_col, "count"), (date_col, "max")]
+            )
+            counts = counts.to_pandas(date_as_object=False).set_index("fsym_id")
+        for row in manifest.itertuples(index=False):
+            rows, high_water = row.rows, row.high_water
+            if counts is not None:
+                rows = int(counts[date_col + "_count"].get(row.fsym_id, 0))
+                high_water = counts[date_col + "_max"].get(row.fsym_id)
+            self.entries.append(
+                {
+                    "fsym_id": row.fsym_id,
+                    "ref_id": None if id_map is None else id_map.get(row.fsym_id),
+                    "blob": row.blob,
+                    "start_date": self.start_date,
+                    "rows": rows,
+                    "high_water": high_water,
+                }
+            )
+
+    @property
+    def rows(self):
+        return sum(entry["rows"] for entry in self.entries)
+
+    @property
+    def high_water(self):
+        dates = [e["high_water"] for e in self.entries if not pd.isna(e["high_water"])]
+        return pd.Timestamp(max(dates)) if dates else None
+
+    def close(self):
+        """
+        Writes the manifest, renamed into place once complete.
+        """
+        manifest = pd.DataFrame(self.entries, columns=MANIFEST_SCHEMA.names)
+        manifest = manifest.sort_values("fsym_id", kind="stable")
+        for col in ("start_date", "high_water"):
+            manifest[col] = pd.to_datetime(manifest[col])
+        table = pa.Table.from_pandas(
+            manifest, schema=MANIFEST_SCHEMA, preserve_index=False
+        )
+        path = manifest_path(self.fname, self.name)
+        stored = self.schema if self.dtypes is None else self.dtypes.schema(self.schema)
+        table = table.replace_schema_metadata(
+            {
+                "fds.schema": base64.b64encode(stored.serialize().to_pybytes()),
+                "fds.root": os.path.relpath(self.root, os.path.dirname(path)),
+                "fds.key": json.dumps(self.key),
+            }
+        )
+        tmp = path + ".tmp"
+        pq.write_table(table, tmp, compression="snappy")
+        os.replace(tmp, path)
+
+
+def __manifests__(store_dir):
+    """
+    Every manifest in a data store, of published, earlier and staged versions alike.
+    """
+    for root, dirs, files in os.walk(store_dir):
+        if root == store_dir and SECURITIES in dirs:
+            dirs.remove(SECURITIES)
+        for name in files:
+            if name.endswith(MANIFEST):
+                yield os.path.join(root, name)
+
+
+def reusable(store_dir, key, ids, start_date):
+    """
+    Finds the securities in ids that caches of a data store already hold with the
+    same key from start_date or earlier, so a build can reference their blobs rather
+    than download them again.  Returns a dict mapping each shared component to the
+    manifest rows to reuse and, under "schema", the stored schema of each component.
+    The rows of one security all come from the same cache.
+    """
+    found = {name: [] for name in COMPONENTS}
+    schemas = {}
+    wanted = set(ids)
+    start_date = pd.Timestamp(start_date)
+    for path in sorted(__manifests__(store_dir)):
+        if not wanted:
+            break
+        if not path.endswith("_prices" + MANIFEST):
+            continue
+        fname = path[: -len("_prices" + MANIFEST)]
+        if not exists(fname, "_corp_actions"):
+            continue
+        try:
+            prices_schema, root, prices_key = __metadata__(path)
+            if prices_key != key:
+                continue
+            prices = __manifest__(path)
+            corp_actions = __manifest__(manifest_path(fname, "_corp_actions"))
+            ca_schema = schema(fname, "_corp_actions")
+        except (OSError, pa.ArrowException):
+            # removed, e.g. pruned, while it was read
+            continue
+        covered = prices.start_date.isna() | (prices.start_date <= start_date)
+        prices = prices.loc[covered & prices.fsym_id.isin(wanted)]
+        if not all(os.path.exists(blob_path(root, b)) for b in prices.blob):
+            continue
+        corp_actions = corp_actions.loc[corp_actions.fsym_id.isin(prices.fsym_id)]
+        found["_prices"].append(prices)
+        found["_corp_actions"].append(corp_actions)
+        schemas.setdefault("_prices", prices_schema)
+        schemas.setdefault("_corp_actions", ca_schema)
+        wanted -= set(prices.fsym_id)
+    result = {
+        name: pd.concat(frames, ignore_index=True)
+        if frames
+        else pd.DataFrame(columns=MANIFEST_SCHEMA.names)
+        for name, frames in found.items()
+    }
+    result["schema"] = schemas
+    return result
+
+
+def collect_garbage(store_dir, grace=GRACE_SECONDS):
+    """
+    Removes the blobs of a data store no manifest references anymore, e.g. those of
+    pruned versions and deleted caches, once they are more than grace seconds old.
+    Returns the number of blobs removed.
+    """
+    root = os.path.join(store_dir, SECURITIES)
+    if not os.path.isdir(root):
+        return 0
+    referenced = set()
+    for path in __manifests__(store_dir):
+        try:
+            blobs = pq.read_table(path, columns=["blob"])["blob"].to_pylist()
+        except (OSError, pa.ArrowException):
+            continue
+        referenced.update(blobs)
+    removed = 0
+    cutoff = time.time() - grace
+    for prefix in os.listdir(root):
+        directory = os.path.join(root, prefix)
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.split(".")[0] in referenced:
+                continue
+            try:
+                if os.stat(path).st_mtime < cutoff:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                # removed meanwhile, or still mapped by a reader on Windows
+                pass
+    return removed
@@ -0,0 +1,133 @@
+import os
+import shutil
+import uuid
+
+import pandas as pd
+
+from fds.datax.utils import securities, store
+from fds.datax.utils.ledger import FdsLedgerDB
+
+# A cache <fname> is published as versioned snapshots:
+#
+#   <fname>.current                        name of the published version
+#   <fname>.snapshots/<version>/<cache>_*  the files of every kept version
+#   <fname>.snapshots/staging-<id>/        builds in progress
+#
+# Versions are named by the time they were published, so they sort in publish order.
+# Caches without a pointer file were written in place by earlier versions of the
+# package and are read from <fname>_* directly.
+SNAPSHOTS = ".snapshots"
+POINTER = ".current"
+STAGING = "staging-"
+
+
+def snapshot_dir(fname):
+    return fname + SNAPSHOTS
+
+
+def pointer_path(fname):
+    return fname + POINTER
+
+
+def current_version(fname):
+    """
+    Returns the published version of a cache, None when it is stored in place.
+    """
+    try:
+        with open(pointer_path(fname)) as fd:
+            return fd.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def resolve(fname, version=None):
+    """
+    Returns the path prefix of the files of a published version of a cache, the
+    current one by default.  Readers resolve a cache once and read every component
+    from the result, so a build published meanwhile never mixes two versions.
+    """
+    if version is None:
+        version = current_version(fname)
+    if version is None:
+        return fname
+    return os.path.join(snapshot_dir(fname), version, os.path.basename(fname))
+
+
+def versions(fname):
+    """
+    Returns the published versions of a cache still on disk, oldest first.
+    """
+    path = snapshot_dir(fname)
+    if not os.path.isdir(path):
+        return []
+    return sorted(
+        v
+        for v in os.listdir(path)
+        if not v.startswith(STAGING) and os.path.isdir(os.path.join(path, v))
+    )
+
+
+def stage(fname):
+    """
+    Creates an empty staging directory for a build of a cache and returns the path
+    prefix its files are written to.
+    """
+    staging = os.path.join(snapshot_dir(fname), STAGING + uuid.uuid4().hex)
+    os.makedirs(staging)
+    return os.path.join(staging, os.path.basename(fname))
+
+
+def discard(staged):
+    """
+    Removes the staging directory of a failed build.
+    """
+    shutil.rmtree(os.path.dirname(staged), ignore_errors=True)
+
+
+def publish(fname, staged, keep=1):
+    """
+    Publishes a staged build as the current version of a cache.
+
+    The staging directory is renamed to a new version and the pointer file replaced,
+    both atomic, so readers see either the previous version or the new one in full.
+    Publishing holds the write lock of the cache ledger, which serializes concurrent
+    builds across processes.  Files a cache stored in place are removed once it is
+    published, as are all but the keep most recent earlier versions, and then the
+    security blobs no version references anymore, see securities.collect_garbage.
+    Returns the new version.
+    """
+    with FdsLedgerDB(os.path.dirname(fname)).transaction():
+        now = pd.Timestamp.now(tz="UTC")
+        version = "{:%Y%m%dT%H%M%S%f}-{}".format(now, os.getpid())
+        os.rename(os.path.dirname(staged), os.path.join(snapshot_dir(fname), version))
+        tmp = "{}.{}.tmp".format(pointer_path(fname), os.getpid())
+        with open(tmp, "w") as fd:
+            fd.write(version)
+        os.replace(tmp, pointer_path(fname))
+        for name in store.COMPONENTS:
+            store.remove(fname, name)
+        prune(fname, keep)
+        securities.collect_garbage(os.path.dirname(fname))
+    return version
+
+
+def prune(fname, keep):
+    """
+    Removes all but the keep most recent versions of a cache before the current one.
+    Versions that cannot be removed yet, e.g. files still open on Windows, are left
+    for a later build.
+    """
+    current = current_version(fname)
+    earlier = [v for v in versions(fname) if current is not None and v < current]
+    for version in earlier[: max(len(earlier) - keep, 0)]:
+        shutil.rmtree(os.path.join(snapshot_dir(fname), version), ignore_errors=True)
+
+
+def remove(fname):
+    """
+    Deletes every version of a cache, the pointer file first so readers stop finding
+    it before its files go.
+    """
+    if os.path.exists(pointer_path(fname)):
+        os.remove(pointer_path(fname))
+    shutil.rmtree(snapshot_dir(fname), ignore_errors=True)
@@ -0,0 +1,502 @@
+import hashlib
+import os
+import shutil
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from fds.datax.utils import securities, tablecache
+from fds.datax.utils.dtypes import to_pandas
+from fds.datax.utils.intervals import INTERVAL_COLUMNS
+
+# Cache files with a date column, mapped to (date column, sort columns).  In the
+# "dataset" layout these are written as a hive partitioned directory by year/month
+# with rows sorted by ID then date, so readers can prune both columns and partitions.
+PARTITIONED_FILES = {
+    "_univ": ("date", ["ref_id", "date"]),
+    "_prices": ("price_date", ["fsym_id", "price_date"]),
+    "_corp_actions": ("price_date", ["fsym_id", "price_date"]),
+}
+
+# ID columns a read can be filtered on, per cache component
+ID_COLUMNS = {
+    "_univ": ["ref_id", "fsym_primary_listing_id", "fsym_primary_equity_id"],
+    "_ref_data": ["ref_id", "factset_entity_id"],
+    "_prices": ["ref_id", "fsym_id"],
+    "_corp_actions": ["ref_id", "fsym_id"],
+}
+
+# "shared" stores _prices and _corp_actions once per security for the whole data
+# store, see fds.datax.utils.securities, the other components as single files
+LAYOUTS = ("file", "dataset", "shared")
+
+PARTITION_COLUMNS = ["year", "month"]
+
+# every component of a cache, each may have an uncompressed Arrow IPC sidecar
+COMPONENTS = ["_univ", "_ref_data", "_prices", "_corp_actions"]
+
+# version of the stored column types and layouts, recorded per component in the
+# cache ledger.  1: dictionary encoded IDs, date32 dates and optional float32 prices.
+SCHEMA_VERSION = 1
+
+# partition values are zero padded strings so directory order is chronological
+PARTITIONING = ds.partitioning(
+    pa.schema([("year", pa.string()), ("month", pa.string())]), flavor="hive"
+)
+
+
+def file_path(fname, name):
+    """
+    Path of the single snappy parquet file for a cache component, e.g. <cache>_prices.snappy.
+    """
+    return fname + name + ".snappy"
+
+
+def dataset_path(fname, name):
+    """
+    Path of the partitioned dataset directory for a cache component, e.g. <cache>_prices.
+    """
+    return fname + name
+
+
+def sidecar_path(fname, name):
+    """
+    Path of the uncompressed Arrow IPC (Feather v2) sidecar of a cache component,
+    e.g. <cache>_prices.arrow.
+    """
+    return fname + name + ".arrow"
+
+
+def detect_layout(fname, name="_prices"):
+    """
+    Returns the layout a cache component is stored in, or None when it does not exist.
+    """
+    if securities.exists(fname, name):
+        return "shared"
+    if name in PARTITIONED_FILES and os.path.isdir(dataset_path(fname, name)):
+        return "dataset"
+    if os.path.exists(file_path(fname, name)):
+        return "file"
+    return None
+
+
+def exists(fname, name):
+    return detect_layout(fname, name) is not None
+
+
+def remove(fname, name):
+    """
+    Deletes a cache component in whichever layout it is stored.
+    """
+    tablecache.invalidate(fname)
+    if os.path.isdir(dataset_path(fname, name)):
+        shutil.rmtree(dataset_path(fname, name))
+    if os.path.exists(file_path(fname, name)):
+        os.remove(file_path(fname, name))
+    securities.remove(fname, name)
+    remove_sidecar(fname, name)
+
+
+def __partitioned_table__(df, name):
+    date_col, sort_cols = PARTITIONED_FILES[name]
+    df = df.sort_values(sort_cols, kind="stable")
+    dates = pd.to_datetime(df[date_col])
+    df = df.assign(
+        year=dates.dt.year.astype(str).str.zfill(4).values,
+        month=dates.dt.month.astype(str).str.zfill(2).values,
+    )
+    return pa.Table.from_pandas(df, preserve_index=False)
+
+
+def write_dataset_part(df, fname, name, part=0, dtypes=None):
+    """
+    Writes a DataFrame into the partitioned dataset of a cache component.  Each part
+    gets its own file per partition, so streaming writers can append batches.  dtypes
+    is an optional FdsDtypePolicy the columns are cast to.
+    """
+    table = __partitioned_table__(df, name)
+    if dtypes is not None:
+        table = dtypes.cast(table)
+    ds.write_dataset(
+        table,
+        dataset_path(fname, name),
+        format="parquet",
+        partitioning=PARTITIONING,
+        basename_template="part-{}-{{i}}.parquet".format(part),
+        existing_data_behavior="overwrite_or_ignore",
+        file_options=ds.ParquetFileFormat().make_write_options(compression="snappy"),
+    )
+
+
+def write_frame(df, fname, name, layout="file", dtypes=None, root=None):
+    """
+    Writes a cache component, replacing it in any layout.  Components without a
+    date column, including interval encoded universes, are always written as a single
+    file, as are the components the shared layout does not hold.  dtypes is an
+    optional FdsDtypePolicy the columns are cast to.  Shared components are written
+    to the security store root, by default the fdsSecurities directory next to the
+    cache.
+    """
+    if layout == "shared" and name in securities.COMPONENTS:
+        remove(fname, name)
+        if root is None:
+            root = os.path.join(os.path.dirname(fname), securities.SECURITIES)
+        writer = securities.FdsSecurityWriter(fname, name, root, dtypes)
+        writer.write(df)
+        writer.close()
+        return
+    remove(fname, name)
+    if (
+        layout == "dataset"
+        and name in PARTITIONED_FILES
+        and PARTITIONED_FILES[name][0] in df.columns
+    ):
+        os.makedirs(dataset_path(fname, name))
+        write_dataset_part(df, fname, name, dtypes=dtypes)
+    elif dtypes is not None:
+        table = dtypes.table(df.reset_index(drop=True))
+        pq.write_table(table, file_path(fname, name), compression="snappy")
+    else:
+        df.reset_index(drop=True).to_parquet(file_path(fname, name))
+
+
+def __open_dataset__(fname, name):
+    if detect_layout(fname, name) == "dataset":
+        return ds.dataset(
+            dataset_path(fname, name), format="parquet", partitioning=PARTITIONING
+        )
+    return ds.dataset(file_path(fname, name), format="parquet")
+
+
+def __partition_filter__(start_date, end_date):
+    """
+    Year/month partition predicates equivalent to a date range, used to skip whole
+    partition directories.
+    """
+    expr = None
+    year, month = ds.field("year"), ds.field("month")
+    if start_date is not None:
+        y, m = "{:04d}".format(start_date.year), "{:02d}".format(start_date.month)
+        expr = (year > y) | ((year == y) & (month >= m))
+    if end_date is not None:
+        y, m = "{:04d}".format(end_date.year), "{:02d}".format(end_date.month)
+        upper = (year < y) | ((year == y) & (month <= m))
+        expr = upper if expr is None else expr & upper
+    return expr
+
+
+def build_filter(
+    fname, name, start_date=None, end_date=None, ids=None, prune_partitions=True
+):
+    """
+    Builds a pyarrow filter expression for a cache component.
+
+    start_date/end_date bound the date column of dated components, inclusive, or keep
+    the intervals overlapping the range in an interval encoded universe.  ids keeps
+    rows where any of the component's ID columns is in the list.  Returns None
+    when there is nothing to filter.  Parquet row group statistics let the scan skip
+    row groups outside the filter, and in the dataset layout whole partitions are
+    skipped unless prune_partitions is False.
+    """
+    expr = None
+    names = read_schema(fname, name)
+    if all(col in names for col in INTERVAL_COLUMNS) and (
+        start_date is not None or end_date is not None
+    ):
+        # [start_date, end_date) intervals overlapping the inclusive range
+        if start_date is not None:
+            expr = ds.field("end_date") > pd.Timestamp(start_date)
+        if end_date is not None:
+            upper = ds.field("start_date") <= pd.Timestamp(end_date)
+            expr = upper if expr is None else expr & upper
+    elif name in PARTITIONED_FILES and (start_date is not None or end_date is not None):
+        date_col = ds.field(PARTITIONED_FILES[name][0])
+        start_date = None if start_date is None else pd.Timestamp(start_date)
+        end_date = None if end_date is None else pd.Timestamp(end_date)
+        if start_date is not None:
+            expr = date_col >= start_date
+        if end_date is not None:
+            upper = date_col <= end_date
+            expr = upper if expr is None else expr & upper
+        if prune_partitions and detect_layout(fname, name) == "dataset":
+            expr = expr & __partition_filter__(start_date, end_date)
+    if ids is not None:
+        if isinstance(ids, str):
+            ids = [ids]
+        id_expr = None
+        for col in ID_COLUMNS.get(name, []):
+            if col in names:
+                match = ds.field(col).isin(list(ids))
+                id_expr = match if id_expr is None else id_expr | match
+        if id_expr is not None:
+            expr = id_expr if expr is None else expr & id_expr
+    return expr
+
+
+def read_frame(fname, name, columns=None, filter=None):
+    """
+    Reads a cache component from whichever layout it is stored in.  Only the requested
+    columns are decoded, and filter, a pyarrow expression such as the output of
+    build_filter, is pushed down to the parquet scan.  date32 columns are returned as
+    datetime64[ns].
+    """
+    if detect_layout(fname, name) == "shared":
+        table = securities.read(fname, name, columns=columns)
+        if filter is not None:
+            table = ds.dataset(table).to_table(filter=filter)
+        return to_pandas(table)
+    if filter is None and detect_layout(fname, name) == "file":
+        return to_pandas(pq.read_table(file_path(fname, name), columns=columns))
+    dataset = __open_dataset__(fname, name)
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c not in PARTITION_COLUMNS]
+    return to_pandas(dataset.to_table(columns=columns, filter=filter))
+
+
+def __source_path__(fname, name):
+    """
+    The file or directory holding a cache component.  Shared components change with
+    their manifest only, blobs are never rewritten.
+    """
+    layout = detect_layout(fname, name)
+    if layout == "shared":
+        return securities.manifest_path(fname, name)
+    if layout == "dataset":
+        return dataset_path(fname, name)
+    return file_path(fname, name)
+
+
+def write_sidecar(fname, name):
+    """
+    Writes the uncompressed Arrow IPC sidecar of a cache component from its parquet
+    data.  The file is written next to the parquet data and renamed into place, so
+    readers never map a partial file.  Shared components have none, a sidecar would
+    copy the data they share into every cache.
+    """
+    if not exists(fname, name) or detect_layout(fname, name) == "shared":
+        remove_sidecar(fname, name)
+        return
+    dataset = __open_dataset__(fname, name)
+    columns = [c for c in dataset.schema.names if c not in PARTITION_COLUMNS]
+    table = dataset.to_table(columns=columns).combine_chunks()
+    tmp = sidecar_path(fname, name) + ".tmp"
+    feather.write_feather(table, tmp, compression="uncompressed")
+    os.replace(tmp, sidecar_path(fname, name))
+
+
+def remove_sidecar(fname, name):
+    if os.path.exists(sidecar_path(fname, name)):
+        os.remove(sidecar_path(fname, name))
+
+
+def has_sidecar(fname, name):
+    """
+    True when a sidecar exists and is at least as new as the parquet data it was
+    written from.  Stale sidecars, e.g. left behind by a rebuild that did not
+    refresh them, are ignored by readers.
+    """
+    path = sidecar_path(fname, name)
+    if not os.path.exists(path) or not exists(fname, name):
+        return False
+    signature = tablecache.FdsTableCache.signature(__source_path__(fname, name))
+    newest = max((mtime for _, mtime, _ in signature), default=0)
+    return os.stat(path).st_mtime_ns >= newest
+
+
+def read_sidecar(fname, name):
+    """
+    Memory maps the sidecar of a cache component and returns it as a pyarrow Table.
+    The buffers point straight into the mapped file, so no data is copied and every
+    process reading the same cache shares the operating system page cache.
+    """
+    source = pa.memory_map(sidecar_path(fname, name), "r")
+    return pa.ipc.open_file(source).read_all()
+
+
+def __read_table__(
+    fname, name, columns=None, start_date=None, end_date=None, ids=None
+):
+    """
+    Decodes a cache component from disk, pushing the column selection and the filters
+    down to the parquet scan, or to the security blobs of the shared layout.
+    """
+    if detect_layout(fname, name) == "shared":
+        return securities.read(
+            fname, name, columns, start_date=start_date, end_date=end_date, ids=ids
+        )
+    filter = build_filter(
+        fname, name, start_date=start_date, end_date=end_date, ids=ids
+    )
+    dataset = __open_dataset__(fname, name)
+    if columns is None:
+        columns = [c for c in dataset.schema.names if c not in PARTITION_COLUMNS]
+    return dataset.to_table(columns=columns, filter=filter)
+
+
+def __cache_key__(fname, name, columns, start_date, end_date, ids):
+    """
+    The table cache key of a read, the same for reads asking for the same data.
+    """
+    if isinstance(ids, str):
+        ids = [ids]
+    return (
+        fname,
+        name,
+        None if columns is None else tuple(columns),
+        None if start_date is None else pd.Timestamp(start_date),
+        None if end_date is None else pd.Timestamp(end_date),
+        None if ids is None else tuple(sorted(set(ids), key=str)),
+    )
+
+
+def __cached_table__(
+    fname, name, columns=None, start_date=None, end_date=None, ids=None
+):
+    """
+    Returns the decoded Arrow table of a read of a cache component from the table
+    cache, reading it from disk with __read_table__ when it is missing or its files
+    changed.
+    """
+    cache = tablecache.get_table_cache()
+    key = __cache_key__(fname, name, columns, start_date, end_date, ids)
+    signature = cache.signature(__source_path__(fname, name))
+    table = cache.get(key, signature)
+    if table is None:
+        table = __read_table__(fname, name, columns, start_date, end_date, ids)
+        # one contiguous chunk per column, the partitioned and shared layouts would
+        # otherwise leave a chunk per file and make every in memory scan slow
+        table = table.combine_chunks()
+        cache.put(key, signature, table)
+    return table
+
+
+def __to_output__(table, arrow, dtypes=None):
+    if arrow:
+        return table if dtypes is None else dtypes.cast(table)
+    return to_pandas(table, dtypes)
+
+
+def load_frame(
+    fname,
+    name,
+    columns=None,
+    start_date=None,
+    end_date=None,
+    ids=None,
+    arrow=False,
+    dtypes=None,
+):
+    """
+    Reads a cache component for FdsReadCache, as a pandas DataFrame or, with arrow,
+    a pyarrow Table.  dtypes is an optional FdsDtypePolicy applied to the result.
+
+    A fresh Arrow IPC sidecar is memory mapped and filtered in memory.  Otherwise the
+    columns and filters are pushed down to the scan, so only the requested columns
+    of the matching partitions and row groups are decoded.  While the table cache is
+    enabled the result is kept in memory and repeated reads of the same columns and
+    filters skip the decode.
+    """
+    if not has_sidecar(fname, name):
+        if tablecache.get_table_cache().max_bytes <= 0:
+            table = __read_table__(fname, name, columns, start_date, end_date, ids)
+        else:
+            table = __cached_table__(fname, name, columns, start_date, end_date, ids)
+        return __to_output__(table, arrow, dtypes)
+
+    table = read_sidecar(fname, name)
+    filter = build_filter(
+        fname,
+        name,
+        start_date=start_date,
+        end_date=end_date,
+        ids=ids,
+        prune_partitions=False,
+    )
+    if filter is None:
+        if columns is not None:
+            table = table.select(columns)
+        return __to_output__(table, arrow, dtypes)
+    table = ds.dataset(table).to_table(columns=columns, filter=filter)
+    return __to_output__(table, arrow, dtypes)
+
+
+def read_arrow_schema(fname, name):
+    """
+    Returns the pyarrow schema of a cache component without reading any data.
+    """
+    layout = detect_layout(fname, name)
+    if layout == "shared":
+        return securities.schema(fname, name)
+    if layout == "dataset":
+        schema = __open_dataset__(fname, name).schema
+        return pa.schema([f for f in schema if f.name not in PARTITION_COLUMNS])
+    return pq.read_schema(file_path(fname, name))
+
+
+def read_schema(fname, name):
+    """
+    Returns the column names of a cache component without reading any data.
+    """
+    return read_arrow_schema(fname, name).names
+
+
+def __component_files__(fname, name):
+    """
+    The parquet files of a cache component, in a stable order.
+    """
+    if detect_layout(fname, name) == "file":
+        return [file_path(fname, name)]
+    files = []
+    for root, _, names in os.walk(dataset_path(fname, name)):
+        files.extend(os.path.join(root, n) for n in names if n.endswith(".parquet"))
+    return sorted(files)
+
+
+def describe(fname, name):
+    """
+    Returns the ledger metadata of a stored cache component, None when it does not
+    exist: layout, path, rows and bytes, read from the parquet footers and file
+    sizes, a blake2b checksum of the files and, for dated components, the most recent
+    date from the row group statistics.
+    """
+    layout = detect_layout(fname, name)
+    if layout is None:
+        return None
+    if layout == "shared":
+        return dict(securities.describe(fname, name), schema_version=SCHEMA_VERSION)
+    source = __source_path__(fname, name)
+    date_col = PARTITIONED_FILES.get(name, (None,))[0]
+    digest = hashlib.blake2b(digest_size=16)
+    rows, size, high_water = 0, 0, None
+    for path in __component_files__(fname, name):
+        metadata = pq.ParquetFile(path).metadata
+        rows += metadata.num_rows
+        size += os.path.getsize(path)
+        # partition directories are part of the content of a dataset
+        digest.update(os.path.relpath(path, source).encode())
+        with open(path, "rb") as fd:
+            for chunk in iter(lambda: fd.read(1 << 20), b""):
+                digest.update(chunk)
+        names = metadata.schema.names
+        if date_col not in names:
+            continue
+        column = names.index(date_col)
+        for i in range(metadata.num_row_groups):
+            stats = metadata.row_group(i).column(column).statistics
+            if stats is not None and stats.has_min_max:
+                latest = pd.Timestamp(stats.max)
+                if high_water is None or latest > high_water:
+                    high_water = latest
+    return {
+        "component": name,
+        "layout": layout,
+        "path": source,
+        "rows": rows,
+        "bytes": size,
+        "checksum": digest.hexdigest(),
+        "schema_version": SCHEMA_VERSION,
+        "high_water_date": None if high_water is None else str(high_water.date()),
+    }
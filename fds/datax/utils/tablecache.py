@@ -0,0 +1,122 @@
+import os
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+
+class FdsTableCache:
+    """
+    A process wide, memory bounded LRU of decoded Arrow tables.
+
+    Entries are keyed by the path, component, columns and filters of a read, see
+    store.load_frame, and stored with a signature of the files they were read from (path, mtime and size of every file), so a table whose files
+    changed on disk is never returned.  Sizes are accounted with Table.nbytes and the
+    least recently used tables are evicted once max_bytes is exceeded.  A table larger
+    than max_bytes is never kept, and max_bytes=0 disables the cache.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def signature(path):
+        """
+        Returns a tuple identifying the current contents of a file or dataset directory.
+        """
+        if os.path.isdir(path):
+            files = []
+            for root, _, names in os.walk(path):
+                files.extend(os.path.join(root, name) for name in names)
+        else:
+            files = [path]
+        sig = []
+        for f in sorted(files):
+            st = os.stat(f)
+            sig.append((f, st.st_mtime_ns, st.st_size))
+        return tuple(sig)
+
+    def get(self, key, signature):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != signature:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, signature, table):
+        with self._lock:
+            self.__drop__(key)
+            if table.nbytes > self.max_bytes:
+                return
+            self._entries[key] = (signature, table)
+            self.nbytes += table.nbytes
+            self.__evict__()
+
+    def __drop__(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry[1].nbytes
+
+    def __evict__(self):
+        while self.nbytes > self.max_bytes and self._entries:
+            _, (_, table) = self._entries.popitem(last=False)
+            self.nbytes -= table.nbytes
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            self.__evict__()
+
+    def invalidate(self, fname=None):
+        """
+        Drops every table read from a cache, given its path prefix, including its
+        snapshots, or all tables.
+        """
+        # snapshots of a cache are stored under <fname>.snapshots, see snapshots.py
+        snapshots = None if fname is None else fname + ".snapshots" + os.sep
+        with self._lock:
+            for key in list(self._entries):
+                if fname is None or key[0] == fname or key[0].startswith(snapshots):
+                    self.__drop__(key)
+
+    def info(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "nbytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+_cache = FdsTableCache()
+
+
+def get_table_cache():
+    """
+    Returns the process wide table cache used by FdsReadCache.
+    """
+    return _cache
+
+
+def set_table_cache_size(max_bytes):
+    """
+    Sets the memory budget of the table cache in bytes, 0 disables it.
+    """
+    _cache.resize(max_bytes)
+
+
+def invalidate(fname=None):
+    """
+    Shortcut for get_table_cache().invalidate(fname).
+    """
+    _cache.invalidate(fname)
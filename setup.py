@@ -1,6 +1,6 @@
 from setuptools import setup
 
-REQUIRES = ["pandas >= 0.23.4", "pyodbc >= 4.0.23", "pyarrow >= 0.16.0"]
+REQUIRES = ["pandas >= 2.0.0", "pyodbc >= 4.0.23", "pyarrow >= 14.0.0"]
 
 setup(
     name="fds.datax",
@@ -11,6 +11,7 @@ analyzing FactSet’s core & 3rd Party data using a consistent process.""",
     url="",
     author="CTS PPG",
     install_requires=REQUIRES,
+    python_requires=">=3.9",
     packages=["fds.datax"],
     package_data={"fds.datax": ["sql_files/*.sql"]},
     package_dir={"fds": "fds"},
@@ -0,0 +1,863 @@
+"""
+Offline tests of the create, rebuild and read pipeline against the in memory
+SyntheticSDF backend of the benchmarks, so no DSN or ODBC driver is needed.
+"""
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from benchmarks.synthetic import SyntheticSDF
+from fds.datax.universe import Universe
+from fds.datax._get_data._get_data import GetSDFData
+from fds.datax._sdfhelpers._find import FdsDataStoreLedger
+from fds.datax.utils import snapshots, tablecache
+from fds.datax.utils.connection import (
+    FdsConnectionPool,
+    get_pool,
+    set_connection_factory,
+)
+from fds.datax.utils.dtypes import FdsDtypePolicy, is_float32_column, to_pandas
+from fds.datax.utils.fetch import iter_batches, read_sql_stream
+from fds.datax.utils.fx import FdsFxRates, load_fx, merge_fx
+from fds.datax.utils.intervals import (
+    asof_join,
+    expand_intervals,
+    interval_join,
+    is_interval_frame,
+    overlapping_keys,
+)
+from fds.datax.utils.metrics import JsonFileSink, set_metrics_sinks
+
+DSN = "SDF"
+ETF_TICKER = "SPY-US"
+
+READS = [
+    ("universe", 1),
+    ("sec ref", 1),
+    ("prices", 0),
+    ("prices", 1),
+    ("prices", 2),
+    ("corp actions", 1),
+]
+
+
+@pytest.fixture(scope="module")
+def backend():
+    backend = SyntheticSDF(securities=40, years=1)
+    set_connection_factory(backend.connect)
+    yield backend
+    set_connection_factory()
+
+
+@pytest.fixture(autouse=True)
+def empty_table_cache():
+    tablecache.invalidate()
+    yield
+    tablecache.invalidate()
+
+
+def __create__(backend, dir_path, cache_name, start_date=None, **kwargs):
+    assert Universe(dir_path).create(
+        "generate",
+        cache_name=cache_name,
+        mssql_dsn=DSN,
+        etf_ticker=ETF_TICKER,
+        currency=kwargs.pop("currency", "USD"),
+        start_date=start_date or str(backend.start),
+        end_date=str(backend.end),
+        **kwargs
+    )
+
+
+def __read__(dir_path, cache_name, option, adj=1, **kwargs):
+    return Universe(dir_path).read(
+        cache_name, option, adj=adj, show_details=0, **kwargs
+    )
+
+
+def __assert_same__(left, right):
+    """
+    Compares two reads regardless of row order and categorical encoding.
+    """
+    assert list(left.columns) == list(right.columns)
+    frames = []
+    for df in (left, right):
+        df = df.astype(
+            {c: str for c in df.columns if isinstance(df[c].dtype, pd.CategoricalDtype)}
+        )
+        frames.append(
+            df.sort_values(list(df.columns[:3]), kind="stable").reset_index(drop=True)
+        )
+    pd.testing.assert_frame_equal(*frames, check_dtype=False)
+
+
+def __assert_same_reads__(left_dir, right_dir, cache_name):
+    for option, adj in READS:
+        __assert_same__(
+            __read__(left_dir, cache_name, option, adj),
+            __read__(right_dir, cache_name, option, adj),
+        )
+
+
+# ------------------------------------------------------------------ connection pool
+
+
+def test_pool_checkout_returns_connection(backend):
+    pool = FdsConnectionPool(max_size=1, checkout_timeout=0.05, connect=backend.connect)
+    with pool.checkout(DSN) as connection:
+        # the only connection is checked out
+        with pytest.raises(TimeoutError):
+            pool.acquire(DSN)
+    with pool.checkout(DSN) as again:
+        assert again is connection
+
+
+def test_pool_returns_connection_on_error(backend):
+    pool = FdsConnectionPool(max_size=1, checkout_timeout=0.05, connect=backend.connect)
+    with pytest.raises(KeyError):
+        with pool.checkout(DSN) as connection:
+            raise KeyError("failed")
+    with pool.checkout(DSN) as again:
+        assert again is connection
+    pool.close_all()
+    with pool.checkout(DSN) as fresh:
+        assert fresh is not connection
+
+
+def test_pool_waits_for_returned_connection(backend):
+    pool = FdsConnectionPool(max_size=1, checkout_timeout=5, connect=backend.connect)
+    connection = pool.acquire(DSN)
+    timer = threading.Timer(0.1, pool.release, (DSN, connection))
+    timer.start()
+    try:
+        assert pool.acquire(DSN) is connection
+    finally:
+        timer.join()
+
+
+def test_price_batches_hold_one_connection(backend, monkeypatch):
+    ids = [backend.listing_id(i) for i in range(20)]
+    args = (ids, str(backend.start), str(backend.end), "EUR")
+    monkeypatch.setattr(GetSDFData, "fetch_arraysize", 1000)
+    # the FX rates are downloaded before the price query holds the only connection
+    monkeypatch.setattr(get_pool(), "max_size", 1)
+    monkeypatch.setattr(get_pool(), "checkout_timeout", 1)
+    batches = list(GetSDFData.fds_prices_batches(*args, DSN))
+    assert len(batches) > 1
+    __assert_same__(
+        pd.concat(batches, ignore_index=True),
+        GetSDFData.fds_prices(*args, 3, DSN),
+    )
+
+
+# ------------------------------------------------------------------ fetchmany streaming
+
+
+class FakeCursor:
+    """
+    A DB-API cursor over fixed result sets, None standing for a statement without
+    results such as the temp table setup at the top of the SQL templates.
+    """
+
+    def __init__(self, results):
+        self.results = list(results)
+        self.arraysize = 1
+        self.description, self.rows = None, []
+
+    def execute(self, q):
+        self.nextset()
+
+    def nextset(self):
+        if not self.results:
+            return False
+        result = self.results.pop(0)
+        self.description, self.rows = (None, []) if result is None else result
+        return True
+
+    def fetchmany(self, size):
+        rows, self.rows = self.rows[:size], self.rows[size:]
+        return rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    def __init__(self, *results):
+        self.results = results
+
+    def cursor(self):
+        return FakeCursor(self.results)
+
+
+DESCRIPTION = [("fsym_id", str), ("price_date", str), ("volume", int), ("close", float)]
+
+ROWS = [
+    ("A-R", "2020-01-01", 10, 1.5),
+    ("A-R", "2020-01-02", None, None),
+    ("B-R", "2020-01-01", 30, 2.5),
+    (None, "2020-01-02", 40, 3.5),
+    ("C-R", "2020-01-01", 50, None),
+]
+
+
+def test_read_sql_stream_keeps_nulls():
+    connection = FakeConnection(None, (DESCRIPTION, ROWS))
+    df = read_sql_stream("q", connection, arraysize=2, parse_dates=["price_date"])
+    assert list(df.columns) == [col[0] for col in DESCRIPTION]
+    assert len(df) == len(ROWS)
+    assert df.fsym_id.isnull().tolist() == [False, False, False, True, False]
+    # integer columns with NULLs come back as float
+    assert df.volume.dtype == np.float64
+    assert np.isnan(df.volume[1])
+    assert df.close.isnull().sum() == 2
+    assert pd.api.types.is_datetime64_dtype(df.price_date)
+
+
+def test_read_sql_stream_narrows_integers_without_nulls():
+    rows = [row[:2] + (10,) + row[3:] for row in ROWS]
+    df = read_sql_stream("q", FakeConnection((DESCRIPTION, rows)), arraysize=2)
+    assert df.volume.dtype == np.int64
+    assert df.volume.tolist() == [10] * len(rows)
+
+
+def test_read_sql_stream_empty_result():
+    df = read_sql_stream("q", FakeConnection(None, (DESCRIPTION, [])), arraysize=2)
+    assert df.empty
+    assert list(df.columns) == [col[0] for col in DESCRIPTION]
+
+
+def test_read_sql_stream_without_result_set():
+    assert read_sql_stream("q", FakeConnection(None)).empty
+
+
+def test_iter_batches_streams_fetchmany():
+    connection = FakeConnection((DESCRIPTION, ROWS))
+    batches = list(iter_batches(connection, "q", arraysize=2))
+    assert [len(values[0]) for _, _, values in batches] == [2, 2, 1]
+    columns, type_codes, values = batches[0]
+    assert columns == [col[0] for col in DESCRIPTION]
+    assert type_codes == [col[1] for col in DESCRIPTION]
+    assert np.isnan(values[2][1])
+
+
+def test_iter_batches_empty_result_keeps_columns():
+    batches = list(iter_batches(FakeConnection((DESCRIPTION, [])), "q"))
+    assert len(batches) == 1
+    columns, _, values = batches[0]
+    assert columns == [col[0] for col in DESCRIPTION]
+    assert all(len(v) == 0 for v in values)
+
+
+def test_read_sql_stream_synthetic_backend(backend):
+    with FdsConnectionPool(connect=backend.connect).checkout(DSN) as connection:
+        df = read_sql_stream("SELECT 1", connection, arraysize=1)
+    assert df.one.tolist() == [1]
+
+
+# ------------------------------------------------------------------ interval joins
+
+
+def __merge_and_filter__(univ, entities):
+    """
+    The point in time entity mapping of fds_symbology before interval_join.
+    """
+    merged = univ.merge(entities, how="inner", on="ref_id")
+    inside = (merged.date >= merged.entity_start_date) & (
+        (merged.date < merged.entity_end_date) | merged.entity_end_date.isnull()
+    )
+    return merged.loc[inside].reset_index(drop=True)
+
+
+def __interval_join__(univ, entities):
+    return interval_join(
+        univ, entities, "ref_id", "date", "entity_start_date", "entity_end_date"
+    )
+
+
+def test_interval_join_overlapping_entities():
+    T = pd.Timestamp
+    univ = pd.DataFrame(
+        {
+            "ref_id": ["A", "A", "B", "C", "D"],
+            "date": [
+                T("2020-06-01"),
+                T("2022-06-01"),
+                T("2020-06-01"),
+                T("2021-01-01"),
+                pd.NaT,
+            ],
+            "weight": [1.0, 2.0, 3.0, 4.0, 5.0],
+        }
+    )
+    entities = pd.DataFrame(
+        {
+            # A maps to X and, for a year, to Y as well, B is duplicated
+            "ref_id": ["A", "A", "B", "B", "C", "D"],
+            "fsym_id": ["X", "Y", "P", "P", "Q", "R"],
+            "entity_start_date": [
+                T("2019-01-01"),
+                T("2020-01-01"),
+                T("2019-01-01"),
+                T("2019-01-01"),
+                T("2020-01-01"),
+                T("2019-01-01"),
+            ],
+            "entity_end_date": [
+                pd.NaT,
+                T("2021-01-01"),
+                T("2021-01-01"),
+                T("2021-01-01"),
+                pd.NaT,
+                pd.NaT,
+            ],
+        }
+    )
+    assert sorted(
+        overlapping_keys(entities, "ref_id", "entity_start_date", "entity_end_date")
+    ) == ["A", "B"]
+    joined = __interval_join__(univ, entities)
+    assert joined.fsym_id.tolist() == ["X", "Y", "X", "P", "P", "Q"]
+    pd.testing.assert_frame_equal(joined, __merge_and_filter__(univ, entities))
+
+
+@pytest.mark.parametrize("overlaps", [False, True])
+def test_interval_join_matches_merge_and_filter(overlaps):
+    rng = np.random.default_rng(7)
+    ids = ["ID{}".format(i) for i in range(50)]
+    epoch = np.datetime64("2019-01-01")
+    rows = []
+    for ref_id in ids:
+        # consecutive intervals, the last one open ended
+        bounds = np.sort(rng.choice(np.arange(1, 1000), 3, replace=False))
+        starts = np.append(0, bounds)
+        ends = np.append(bounds, -1)
+        if overlaps and rng.random() < 0.3:
+            # a reused ID held by a second security for part of the history
+            starts = np.append(starts, starts[1] - 30)
+            ends = np.append(ends, ends[1] + 30)
+        for k, (s, e) in enumerate(zip(starts, ends)):
+            rows.append(
+                (
+                    ref_id,
+                    "{}-{}".format(ref_id, k),
+                    epoch + int(s),
+                    pd.NaT if e < 0 else epoch + int(e),
+                )
+            )
+    entities = pd.DataFrame(
+        rows, columns=["ref_id", "fsym_id", "entity_start_date", "entity_end_date"]
+    ).sample(frac=1, random_state=1)
+    entities = entities.astype(
+        {c: "datetime64[ns]" for c in ["entity_start_date", "entity_end_date"]}
+    )
+    univ = pd.DataFrame(
+        {
+            "ref_id": rng.choice(ids + ["MISSING"], 2000),
+            "date": epoch + rng.integers(-30, 1100, 2000).astype("timedelta64[D]"),
+        }
+    )
+    univ["date"] = univ.date.astype("datetime64[ns]")
+    assert (
+        bool(
+            len(
+                overlapping_keys(
+                    entities, "ref_id", "entity_start_date", "entity_end_date"
+                )
+            )
+        )
+        == overlaps
+    )
+    pd.testing.assert_frame_equal(
+        __interval_join__(univ, entities), __merge_and_filter__(univ, entities)
+    )
+
+
+def test_asof_join_takes_last_row_in_effect():
+    T = pd.Timestamp
+    left = pd.DataFrame(
+        {
+            "fsym_id": ["A", "B", "A", "A", "C"],
+            "price_date": [
+                T("2020-03-01"),
+                T("2020-03-01"),
+                T("2019-12-31"),
+                T("2020-01-01"),
+                T("2020-03-01"),
+            ],
+        }
+    )
+    right = pd.DataFrame(
+        {
+            "fsym_id": ["A", "A", "B"],
+            "date": [T("2020-02-01"), T("2020-01-01"), T("2020-04-01")],
+            "factor": [0.5, 2.0, 3.0],
+        }
+    )
+    inner = asof_join(left, right, "fsym_id", "price_date", "date")
+    assert inner.factor.tolist() == [0.5, 2.0]
+    assert inner.price_date.tolist() == [T("2020-03-01"), T("2020-01-01")]
+    outer = asof_join(left, right, "fsym_id", "price_date", "date", how="left")
+    assert outer.fsym_id.tolist() == left.fsym_id.tolist()
+    assert outer.factor.fillna(0).tolist() == [0.5, 0, 0, 2.0, 0]
+    forward = asof_join(
+        left, right, "fsym_id", "price_date", "date", direction="forward"
+    )
+    assert forward.factor.tolist() == [3.0, 2.0, 2.0]
+
+
+# ------------------------------------------------------------------ layouts
+
+
+@pytest.fixture(scope="module")
+def file_store(backend, tmp_path_factory):
+    dir_path = str(tmp_path_factory.mktemp("file"))
+    __create__(backend, dir_path, "etf", layout="file")
+    return dir_path
+
+
+# create options that build the same cache as the default options, by test id
+CREATE_OPTIONS = {
+    "hive": dict(layout="dataset"),
+    "shared": dict(layout="shared"),
+    "feather": dict(layout="file", sidecar=True),
+    "hive-feather": dict(layout="dataset", sidecar=True),
+    "intervals": dict(intervals=True),
+    "hive-intervals": dict(layout="dataset", intervals=True),
+    "adjust-on-read": dict(adjust_on_read=True),
+    "shared-adjust-on-read": dict(layout="shared", adjust_on_read=True),
+    "shards": dict(price_shards=3),
+    "streamed-shards": dict(stream_prices=True, price_shards=3),
+    "shards-adjust-on-read": dict(price_shards=3, adjust_on_read=True),
+    "metrics": dict(metrics=JsonFileSink()),
+    "window": dict(price_query="window"),
+    "trading": dict(price_query="trading"),
+}
+
+# CREATE_OPTIONS that filter reads their own way, also compared on filtered reads
+FILTERED_OPTIONS = [
+    "hive",
+    "shared",
+    "feather",
+    "intervals",
+    "adjust-on-read",
+    "shared-adjust-on-read",
+    "trading",
+]
+
+
+@pytest.mark.parametrize("options", CREATE_OPTIONS.values(), ids=CREATE_OPTIONS)
+def test_create_options_read_identical(backend, file_store, tmp_path, options):
+    __create__(backend, str(tmp_path), "etf", **options)
+    __assert_same_reads__(file_store, str(tmp_path), "etf")
+
+
+@pytest.mark.parametrize("name", FILTERED_OPTIONS)
+def test_create_options_filtered_reads_identical(backend, file_store, tmp_path, name):
+    __create__(backend, str(tmp_path), "etf", **CREATE_OPTIONS[name])
+    ids = __read__(file_store, "etf", "universe").ref_id.drop_duplicates()
+    mid = str(backend.end - np.timedelta64(90, "D"))
+    for filters in [
+        dict(start_date=mid, ids=ids.head(5).tolist(), columns=["price_close"]),
+        dict(end_date=mid, ids=ids.tail(3).tolist()),
+    ]:
+        for adj in (0, 1, 2):
+            expected = __read__(file_store, "etf", "prices", adj, **filters)
+            assert len(expected)
+            actual = __read__(str(tmp_path), "etf", "prices", adj, **filters)
+            __assert_same__(expected, actual)
+
+
+def test_interval_universe(backend, file_store, tmp_path):
+    __create__(backend, str(tmp_path), "etf", intervals=True)
+    daily = __read__(file_store, "etf", "universe")
+    stored = __read__(str(tmp_path), "etf", "universe", intervals=True)
+    assert is_interval_frame(stored)
+    assert len(stored) < len(daily) / 10
+    assert (stored.start_date < stored.end_date).all()
+    __assert_same__(expand_intervals(stored)[list(daily.columns)], daily)
+    # a daily cache is not interval encoded
+    assert not is_interval_frame(
+        __read__(file_store, "etf", "universe", intervals=True)
+    )
+
+
+def __prices__(backend, query, **kwargs):
+    ids = [backend.listing_id(i) for i in range(20)]
+    return GetSDFData.fds_prices(
+        ids,
+        str(backend.start),
+        str(backend.end),
+        "LOCAL",
+        3,
+        DSN,
+        query=query,
+        **kwargs
+    )
+
+
+@pytest.mark.parametrize("query", ["window", "trading"])
+def test_price_queries_return_calendar_rows(backend, query):
+    expected = __prices__(backend, "calendar")
+    # the synthetic prices hold the days a client fill can get wrong: returns on
+    # non-trading days and days missing from fp_total_returns_daily
+    weekend = expected.price_date.dt.dayofweek >= 5
+    assert (expected.one_day_total_return[weekend] != 0).any()
+    days = (backend.end - backend.start) // np.timedelta64(1, "D") + 1
+    assert (expected.groupby("fsym_id").size() < days).any()
+    pd.testing.assert_frame_equal(__prices__(backend, query), expected)
+
+
+def test_trading_query_returns_fewer_rows(backend):
+    trading = __prices__(backend, "trading", expand=False)
+    assert len(trading) < 0.8 * len(__prices__(backend, "calendar"))
+    assert (trading.fill_end_date > trading.price_date).all()
+
+
+@pytest.mark.parametrize("query", ["calendar", "trading"])
+def test_price_shards_return_unsharded_rows(backend, query):
+    expected = __prices__(backend, query)
+    for shards in (3, 40):
+        pd.testing.assert_frame_equal(
+            __prices__(backend, query, shards=shards), expected
+        )
+
+
+def test_prices_converted_to_currency(backend, file_store, tmp_path):
+    __create__(backend, str(tmp_path), "etf", currency="EUR")
+    rates = GetSDFData.fds_fx_table(str(backend.start), str(backend.end), DSN, ["EUR"])
+    rates = rates.loc[rates.currency.str.strip() == "EUR"]
+    per_eur = rates.set_index("price_date").exch_rate_per_usd
+    keys = ["ref_id", "price_date"]
+    for adj in (0, 1, 2):
+        usd = __read__(file_store, "etf", "prices", adj)
+        eur = __read__(str(tmp_path), "etf", "prices", adj)
+        assert len(eur) == len(usd)
+        assert (eur.currency == "EUR").all()
+        both = usd.merge(eur, on=keys, suffixes=("_usd", "_eur"))
+        rate = per_eur.reindex(both.price_date).values
+        for col in ["price_close", "price_open", "market_value"]:
+            np.testing.assert_allclose(both[col + "_eur"], both[col + "_usd"] * rate)
+        # share counts and returns are not converted
+        for col in ["volume", "shares_outstanding", "one_day_total_return"]:
+            np.testing.assert_allclose(both[col + "_eur"], both[col + "_usd"])
+
+
+def test_dtype_policy_table():
+    df = pd.DataFrame(
+        {
+            "fsym_id": ["A-R", "B-R", "A-R"],
+            "price_date": pd.to_datetime(["2020-01-01", "2020-01-02", "2020-01-03"]),
+            "proper_name": ["A", "B", None],
+            "price_close": [1.5, 2.5, 3.5],
+            "one_day_total_return": [0.1, 0.2, 0.3],
+        }
+    )
+    policy = FdsDtypePolicy(float32=True, arrow_strings=True)
+    table = policy.table(df)
+    assert table.schema.field("fsym_id").type == pa.dictionary(pa.int32(), pa.string())
+    assert table.schema.field("price_date").type == pa.date32()
+    assert table.schema.field("price_close").type == pa.float32()
+    assert table.schema.field("one_day_total_return").type == pa.float64()
+    assert policy.cast(table) is table
+    out = to_pandas(table, policy)
+    assert isinstance(out.fsym_id.dtype, pd.CategoricalDtype)
+    assert out.price_date.dtype == "datetime64[ns]"
+    assert out.proper_name.dtype == pd.StringDtype("pyarrow")
+    assert out.proper_name.isnull().tolist() == [False, False, True]
+    assert out.price_close.dtype == np.float32
+    assert out.proper_name[:2].tolist() == ["A", "B"]
+    pd.testing.assert_frame_equal(
+        out.drop(columns="proper_name").astype({"fsym_id": str, "price_close": float}),
+        df.drop(columns="proper_name").astype(
+            {"fsym_id": str, "price_date": "datetime64[ns]"}
+        ),
+    )
+
+
+def test_dtype_policy_reads(file_store):
+    start_date = "2024-12-01"
+    prices = __read__(file_store, "etf", "prices", start_date=start_date)
+    assert isinstance(prices.ref_id.dtype, pd.CategoricalDtype)
+    assert prices.price_date.dtype == "datetime64[ns]"
+    assert prices.price_close.dtype == np.float64
+    typed = __read__(
+        file_store,
+        "etf",
+        "prices",
+        start_date=start_date,
+        dtypes=FdsDtypePolicy(float32=True),
+    )
+    narrow = [c for c in prices.columns if is_float32_column(c)]
+    assert (typed.dtypes[narrow] == np.float32).all()
+    assert typed.one_day_total_return.dtype == np.float64
+    __assert_same__(typed.drop(columns=narrow), prices.drop(columns=narrow))
+    np.testing.assert_allclose(typed[narrow], prices[narrow], rtol=1e-6)
+
+
+def test_float32_cache(backend, file_store, tmp_path):
+    __create__(backend, str(tmp_path), "etf", float32=True)
+    for adj in (0, 1, 2):
+        expected = __read__(file_store, "etf", "prices", adj)
+        prices = __read__(str(tmp_path), "etf", "prices", adj)
+        assert prices.price_close.dtype == np.float32
+        assert prices.one_day_total_return.dtype == np.float64
+        assert list(prices.columns) == list(expected.columns)
+        numeric = expected.select_dtypes("number").columns
+        np.testing.assert_allclose(
+            prices[numeric].astype(float), expected[numeric], rtol=1e-6
+        )
+
+
+def test_filtered_read_decodes_less(file_store):
+    mid = "2024-12-01"
+    tablecache.invalidate()
+    filtered = __read__(
+        file_store, "etf", "prices", start_date=mid, columns=["price_close"]
+    )
+    filtered_bytes = tablecache.get_table_cache().info()["nbytes"]
+    tablecache.invalidate()
+    full = __read__(file_store, "etf", "prices")
+    assert 0 < filtered_bytes < tablecache.get_table_cache().info()["nbytes"]
+    # a filtered read cached first is never returned for an unfiltered one
+    assert len(full.columns) > len(filtered.columns)
+    assert len(full) > len(filtered)
+    __assert_same__(
+        filtered,
+        full.loc[full.price_date >= mid, filtered.columns].reset_index(drop=True),
+    )
+
+
+def test_reads_match_without_table_cache(file_store):
+    start_date = "2024-06-01"
+    cached = __read__(file_store, "etf", "prices", start_date=start_date)
+    tablecache.set_table_cache_size(0)
+    try:
+        __assert_same__(
+            cached, __read__(file_store, "etf", "prices", start_date=start_date)
+        )
+    finally:
+        tablecache.set_table_cache_size(tablecache.DEFAULT_MAX_BYTES)
+
+
+def test_all_adjustments_keep_stored_names(file_store):
+    prices = __read__(file_store, "etf", "prices", adj=3)
+    assert prices.columns.is_unique
+    assert {"unadj_price_close", "split_adj_price_close"} <= set(prices.columns)
+    close = __read__(file_store, "etf", "prices", adj=3, columns=["price_close"])
+    assert close.columns.is_unique
+    closes = [c for c in close.columns if c.endswith("price_close")]
+    assert closes == [c for c in prices.columns if c.endswith("price_close")]
+    assert "unadj_price_open" not in close.columns
+
+
+# ------------------------------------------------------------------ rebuilds
+
+
+def test_incremental_rebuild_matches_full(backend, tmp_path):
+    incremental, full = str(tmp_path / "incremental"), str(tmp_path / "full")
+    for dir_path in (incremental, full):
+        __create__(backend, dir_path, "etf")
+    assert Universe(incremental).rebuild("etf", incremental=True, lookback_days=90)
+    assert Universe(full).rebuild("etf")
+    __assert_same_reads__(full, incremental, "etf")
+
+
+def test_rebuild_publishes_new_snapshot(backend, tmp_path):
+    dir_path = str(tmp_path)
+    __create__(backend, dir_path, "etf")
+    fname = os.path.join(dir_path, "fdsDataStore", "etf")
+    first = snapshots.resolve(fname)
+    before = __read__(dir_path, "etf", "prices")
+    assert Universe(dir_path).rebuild("etf")
+    assert snapshots.resolve(fname) != first
+    # the previous version is kept for readers that resolved it before the rebuild
+    assert os.path.isdir(os.path.dirname(first))
+    __assert_same__(before, __read__(dir_path, "etf", "prices"))
+
+
+# ------------------------------------------------------------------ batches
+
+
+def test_batch_matches_individual_builds(backend, tmp_path):
+    batch, single = str(tmp_path / "batch"), str(tmp_path / "single")
+    mid = str(backend.start + np.timedelta64(180, "D"))
+    caches = [
+        dict(cache_name="usd", start_date=str(backend.start), currency="USD"),
+        dict(cache_name="eur", start_date=mid, currency="EUR"),
+    ]
+    for cache in caches:
+        __create__(backend, single, **cache)
+    assert Universe(batch).batch(
+        [
+            dict(
+                cache,
+                mssql_dsn=DSN,
+                etf_ticker=ETF_TICKER,
+                end_date=str(backend.end),
+            )
+            for cache in caches
+        ]
+    )
+    for cache in caches:
+        __assert_same_reads__(single, batch, cache["cache_name"])
+
+
+# ------------------------------------------------------------------ snapshots
+
+
+def __stage_file__(fname, text):
+    staged = snapshots.stage(fname)
+    with open(staged + "_universe.txt", "w") as fd:
+        fd.write(text)
+    return staged
+
+
+def test_build_metrics(backend, tmp_path):
+    records = []
+    __create__(backend, str(tmp_path), "etf", metrics=[records.append, JsonFileSink()])
+    __create__(backend, str(tmp_path), "other", metrics=JsonFileSink())
+    kinds = {record["kind"] for record in records}
+    assert {"query", "build"} <= kinds
+    assert all(record["cache_name"] == "etf" for record in records)
+    assert all(record["status"] == "finished" for record in records)
+    queries = [record for record in records if record["kind"] == "query"]
+    assert sum(record["rows"] for record in queries) > 0
+    # one line per build
+    path = os.path.join(str(tmp_path), "fdsDataStore", "fds_build_metrics.jsonl")
+    builds = pd.read_json(path, lines=True)
+    assert builds.cache_name.tolist() == ["etf", "other"]
+    assert builds.status.tolist() == ["finished", "finished"]
+    assert len(builds.records[0]) == len(records)
+
+
+def test_metrics_sinks_outside_build(backend):
+    records = []
+    set_metrics_sinks(records.append)
+    try:
+        GetSDFData.fds_fx_table(str(backend.start), str(backend.end), DSN, ["EUR"])
+    finally:
+        set_metrics_sinks()
+    assert [record["kind"] for record in records] == ["query"]
+    assert records[0]["rows"] > 0
+    GetSDFData.fds_fx_table(str(backend.start), str(backend.end), DSN, ["EUR"])
+    assert len(records) == 1
+
+
+def test_snapshot_publish_resolve(tmp_path):
+    fname = str(tmp_path / "etf")
+    assert snapshots.resolve(fname) == fname
+    assert snapshots.current_version(fname) is None
+
+    first = snapshots.publish(fname, __stage_file__(fname, "first"), keep=1)
+    path = snapshots.resolve(fname)
+    assert path == os.path.join(snapshots.snapshot_dir(fname), first, "etf")
+    with open(path + "_universe.txt") as fd:
+        assert fd.read() == "first"
+
+    second = snapshots.publish(fname, __stage_file__(fname, "second"), keep=1)
+    assert second > first
+    assert snapshots.versions(fname) == [first, second]
+    # a reader that resolved the first version still reads it
+    with open(path + "_universe.txt") as fd:
+        assert fd.read() == "first"
+    with open(snapshots.resolve(fname) + "_universe.txt") as fd:
+        assert fd.read() == "second"
+    assert snapshots.resolve(fname, first) == path
+
+    third = snapshots.publish(fname, __stage_file__(fname, "third"), keep=0)
+    assert snapshots.versions(fname) == [third]
+
+
+def test_snapshot_discard_and_remove(tmp_path):
+    fname = str(tmp_path / "etf")
+    snapshots.publish(fname, __stage_file__(fname, "first"))
+    snapshots.discard(__stage_file__(fname, "failed"))
+    assert os.listdir(snapshots.snapshot_dir(fname)) == snapshots.versions(fname)
+    snapshots.remove(fname)
+    assert snapshots.resolve(fname) == fname
+    assert not os.path.exists(snapshots.snapshot_dir(fname))
+
+
+# ------------------------------------------------------------------ concurrency
+
+
+def __write_ledger__(dir_path, worker, count):
+    ledger = FdsDataStoreLedger(dir_path)
+    for i in range(count):
+        ledger.cache_ledger(
+            "etf{}_{}".format(worker, i),
+            "FDS Ownership",
+            DSN,
+            "USD",
+            ETF_TICKER,
+            "2020-01-01",
+            "2020-12-31",
+        )
+    return worker
+
+
+def test_ledger_concurrent_writers(tmp_path):
+    dir_path = str(tmp_path)
+    os.makedirs(os.path.join(dir_path, "fdsDataStore"))
+    workers, count = 4, 5
+    with ProcessPoolExecutor(workers) as pool:
+        list(
+            pool.map(
+                __write_ledger__,
+                [dir_path] * workers,
+                range(workers),
+                [count] * workers,
+            )
+        )
+    caches = FdsDataStoreLedger(dir_path).avail_caches()
+    assert len(caches) == workers * count
+    assert caches.index.is_unique
+
+
+def test_ledger_keeps_source(tmp_path):
+    dir_path = str(tmp_path)
+    os.makedirs(os.path.join(dir_path, "fdsDataStore"))
+    ledger = FdsDataStoreLedger(dir_path)
+    ledger.cache_ledger("etf", "Imported", DSN, "USD", "", "2020-01-01", "")
+    assert ledger.cache_details("etf")["Source"] == "Imported"
+
+
+def __merge_rates__(store_dir, worker, months):
+    for month in range(months):
+        dates = pd.date_range("2020-01-01", periods=30) + pd.Timedelta(
+            days=30 * (worker * months + month)
+        )
+        rates = pd.DataFrame(
+            {
+                "price_date": np.tile(dates, 2),
+                "currency": np.repeat(["EUR", "GBP"], len(dates)),
+                "exch_rate_usd": 1.1,
+                "exch_rate_per_usd": 0.9,
+            }
+        )
+        merge_fx(FdsFxRates.from_frame(rates), store_dir)
+    return worker
+
+
+def test_fx_concurrent_merges(tmp_path):
+    store_dir = str(tmp_path)
+    workers, months = 4, 3
+    with ProcessPoolExecutor(workers) as pool:
+        list(
+            pool.map(
+                __merge_rates__,
+                [store_dir] * workers,
+                range(workers),
+                [months] * workers,
+            )
+        )
+    fx = load_fx(store_dir)
+    assert len(fx.dates) == workers * months * 30
+    assert fx.currencies == ["EUR", "GBP"]
+    assert not [f for f in os.listdir(store_dir) if f.endswith(".tmp")]